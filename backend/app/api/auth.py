@@ -8,14 +8,13 @@ from typing import Optional
 import uuid
 
 from app.core.config import settings
+from app.db.repository import Database
+from app.db.session import get_db
 
 router = APIRouter()
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/token")
 
-# In-memory user store (replace with database in production)
-fake_users_db = {}
-
 class UserCreate(BaseModel):
     email: EmailStr
     password: str
@@ -56,28 +55,34 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm="HS256")
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+async def user_from_token(token: Optional[str], db: Database) -> Optional[dict]:
+    if not token:
+        return None
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
     except JWTError:
-        raise credentials_exception
-    
-    user = fake_users_db.get(email)
+        return None
+    email: Optional[str] = payload.get("sub")
+    if email is None:
+        return None
+    return await db.users.find_one(email=email)
+
+async def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: Database = Depends(get_db)
+) -> dict:
+    user = await user_from_token(token, db)
     if user is None:
-        raise credentials_exception
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return user
 
 @router.post("/register", response_model=dict)
-async def register(user: UserCreate):
-    if user.email in fake_users_db:
+async def register(user: UserCreate, db: Database = Depends(get_db)):
+    if await db.users.exists(email=user.email):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
@@ -95,7 +100,7 @@ async def register(user: UserCreate):
         "default_region": "us-east-1",
         "created_at": datetime.utcnow().isoformat(),
     }
-    fake_users_db[user.email] = user_data
+    await db.users.add(user_data)
     
     access_token = create_access_token(
         data={"sub": user.email},
@@ -111,8 +116,8 @@ async def register(user: UserCreate):
     }
 
 @router.post("/login", response_model=dict)
-async def login(credentials: LoginRequest):
-    user = fake_users_db.get(credentials.email)
+async def login(credentials: LoginRequest, db: Database = Depends(get_db)):
+    user = await db.users.find_one(email=credentials.email)
     if not user or not verify_password(credentials.password, user["hashed_password"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -134,8 +139,11 @@ async def login(credentials: LoginRequest):
     }
 
 @router.post("/token", response_model=Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = fake_users_db.get(form_data.username)
+async def login_for_access_token(
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: Database = Depends(get_db)
+):
+    user = await db.users.find_one(email=form_data.username)
     if not user or not verify_password(form_data.password, user["hashed_password"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -159,14 +167,15 @@ async def get_profile(current_user: dict = Depends(get_current_user)):
 @router.patch("/profile", response_model=dict)
 async def update_profile(
     updates: dict,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
 ):
     allowed_fields = ["name", "organization", "default_region"]
     for field in allowed_fields:
         if field in updates:
             current_user[field] = updates[field]
     
-    fake_users_db[current_user["email"]] = current_user
+    await db.users.save(current_user)
     
     return {
         "success": True,
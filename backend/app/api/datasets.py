@@ -1,15 +1,47 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, status
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, status
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Optional, List
 from datetime import datetime
+import functools
+import os
 import uuid
 
 from app.api.auth import get_current_user
+from app.api.pagination import PageParams, paginate
+from app.api.models import MODEL_CATALOG
+from app.core.config import settings
+from app.db.repository import Database
+from app.db.session import get_db, session_scope
+from app.services.dedup import DEFAULT_THRESHOLD, DedupResult, dedup_manager
+from app.services.estimator import packed_sequence_length
+from app.services.ingestion import ingest_file, publish_blob
+from app.services.locks import get_locks
+from app.services.packing import index_key, plan_packing
+from app.services.storage import StorageBackend, get_storage
+from app.services.validation import DEFAULT_CONTEXT_LENGTH, ValidationResult, validation_manager
 
 router = APIRouter()
 
-# In-memory store
-datasets_db = {}
+# Long enough for S3 to copy a multi-gigabyte blob into place
+BLOB_LOCK_SECONDS = 600.0
+
+
+def _blob_lock(content_hash: str):
+    """Held while a blob gains or loses a dataset record, so a delete never
+    drops a blob that an upload of the same content has just reused."""
+    return get_locks().hold(f"blob:{content_hash}", ttl=BLOB_LOCK_SECONDS)
+
+
+def _delete_blob(storage: StorageBackend, dataset: dict) -> None:
+    """Delete a dataset's blob and the packing plans made from it. Plans
+    are shared by content too, so any model's capacity may have one."""
+    keys = {plan["storage_key"] for plan in dataset.get("packing_plans", {}).values()}
+    for model in MODEL_CATALOG:
+        keys.add(index_key(dataset["content_hash"], packed_sequence_length(model["context_length"])))
+    for key in sorted(keys):
+        storage.delete(key)
+    storage.delete(dataset["storage_key"])
 
 class DatasetResponse(BaseModel):
     id: str
@@ -17,57 +49,91 @@ class DatasetResponse(BaseModel):
     name: str
     file_name: str
     s3_uri: str
+    storage_key: str
+    content_hash: str
     format: str
+    size_bytes: int
     row_count: int
+    detected_columns: List[str]
     column_mapping: dict
     validation_status: str
     validation_errors: List[str]
     estimated_tokens: int
+    parent_dataset_id: Optional[str] = None
     created_at: str
 
 @router.get("", response_model=dict)
 async def list_datasets(
     project_id: str,
-    current_user: dict = Depends(get_current_user)
+    page: PageParams = Depends(),
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
 ):
-    project_datasets = [
-        d for d in datasets_db.values()
-        if d["project_id"] == project_id
-    ]
     return {
         "success": True,
-        "data": project_datasets
+        "data": await paginate(db.datasets, page, project_id=project_id)
     }
 
 @router.post("/upload", response_model=dict)
 async def upload_dataset(
     project_id: str,
     file: UploadFile = File(...),
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
 ):
     dataset_id = str(uuid.uuid4())
     now = datetime.utcnow().isoformat()
+    file_name = os.path.basename(file.filename or "dataset.jsonl")
     
     # Determine format
-    file_format = "jsonl" if file.filename.endswith(".jsonl") else "csv"
-    
-    # Mock validation
-    dataset_data = {
-        "id": dataset_id,
-        "project_id": project_id,
-        "name": file.filename.rsplit(".", 1)[0],
-        "file_name": file.filename,
-        "s3_uri": f"s3://llm-toolkit-datasets/{project_id}/{dataset_id}/{file.filename}",
-        "format": file_format,
-        "row_count": 2547,  # Mock
-        "column_mapping": {},
-        "validation_status": "valid",
-        "validation_errors": [],
-        "estimated_tokens": 1250000,  # Mock
-        "created_at": now,
-    }
+    file_format = "jsonl" if file_name.endswith(".jsonl") else "csv"
+    
+    # Stream to storage and profile rows off the event loop
+    storage = get_storage()
+    try:
+        result = await run_in_threadpool(
+            ingest_file,
+            file.file,
+            storage,
+            file_format,
+            settings.DATASET_UPLOAD_CHUNK_SIZE,
+        )
+    finally:
+        await file.close()
     
-    datasets_db[dataset_id] = dataset_data
+    # Staged content not published below is deleted, whatever ends the request
+    try:
+        validation_errors = list(result.errors)
+        if result.row_count == 0:
+            validation_errors.append("Dataset is empty")
+        
+        dataset_data = {
+            "id": dataset_id,
+            "project_id": project_id,
+            "name": file_name.rsplit(".", 1)[0],
+            "file_name": file_name,
+            "s3_uri": storage.uri(result.storage_key),
+            "storage_key": result.storage_key,
+            "content_hash": result.content_hash,
+            "format": file_format,
+            "size_bytes": result.size_bytes,
+            "row_count": result.row_count,
+            "detected_columns": list(result.columns),
+            "column_mapping": {},
+            "validation_status": "invalid" if validation_errors else "valid",
+            "validation_errors": validation_errors,
+            "estimated_tokens": result.estimated_tokens,
+            "parent_dataset_id": None,
+            "created_at": now,
+        }
+        
+        async with _blob_lock(result.content_hash):
+            await run_in_threadpool(publish_blob, storage, result)
+            await db.datasets.add(dataset_data)
+            await db.commit()
+    finally:
+        if result.staging_key:
+            await run_in_threadpool(storage.delete, result.staging_key)
     
     return {
         "success": True,
@@ -78,9 +144,10 @@ async def upload_dataset(
 async def get_dataset(
     project_id: str,
     dataset_id: str,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
 ):
-    dataset = datasets_db.get(dataset_id)
+    dataset = await db.datasets.get(dataset_id)
     if not dataset or dataset["project_id"] != project_id:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -91,32 +158,281 @@ async def get_dataset(
         "data": dataset
     }
 
+async def _apply_validation(dataset_id: str, result: ValidationResult) -> None:
+    async with session_scope() as db:
+        dataset = await db.datasets.get(dataset_id)
+        if not dataset:
+            return
+        dataset["estimated_tokens"] = result.total_tokens
+        dataset["validation_status"] = "valid" if result.is_valid else "invalid"
+        dataset["validation_errors"] = result.formatted_errors()
+        await db.datasets.save(dataset)
+
 @router.post("/{dataset_id}/validate", response_model=dict)
 async def validate_dataset(
     project_id: str,
     dataset_id: str,
-    current_user: dict = Depends(get_current_user)
+    model_id: Optional[str] = None,
+    wait: bool = True,
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
 ):
-    dataset = datasets_db.get(dataset_id)
+    dataset = await db.datasets.get(dataset_id)
     if not dataset or dataset["project_id"] != project_id:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Dataset not found"
         )
     
-    # Mock validation result
+    context_length = DEFAULT_CONTEXT_LENGTH
+    if model_id:
+        model = next((m for m in MODEL_CATALOG if m["id"] == model_id), None)
+        if not model:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Unknown model"
+            )
+        context_length = model["context_length"]
+    
+    job = await validation_manager.start(
+        dataset,
+        get_storage(),
+        context_length,
+        on_complete=functools.partial(_apply_validation, dataset_id),
+    )
+    if wait:
+        await job.wait()
+    
+    if job.status == "completed":
+        return {
+            "success": True,
+            "data": job.result.to_dict()
+        }
+    return {
+        "success": True,
+        "data": job.to_dict()
+    }
+
+@router.get("/{dataset_id}/validation", response_model=dict)
+async def get_validation_status(
+    project_id: str,
+    dataset_id: str,
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
+):
+    dataset = await db.datasets.get(dataset_id)
+    job = validation_manager.get(dataset_id)
+    if not dataset or dataset["project_id"] != project_id or not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Validation not found"
+        )
+    return {
+        "success": True,
+        "data": job.to_dict()
+    }
+
+@router.post("/{dataset_id}/validation/cancel", response_model=dict)
+async def cancel_validation(
+    project_id: str,
+    dataset_id: str,
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
+):
+    dataset = await db.datasets.get(dataset_id)
+    job = validation_manager.get(dataset_id)
+    if not dataset or dataset["project_id"] != project_id or not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Validation not found"
+        )
+    
+    
+    data = job.to_dict()
+    if job.is_active:
+        # Jobs are shared by datasets with the same content; this detaches
+        # the dataset and only stops the job if nothing else waits on it
+        validation_manager.discard(dataset_id)
+        data["status"] = "cancelled"
+    
     return {
         "success": True,
-        "data": {
-            "is_valid": True,
-            "total_rows": dataset["row_count"],
-            "estimated_tokens": dataset["estimated_tokens"],
-            "errors": [],
-            "warnings": [
-                "15 rows exceed 2048 tokens and will be truncated"
-            ],
-            "detected_columns": ["instruction", "input", "output"]
+        "data": data
+    }
+
+@router.post("/{dataset_id}/packing", response_model=dict)
+async def plan_dataset_packing(
+    project_id: str,
+    dataset_id: str,
+    model_id: str,
+    batch_size: int = Query(4, ge=1, le=1024, description="Per-device batch size, for the unpacked comparison"),
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
+):
+    """Bin-pack the dataset's rows into sequences of the length a packed
+    run of ``model_id`` trains on, and store the plan as an index file the
+    training job reads. Validates the dataset first if needed."""
+    dataset = await db.datasets.get(dataset_id)
+    if not dataset or dataset["project_id"] != project_id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Dataset not found"
+        )
+    model = next((m for m in MODEL_CATALOG if m["id"] == model_id), None)
+    if not model:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Unknown model"
+        )
+    
+    # Row lengths come from validation, which is memoized per content
+    storage = get_storage()
+    job = await validation_manager.start(
+        dataset,
+        storage,
+        model["context_length"],
+        on_complete=functools.partial(_apply_validation, dataset_id),
+    )
+    await job.wait()
+    if job.status != "completed":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Dataset validation {job.status}: {job.error}" if job.error else f"Dataset validation {job.status}"
+        )
+    
+    capacity = packed_sequence_length(model["context_length"])
+    plan = await run_in_threadpool(plan_packing, job.result.token_lengths, capacity, batch_size)
+    key = index_key(dataset["content_hash"], capacity)
+    summary = {**plan.to_dict(), "storage_key": key, "s3_uri": storage.uri(key)}
+    dataset["packing_plans"] = {**dataset.get("packing_plans", {}), str(capacity): summary}
+    # The plan goes with the blob, so it must not land after its deletion
+    async with _blob_lock(dataset["content_hash"]):
+        if not await db.datasets.exists(id=dataset_id):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Dataset not found"
+            )
+        await run_in_threadpool(plan.save, storage, key)
+        await db.datasets.save(dataset)
+        await db.commit()
+    return {
+        "success": True,
+        "data": summary
+    }
+
+async def _register_derived(parent_id: str, result: DedupResult) -> None:
+    derived = result.derived
+    if derived is None:
+        return
+    storage = get_storage()
+    async with session_scope() as db:
+        parent = await db.datasets.get(parent_id)
+        if not parent:
+            await run_in_threadpool(storage.delete, derived.staging_key)
+            return
+        dataset_id = str(uuid.uuid4())
+        file_name = f"{parent['name']}-dedup.{parent['format']}"
+        dataset_data = {
+            "id": dataset_id,
+            "project_id": parent["project_id"],
+            "name": file_name.rsplit(".", 1)[0],
+            "file_name": file_name,
+            "s3_uri": storage.uri(derived.storage_key),
+            "storage_key": derived.storage_key,
+            "content_hash": derived.content_hash,
+            "format": parent["format"],
+            "size_bytes": derived.size_bytes,
+            "row_count": derived.row_count,
+            "detected_columns": list(derived.columns),
+            "column_mapping": dict(parent["column_mapping"]),
+            "validation_status": "invalid" if derived.errors else "valid",
+            "validation_errors": list(derived.errors),
+            "estimated_tokens": derived.estimated_tokens,
+            "parent_dataset_id": parent_id,
+            "derivation": {
+                "type": "dedup",
+                "threshold": result.threshold,
+                "removed_rows": result.total_rows - derived.row_count,
+            },
+            "created_at": datetime.utcnow().isoformat(),
         }
+        async with _blob_lock(derived.content_hash):
+            await run_in_threadpool(publish_blob, storage, derived)
+            await db.datasets.add(dataset_data)
+            await db.commit()
+    result.derived_dataset_id = dataset_id
+
+@router.post("/{dataset_id}/dedup", response_model=dict)
+async def deduplicate_dataset(
+    project_id: str,
+    dataset_id: str,
+    threshold: float = Query(DEFAULT_THRESHOLD, gt=0, le=1),
+    write_derived: bool = False,
+    wait: bool = True,
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
+):
+    dataset = await db.datasets.get(dataset_id)
+    if not dataset or dataset["project_id"] != project_id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Dataset not found"
+        )
+    
+    job = dedup_manager.start(
+        dataset,
+        get_storage(),
+        threshold,
+        write_derived,
+        on_complete=functools.partial(_register_derived, dataset_id),
+    )
+    if wait:
+        await job.wait()
+    
+    return {
+        "success": True,
+        "data": job.to_dict()
+    }
+
+@router.get("/{dataset_id}/dedup", response_model=dict)
+async def get_dedup_status(
+    project_id: str,
+    dataset_id: str,
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
+):
+    dataset = await db.datasets.get(dataset_id)
+    job = dedup_manager.get(dataset_id)
+    if not dataset or dataset["project_id"] != project_id or not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Deduplication not found"
+        )
+    return {
+        "success": True,
+        "data": job.to_dict()
+    }
+
+@router.post("/{dataset_id}/dedup/cancel", response_model=dict)
+async def cancel_dedup(
+    project_id: str,
+    dataset_id: str,
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
+):
+    dataset = await db.datasets.get(dataset_id)
+    job = dedup_manager.get(dataset_id)
+    if not dataset or dataset["project_id"] != project_id or not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Deduplication not found"
+        )
+    
+    job.cancel()
+    
+    return {
+        "success": True,
+        "data": job.to_dict()
     }
 
 @router.patch("/{dataset_id}/mapping", response_model=dict)
@@ -124,9 +440,10 @@ async def update_column_mapping(
     project_id: str,
     dataset_id: str,
     mapping: dict,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
 ):
-    dataset = datasets_db.get(dataset_id)
+    dataset = await db.datasets.get(dataset_id)
     if not dataset or dataset["project_id"] != project_id:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -134,7 +451,7 @@ async def update_column_mapping(
         )
     
     dataset["column_mapping"] = mapping
-    datasets_db[dataset_id] = dataset
+    await db.datasets.save(dataset)
     
     return {
         "success": True,
@@ -145,15 +462,25 @@ async def update_column_mapping(
 async def delete_dataset(
     project_id: str,
     dataset_id: str,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
 ):
-    dataset = datasets_db.get(dataset_id)
+    dataset = await db.datasets.get(dataset_id)
     if not dataset or dataset["project_id"] != project_id:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Dataset not found"
         )
     
-    del datasets_db[dataset_id]
+    validation_manager.discard(dataset_id)
+    dedup_manager.discard(dataset_id)
+    
+    # Blobs are shared by content; only drop the last reference
+    async with _blob_lock(dataset["content_hash"]):
+        await db.datasets.delete(dataset_id)
+        await db.commit()
+        blob_in_use = await db.datasets.exists(content_hash=dataset["content_hash"])
+        if not blob_in_use:
+            await run_in_threadpool(_delete_blob, get_storage(), dataset)
     
     return {"success": True}
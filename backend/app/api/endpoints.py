@@ -1,15 +1,46 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from pydantic import BaseModel
-from typing import Optional, List
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import AsyncIterator, Optional, List, Tuple
 from datetime import datetime
+import functools
+import itertools
+import json
 import uuid
 
 from app.api.auth import get_current_user
+from app.api.pagination import PageParams, paginate
+from app.db.repository import Database
+from app.db.session import get_db
+from app.services.autoscaling import get_autoscaler
+from app.services.events import Event
+from app.services.inference import (
+    Generation,
+    GenerationRequest,
+    GenerationStream,
+    InferenceError,
+    get_inference_gateway,
+)
+from app.services.response_cache import BYPASS, MISS, get_response_cache
 
 router = APIRouter()
 
-# In-memory store
-endpoints_db = {}
+class ScalingStep(BaseModel):
+    change: int
+    above: Optional[float] = None
+    below: Optional[float] = None
+
+class EndpointScaling(BaseModel):
+    policy: str = Field("target-tracking", pattern="^(target-tracking|step)$")
+    # rps, tokens_per_second, concurrency (queued + running) or p95_latency_ms
+    metric: str = Field("concurrency", pattern="^(rps|tokens_per_second|concurrency|p95_latency_ms)$")
+    target: float = Field(8.0, gt=0)  # per instance, except for p95_latency_ms
+    steps: List[ScalingStep] = []
+    min_instances: int = Field(1, ge=0)
+    max_instances: int = Field(4, ge=1)
+    scale_out_cooldown_seconds: float = 60.0
+    scale_in_cooldown_seconds: float = 300.0
+    scale_to_zero_after_seconds: Optional[float] = None
 
 class EndpointCreate(BaseModel):
     training_run_id: str
@@ -17,6 +48,7 @@ class EndpointCreate(BaseModel):
     instance_type: str = "ml.g5.xlarge"
     instance_count: int = 1
     auto_scaling: bool = False
+    scaling: Optional[EndpointScaling] = None
 
 class ChatMessage(BaseModel):
     role: str
@@ -27,26 +59,36 @@ class ChatRequest(BaseModel):
     max_tokens: int = 512
     temperature: float = 0.7
     top_p: float = 0.9
+    # None caches greedy (temperature 0) requests only; True also caches
+    # sampled ones, False skips the cache
+    cache: Optional[bool] = None
+
+    def to_generation_request(self) -> GenerationRequest:
+        return GenerationRequest(
+            messages=[message.model_dump() for message in self.messages],
+            max_tokens=self.max_tokens,
+            temperature=self.temperature,
+            top_p=self.top_p,
+        )
 
 @router.get("", response_model=dict)
 async def list_endpoints(
     project_id: str,
-    current_user: dict = Depends(get_current_user)
+    page: PageParams = Depends(),
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
 ):
-    project_endpoints = [
-        e for e in endpoints_db.values()
-        if e["project_id"] == project_id
-    ]
     return {
         "success": True,
-        "data": project_endpoints
+        "data": await paginate(db.endpoints, page, project_id=project_id)
     }
 
 @router.post("", response_model=dict)
 async def create_endpoint(
     project_id: str,
     endpoint: EndpointCreate,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
 ):
     endpoint_id = str(uuid.uuid4())
     now = datetime.utcnow().isoformat()
@@ -61,12 +103,15 @@ async def create_endpoint(
         "instance_type": endpoint.instance_type,
         "instance_count": endpoint.instance_count,
         "auto_scaling": endpoint.auto_scaling,
+        "scaling": (endpoint.scaling or EndpointScaling()).model_dump() if endpoint.auto_scaling else None,
         "endpoint_url": None,
         "created_at": now,
         "updated_at": now,
     }
     
-    endpoints_db[endpoint_id] = endpoint_data
+    await db.endpoints.add(endpoint_data)
+    if endpoint.auto_scaling:
+        get_autoscaler().watch(endpoint_id)
     
     return {
         "success": True,
@@ -77,9 +122,10 @@ async def create_endpoint(
 async def get_endpoint(
     project_id: str,
     endpoint_id: str,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
 ):
-    endpoint = endpoints_db.get(endpoint_id)
+    endpoint = await db.endpoints.get(endpoint_id)
     if not endpoint or endpoint["project_id"] != project_id:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -90,14 +136,8 @@ async def get_endpoint(
         "data": endpoint
     }
 
-@router.post("/{endpoint_id}/invoke", response_model=dict)
-async def invoke_endpoint(
-    project_id: str,
-    endpoint_id: str,
-    request: ChatRequest,
-    current_user: dict = Depends(get_current_user)
-):
-    endpoint = endpoints_db.get(endpoint_id)
+async def _inservice_endpoint(db: Database, project_id: str, endpoint_id: str) -> dict:
+    endpoint = await db.endpoints.get(endpoint_id)
     if not endpoint or endpoint["project_id"] != project_id:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -110,18 +150,163 @@ async def invoke_endpoint(
             detail="Endpoint is not in service"
         )
     
-    # Mock response
-    last_message = request.messages[-1].content if request.messages else ""
+    if endpoint["instance_count"] == 0 and endpoint.get("auto_scaling"):
+        # Scaled to zero while idle; bring an instance back for this request
+        try:
+            endpoint = await get_autoscaler().wake(endpoint)
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"Endpoint is scaling up from zero: {str(e) or 'timed out'}",
+                headers={"Retry-After": "30"},
+            )
+    return endpoint
+
+@router.post("/{endpoint_id}/invoke", response_model=dict)
+async def invoke_endpoint(
+    project_id: str,
+    endpoint_id: str,
+    request: ChatRequest,
+    response: Response,
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
+):
+    endpoint = await _inservice_endpoint(db, project_id, endpoint_id)
+    target = endpoint["sagemaker_endpoint_name"]
+    generation_request = request.to_generation_request()
+    
+    generate = functools.partial(
+        get_inference_gateway().generate, target, generation_request, endpoint["instance_count"]
+    )
+    cache = get_response_cache()
+    try:
+        if cache is None:
+            generation, cache_status = await generate(), BYPASS
+        else:
+            # Identical requests already generating are joined, not repeated
+            generation, cache_status = await cache.load(target, generation_request, generate, request.cache)
+    except InferenceError as e:
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=f"Inference failed: {e}"
+        )
     
+    response.headers["X-Cache"] = cache_status
+    return {
+        "success": True,
+        "data": {
+            "response": generation.text,
+            "usage": generation.usage,
+            "cache": cache_status,
+        }
+    }
+
+async def _cached(
+    target: str,
+    request: GenerationRequest,
+    opt_in: Optional[bool],
+) -> Tuple[Optional[Generation], str]:
+    cache = get_response_cache()
+    if cache is None:
+        return None, BYPASS
+    return await cache.lookup(target, request, opt_in)
+
+async def _generation_events(stream: GenerationStream, cache_result: bool) -> AsyncIterator[Event]:
+    ids = itertools.count(1)
+    try:
+        async for delta in stream:
+            yield Event(next(ids), "token", {"delta": delta})
+    except InferenceError as e:
+        yield Event(next(ids), "error", {"detail": f"Inference failed: {e}"})
+        return
+    if cache_result:
+        await get_response_cache().store_result(stream.endpoint, stream.request, stream.generation)
+    yield Event(next(ids), "usage", stream.generation.usage)
+
+async def _replay_events(generation: Generation) -> AsyncIterator[Event]:
+    yield Event(1, "token", {"delta": generation.text})
+    yield Event(2, "usage", generation.usage)
+
+async def _sse_lines(events: AsyncIterator[Event]) -> AsyncIterator[str]:
+    async for event in events:
+        yield event.sse()
+
+async def _json_lines(events: AsyncIterator[Event]) -> AsyncIterator[str]:
+    async for event in events:
+        yield json.dumps(event.to_dict()) + "\n"
+
+@router.post("/{endpoint_id}/invoke/stream")
+async def stream_endpoint(
+    project_id: str,
+    endpoint_id: str,
+    request: ChatRequest,
+    stream_format: str = Query("sse", alias="format", pattern="^(sse|jsonl)$"),
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
+):
+    """Relay tokens as they are generated: ``token`` events, then a
+    trailing ``usage`` event (or ``error``). Disconnecting cancels the
+    generation. A cached response is replayed as a single token event."""
+    endpoint = await _inservice_endpoint(db, project_id, endpoint_id)
+    target = endpoint["sagemaker_endpoint_name"]
+    generation_request = request.to_generation_request()
+    
+    generation, cache_status = await _cached(target, generation_request, request.cache)
+    if generation is not None:
+        events = _replay_events(generation)
+    else:
+        stream = get_inference_gateway().stream(target, generation_request, endpoint["instance_count"])
+        events = _generation_events(stream, cache_result=cache_status == MISS)
+    if stream_format == "jsonl":
+        return StreamingResponse(
+            _json_lines(events),
+            media_type="application/x-ndjson",
+            headers={"X-Cache": cache_status},
+        )
+    return StreamingResponse(
+        _sse_lines(events),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Cache": cache_status},
+    )
+
+@router.get("/{endpoint_id}/metrics", response_model=dict)
+async def get_endpoint_metrics(
+    project_id: str,
+    endpoint_id: str,
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
+):
+    endpoint = await db.endpoints.get(endpoint_id)
+    if not endpoint or endpoint["project_id"] != project_id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Endpoint not found"
+        )
+    return {
+        "success": True,
+        "data": get_inference_gateway().metrics(endpoint["sagemaker_endpoint_name"])
+    }
+
+@router.get("/{endpoint_id}/autoscaling", response_model=dict)
+async def get_endpoint_autoscaling(
+    project_id: str,
+    endpoint_id: str,
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
+):
+    endpoint = await db.endpoints.get(endpoint_id)
+    if not endpoint or endpoint["project_id"] != project_id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Endpoint not found"
+        )
     return {
         "success": True,
         "data": {
-            "response": f"This is a mock response to: {last_message[:50]}...",
-            "usage": {
-                "prompt_tokens": 50,
-                "completion_tokens": 100,
-                "total_tokens": 150,
-            }
+            "enabled": endpoint.get("auto_scaling", False),
+            "instance_count": endpoint["instance_count"],
+            "scaling": endpoint.get("scaling"),
+            **(get_autoscaler().status(endpoint_id) or {"load": None, "events": []}),
         }
     }
 
@@ -129,15 +314,17 @@ async def invoke_endpoint(
 async def delete_endpoint(
     project_id: str,
     endpoint_id: str,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
 ):
-    endpoint = endpoints_db.get(endpoint_id)
+    endpoint = await db.endpoints.get(endpoint_id)
     if not endpoint or endpoint["project_id"] != project_id:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Endpoint not found"
         )
     
-    del endpoints_db[endpoint_id]
+    await db.endpoints.delete(endpoint_id)
+    await get_inference_gateway().discard(endpoint["sagemaker_endpoint_name"])
     
     return {"success": True}
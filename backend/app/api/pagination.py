@@ -0,0 +1,67 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException, Query, status
+
+from app.db.repository import Repository, SortKey
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class PageParams:
+    """Query parameters shared by every list endpoint."""
+
+    def __init__(
+        self,
+        cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    ):
+        self.after = decode_cursor(cursor) if cursor else None
+        self.limit = limit
+        self.fields = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+
+
+def encode_cursor(key: SortKey) -> str:
+    created_at, record_id = key
+    raw = json.dumps([created_at.isoformat(), record_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> SortKey:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, record_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), str(record_id)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+def project(record: Dict[str, Any], fields: Optional[List[str]]) -> Dict[str, Any]:
+    if not fields:
+        return record
+    # The id is always returned so clients can follow up on a summary row
+    return {key: record[key] for key in ["id", *fields] if key in record}
+
+
+async def paginate(repo: Repository, page: PageParams, **filters: Any) -> Dict[str, Any]:
+    """Newest-first page after ``page.after``, with the cursor for the next.
+
+    Seeking on (created_at, id) means deep pages cost the same as the first.
+    """
+    records = await repo.list(limit=page.limit + 1, after=page.after, **filters)
+    has_more = len(records) > page.limit
+    records = records[:page.limit]
+    return {
+        "items": [project(record, page.fields) for record in records],
+        "next_cursor": encode_cursor(repo.sort_key(records[-1])) if has_more else None,
+        "has_more": has_more,
+        "limit": page.limit,
+    }
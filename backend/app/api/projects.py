@@ -5,12 +5,12 @@ from datetime import datetime
 import uuid
 
 from app.api.auth import get_current_user
+from app.api.pagination import PageParams, paginate
+from app.db.repository import Database
+from app.db.session import get_db
 
 router = APIRouter()
 
-# In-memory project store
-projects_db = {}
-
 class ProjectCreate(BaseModel):
     name: str
     description: Optional[str] = None
@@ -33,38 +33,20 @@ class ProjectResponse(BaseModel):
 
 @router.get("", response_model=dict)
 async def list_projects(
-    page: int = 1,
-    page_size: int = 10,
-    current_user: dict = Depends(get_current_user)
+    page: PageParams = Depends(),
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
 ):
-    user_projects = [
-        p for p in projects_db.values() 
-        if p["user_id"] == current_user["id"]
-    ]
-    
-    # Sort by created_at descending
-    user_projects.sort(key=lambda x: x["created_at"], reverse=True)
-    
-    # Paginate
-    start = (page - 1) * page_size
-    end = start + page_size
-    paginated = user_projects[start:end]
-    
     return {
         "success": True,
-        "data": {
-            "items": paginated,
-            "total": len(user_projects),
-            "page": page,
-            "page_size": page_size,
-            "has_more": end < len(user_projects)
-        }
+        "data": await paginate(db.projects, page, user_id=current_user["id"])
     }
 
 @router.post("", response_model=dict)
 async def create_project(
     project: ProjectCreate,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
 ):
     project_id = str(uuid.uuid4())
     now = datetime.utcnow().isoformat()
@@ -85,7 +67,7 @@ async def create_project(
         "updated_at": now,
     }
     
-    projects_db[project_id] = project_data
+    await db.projects.add(project_data)
     
     return {
         "success": True,
@@ -95,9 +77,10 @@ async def create_project(
 @router.get("/{project_id}", response_model=dict)
 async def get_project(
     project_id: str,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
 ):
-    project = projects_db.get(project_id)
+    project = await db.projects.get(project_id)
     if not project or project["user_id"] != current_user["id"]:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -113,9 +96,10 @@ async def get_project(
 async def update_project(
     project_id: str,
     updates: dict,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
 ):
-    project = projects_db.get(project_id)
+    project = await db.projects.get(project_id)
     if not project or project["user_id"] != current_user["id"]:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -128,7 +112,7 @@ async def update_project(
             project[field] = updates[field]
     
     project["updated_at"] = datetime.utcnow().isoformat()
-    projects_db[project_id] = project
+    await db.projects.save(project)
     
     return {
         "success": True,
@@ -138,15 +122,16 @@ async def update_project(
 @router.delete("/{project_id}", response_model=dict)
 async def delete_project(
     project_id: str,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
 ):
-    project = projects_db.get(project_id)
+    project = await db.projects.get(project_id)
     if not project or project["user_id"] != current_user["id"]:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Project not found"
         )
     
-    del projects_db[project_id]
+    await db.projects.delete(project_id)
     
     return {"success": True}
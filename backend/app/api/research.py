@@ -1,15 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    WebSocket,
+    status,
+)
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import AsyncIterator, Optional, List
 from datetime import datetime
+import asyncio
+import copy
 import uuid
 
-from app.api.auth import get_current_user
+from app.api.auth import get_current_user, user_from_token
+from app.api.pagination import PageParams, paginate
+from app.core.config import settings
+from app.db.repository import Database
+from app.db.session import get_db, session_scope
+from app.services.events import Event, EventChannel, research_events
+from app.services.research import get_research_engine
 
 router = APIRouter()
 
-# In-memory store
-research_sessions_db = {}
+TERMINAL_STATUSES = ("completed", "failed", "stopped")
 
 class ResearchSessionCreate(BaseModel):
     question: str
@@ -37,24 +53,21 @@ class ResearchStep(BaseModel):
 @router.get("", response_model=dict)
 async def list_research_sessions(
     project_id: str,
-    current_user: dict = Depends(get_current_user)
+    page: PageParams = Depends(),
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
 ):
-    sessions = [
-        s for s in research_sessions_db.values()
-        if s["project_id"] == project_id
-    ]
-    sessions.sort(key=lambda x: x["created_at"], reverse=True)
-    
     return {
         "success": True,
-        "data": sessions
+        "data": await paginate(db.research_sessions, page, project_id=project_id)
     }
 
 @router.post("", response_model=dict)
 async def create_research_session(
     project_id: str,
     session: ResearchSessionCreate,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
 ):
     session_id = str(uuid.uuid4())
     now = datetime.utcnow().isoformat()
@@ -68,25 +81,18 @@ async def create_research_session(
         "output_format": session.output_format,
         "include_domains": session.include_domains,
         "exclude_domains": session.exclude_domains,
-        "steps": [
-            {
-                "id": str(uuid.uuid4()),
-                "type": "search",
-                "status": "running",
-                "query": session.question,
-                "sources": [],
-                "synthesis": None,
-                "started_at": now,
-                "completed_at": None,
-            }
-        ],
+        "steps": [],
         "final_report": None,
         "sources": [],
         "created_at": now,
         "completed_at": None,
     }
     
-    research_sessions_db[session_id] = session_data
+    await db.research_sessions.add(session_data)
+    # The engine persists progress through its own sessions; the row has
+    # to exist before its first write
+    await db.commit()
+    get_research_engine().start(copy.deepcopy(session_data))
     
     return {
         "success": True,
@@ -97,9 +103,10 @@ async def create_research_session(
 async def get_research_session(
     project_id: str,
     session_id: str,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
 ):
-    session = research_sessions_db.get(session_id)
+    session = await db.research_sessions.get(session_id)
     if not session or session["project_id"] != project_id:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -110,43 +117,163 @@ async def get_research_session(
         "data": session
     }
 
+def _record_deltas(before: dict, after: dict) -> List[tuple]:
+    """Step and source events that turn one saved state of a session into
+    the next, shaped like the ones the running session publishes."""
+    events = []
+    seen = {source["url"] for source in before.get("sources", [])}
+    old_steps = {step["id"]: step for step in before.get("steps", [])}
+    for step in after.get("steps", []):
+        if old_steps.get(step["id"]) != step:
+            events.append(("step", {k: v for k, v in step.items() if k != "sources"}))
+        for source in step.get("sources", []):
+            if source["url"] not in seen:
+                seen.add(source["url"])
+                events.append(("source", {"step_id": step["id"], "source": source}))
+    return events
+
+async def _follow_record(channel: EventChannel, session_id: str) -> None:
+    """Publish a session's saved progress into ``channel`` until it ends."""
+    while not channel.closed:
+        await asyncio.sleep(settings.STREAM_POLL_SECONDS)
+        async with session_scope() as db:
+            record = await db.research_sessions.get(session_id)
+        if record is None:
+            channel.close({"status": "deleted"})
+            return
+        for event_type, data in _record_deltas(channel.state, record):
+            channel.publish(event_type, data)
+        channel.state = record
+        if record["status"] in TERMINAL_STATUSES:
+            channel.publish("status", {"status": record["status"], "completed_at": record.get("completed_at")})
+            channel.close({"status": record["status"]})
+
+async def _session_events(session: dict, last_event_id: Optional[int]) -> AsyncIterator[Optional[Event]]:
+    channel = research_events.get(session["id"])
+    follower = None
+    if channel is None:
+        channel = EventChannel(session)
+        if session["status"] in TERMINAL_STATUSES:
+            # Nothing more will be produced: a snapshot and the end marker
+            channel.close({"status": session["status"]})
+        else:
+            # Running in another process, which publishes to its own
+            # channel; follow what it saves instead
+            follower = asyncio.create_task(_follow_record(channel, session["id"]))
+    try:
+        async for event in channel.subscribe(last_event_id):
+            yield event
+    finally:
+        if follower is not None:
+            follower.cancel()
+
+def _parse_event_id(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+async def _sse_events(session: dict, last_event_id: Optional[int]) -> AsyncIterator[str]:
+    async for event in _session_events(session, last_event_id):
+        yield event.sse() if event is not None else ": keep-alive\n\n"
+
 @router.get("/{session_id}/stream")
 async def stream_research_updates(
     project_id: str,
     session_id: str,
-    current_user: dict = Depends(get_current_user)
+    last_event_id: Optional[str] = Query(None),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
 ):
-    # In production, this would be a WebSocket or SSE endpoint
-    session = research_sessions_db.get(session_id)
+    """Server-Sent Events: a snapshot, then step/source/synthesis/status
+    deltas until the session ends. Reconnecting clients resume after
+    ``Last-Event-ID``."""
+    session = await db.research_sessions.get(session_id)
     if not session or session["project_id"] != project_id:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Research session not found"
         )
     
-    return {
-        "success": True,
-        "data": {
-            "message": "Use WebSocket connection for real-time updates",
-            "session": session
-        }
-    }
+    resume_from = _parse_event_id(last_event_id_header or last_event_id)
+    return StreamingResponse(
+        _sse_events(session, resume_from),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def _wait_for_disconnect(websocket: WebSocket) -> None:
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
+
+async def _send_events(websocket: WebSocket, session: dict, last_event_id: Optional[int]) -> None:
+    async for event in _session_events(session, last_event_id):
+        # send_json waits for the transport, so a slow socket holds back
+        # only its own position in the log
+        await websocket.send_json(event.to_dict() if event is not None else {"event": "ping"})
+
+@router.websocket("/{session_id}/ws")
+async def research_updates_socket(
+    websocket: WebSocket,
+    project_id: str,
+    session_id: str,
+    token: Optional[str] = Query(None),
+    last_event_id: Optional[str] = Query(None),
+):
+    """WebSocket variant of ``/stream``; browsers cannot set headers here,
+    so the bearer token comes in the ``token`` query parameter."""
+    # Short-lived session: the socket may stay open for a long time
+    async with session_scope() as db:
+        user = await user_from_token(token, db)
+        session = await db.research_sessions.get(session_id) if user else None
+    if user is None or not session or session["project_id"] != project_id:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    await websocket.accept()
+    sender = asyncio.create_task(_send_events(websocket, session, _parse_event_id(last_event_id)))
+    receiver = asyncio.create_task(_wait_for_disconnect(websocket))
+    done, pending = await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    if sender in done and sender.exception() is None:
+        await websocket.close()
 
 @router.post("/{session_id}/stop", response_model=dict)
 async def stop_research_session(
     project_id: str,
     session_id: str,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
 ):
-    session = research_sessions_db.get(session_id)
+    session = await db.research_sessions.get(session_id)
     if not session or session["project_id"] != project_id:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Research session not found"
         )
     
-    session["status"] = "stopped"
-    research_sessions_db[session_id] = session
+    if session["status"] in TERMINAL_STATUSES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Research session already {session['status']}"
+        )
+    
+    stopped = await get_research_engine().stop(session_id)
+    if stopped is not None:
+        return {
+            "success": True,
+            "data": stopped
+        }
+    
+    # Running in another process, which picks up the request, stops the
+    # session and saves its final state
+    session["stop_requested_at"] = datetime.utcnow().isoformat()
+    await db.research_sessions.save(session)
     
     return {
         "success": True,
@@ -157,15 +284,18 @@ async def stop_research_session(
 async def delete_research_session(
     project_id: str,
     session_id: str,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
 ):
-    session = research_sessions_db.get(session_id)
+    session = await db.research_sessions.get(session_id)
     if not session or session["project_id"] != project_id:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Research session not found"
         )
     
-    del research_sessions_db[session_id]
+    await get_research_engine().discard(session_id)
+    await db.research_sessions.delete(session_id)
+    research_events.discard(session_id)
     
     return {"success": True}
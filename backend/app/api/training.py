@@ -1,26 +1,39 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import AsyncIterator, Optional, List, Dict, Any, Tuple, Union
 from datetime import datetime
+import random
+import re
 import uuid
 
 from app.api.auth import get_current_user
+from app.api.models import MODEL_CATALOG
+from app.api.pagination import PageParams, paginate
+from app.core.config import settings
+from app.db.repository import Database
+from app.db.session import get_db, session_scope
+from app.services import training_logs, training_metrics
+from app.services.estimator import INSTANCE_TYPES, InstanceEstimate, TrainingEstimate, get_training_estimator
+from app.services.events import Event
+from app.services.orchestrator import TERMINAL_STATUSES, get_training_orchestrator, new_training_run
+from app.services.sweeps import ACTIVE_SWEEP_STATUSES, SEARCH_METHODS, get_sweep_scheduler, grid_size, parse_space
+from app.services.training_queue import get_training_queue, instance_capacity
+from app.services.training_logs import LEVELS, LogPage, LogQuery, to_millis
+from app.services.training_metrics import COLUMNS, DOWNSAMPLE_METHODS
 
 router = APIRouter()
 
-# In-memory store
-training_runs_db = {}
-
 class TrainingConfig(BaseModel):
-    epochs: int = 3
-    learning_rate: float = 0.0001
-    batch_size: int = 4
+    epochs: int = Field(3, ge=1)
+    learning_rate: float = Field(0.0001, gt=0)
+    batch_size: int = Field(4, ge=1)
     warmup_ratio: float = 0.1
     gradient_checkpointing: bool = True
     packing: bool = False
     fine_tune_type: str = "lora"
-    lora_rank: Optional[int] = 16
-    lora_alpha: Optional[int] = 32
+    lora_rank: Optional[int] = Field(16, gt=0)
+    lora_alpha: Optional[int] = Field(32, gt=0)
     quantization_bits: Optional[int] = None
 
 class TrainingRunCreate(BaseModel):
@@ -28,6 +41,68 @@ class TrainingRunCreate(BaseModel):
     dataset_id: str
     config: TrainingConfig
     instance_type: str = "ml.g5.2xlarge"
+    priority: int = Field(0, ge=-10, le=10)  # higher is admitted first
+
+class TrainingEstimateRequest(BaseModel):
+    model_id: str
+    dataset_id: str
+    config: TrainingConfig
+
+class ParameterRange(BaseModel):
+    min: float
+    max: float
+    log: bool = False  # sample uniformly in log space
+    integer: bool = False
+
+class EarlyStopping(BaseModel):
+    enabled: bool = True
+    min_steps: int = Field(50, ge=1)  # first rung
+    reduction_factor: int = Field(3, ge=2)  # keep the top 1/reduction_factor at each rung
+
+class TrainingSweepCreate(BaseModel):
+    name: Optional[str] = None
+    model_id: str
+    dataset_id: str
+    instance_type: str = "ml.g5.2xlarge"
+    config: TrainingConfig = TrainingConfig()  # fixed values of parameters that are not searched
+    parameters: Dict[str, Union[List[Any], ParameterRange]]  # config field -> values or range
+    method: str = Field("random", pattern=f"^({'|'.join(SEARCH_METHODS)})$")
+    max_trials: Optional[int] = Field(None, ge=1, le=200)  # defaults to the grid size, or 20
+    max_concurrency: int = Field(4, ge=1, le=32)
+    budget: Optional[float] = Field(None, gt=0)  # estimated dollars
+    early_stopping: EarlyStopping = EarlyStopping()
+    seed: Optional[int] = None
+    priority: int = Field(0, ge=-10, le=10)  # of the trial runs in the training queue
+
+class LogParams:
+    """Query parameters selecting training log lines."""
+
+    def __init__(
+        self,
+        offset: int = Query(0, ge=0, description="First line to read (next_offset of the previous page)"),
+        tail: Optional[int] = Query(None, ge=1, description="Start this many lines before the end instead"),
+        limit: int = Query(500, ge=1, le=5000),
+        since: Optional[datetime] = Query(None, description="Only lines at or after this time"),
+        until: Optional[datetime] = Query(None, description="Only lines at or before this time"),
+        level: Optional[str] = Query(None, pattern=f"^({'|'.join(LEVELS)})$", description="Minimum level"),
+        pattern: Optional[str] = Query(None, max_length=500, description="Regular expression lines must match"),
+    ):
+        try:
+            compiled = re.compile(pattern) if pattern else None
+        except re.error as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid pattern: {e}"
+            )
+        self.query = LogQuery(
+            offset=offset,
+            tail=tail,
+            limit=limit,
+            since=to_millis(since) if since else None,
+            until=to_millis(until) if until else None,
+            level=level,
+            pattern=compiled,
+        )
 
 class TrainingRunResponse(BaseModel):
     id: str
@@ -35,81 +110,342 @@ class TrainingRunResponse(BaseModel):
     model_id: str
     dataset_id: str
     sagemaker_job_name: str
+    instance_type: str
+    user_id: Optional[str]
     status: str
     config: Dict[str, Any]
+    packing_index: Optional[str]
     metrics: Dict[str, Any]
+    queue: Dict[str, Any]  # priority, position, waiting_for, estimated_start_at, admitted_at
     artifacts: Dict[str, str]
+    job: Optional[Dict[str, Any]]
     started_at: str
     completed_at: Optional[str]
+    error_message: Optional[str]
     estimated_cost: float
+    estimated_duration_seconds: int
 
 @router.get("", response_model=dict)
 async def list_training_runs(
     project_id: str,
-    current_user: dict = Depends(get_current_user)
+    page: PageParams = Depends(),
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
 ):
-    project_runs = [
-        r for r in training_runs_db.values()
-        if r["project_id"] == project_id
-    ]
-    project_runs.sort(key=lambda x: x["started_at"], reverse=True)
-    
     return {
         "success": True,
-        "data": project_runs
+        "data": await paginate(db.training_runs, page, project_id=project_id)
+    }
+
+async def _resolve(
+    db: Database, project_id: str, model_id: str, dataset_id: str, config: TrainingConfig
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """The catalog model and the dataset of a run."""
+    model = next((m for m in MODEL_CATALOG if m["id"] == model_id), None)
+    if not model:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Unknown model"
+        )
+    if config.fine_tune_type not in model["supported_fine_tune_types"]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{model['name']} does not support {config.fine_tune_type} fine-tuning"
+        )
+    dataset = await db.datasets.get(dataset_id)
+    if not dataset or dataset["project_id"] != project_id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Dataset not found"
+        )
+    return model, dataset
+
+async def _estimate(
+    model: Dict[str, Any], dataset: Dict[str, Any], config: TrainingConfig
+) -> TrainingEstimate:
+    try:
+        return await get_training_estimator().estimate_run(model, dataset, config.model_dump())
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+def _fitting(estimates: TrainingEstimate, instance_type: str) -> InstanceEstimate:
+    estimate = estimates.get(instance_type)
+    if estimate is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown instance type {instance_type}"
+        )
+    # Rejected here rather than when the job runs out of memory
+    if not estimate.fits:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=estimate.reason
+        )
+    _check_capacity(instance_type)
+    return estimate
+
+def _check_capacity(instance_type: str) -> None:
+    # A run would wait in the queue forever
+    if instance_capacity(instance_type) <= 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"No capacity is configured for {instance_type}"
+        )
+
+@router.post("/estimate", response_model=dict)
+async def estimate_training(
+    project_id: str,
+    request: TrainingEstimateRequest,
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
+):
+    """Steps, GPU memory, duration and cost of the run on every instance
+    type, cheapest fitting first. Memoized, so it can be called on every
+    change to the config."""
+    model, dataset = await _resolve(db, project_id, request.model_id, request.dataset_id, request.config)
+    estimates = await _estimate(model, dataset, request.config)
+    return {
+        "success": True,
+        "data": estimates.to_dict()
     }
 
 @router.post("", response_model=dict)
 async def start_training(
     project_id: str,
     run: TrainingRunCreate,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
+):
+    model, dataset = await _resolve(db, project_id, run.model_id, run.dataset_id, run.config)
+    estimates = await _estimate(model, dataset, run.config)
+    _fitting(estimates, run.instance_type)
+    run_data = new_training_run(
+        project_id,
+        dataset,
+        run.model_id,
+        run.config.model_dump(),
+        run.instance_type,
+        estimates,
+        user_id=current_user["id"],
+        priority=run.priority,
+    )
+    
+    await db.training_runs.add(run_data)
+    # Committed first so the orchestrator's own session sees the run
+    await db.commit()
+    # Admitted by the orchestrator once its instance type and project
+    # have room; until then the run's queue field has its place in line
+    await get_training_queue().push(run_data)
+    get_training_orchestrator().wake()
+    
+    return {
+        "success": True,
+        "data": run_data
+    }
+
+def _validate_space(request: TrainingSweepCreate, model: Dict[str, Any]) -> Dict[str, Any]:
+    """The searched parameters as stored on the sweep; every value must
+    be valid for its config field."""
+    if not request.parameters:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No parameters to search"
+        )
+    space = {}
+    for name, spec in request.parameters.items():
+        field = TrainingConfig.model_fields.get(name)
+        if field is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown training parameter {name}"
+            )
+        if isinstance(spec, list):
+            if not spec:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"No values for {name}"
+                )
+            values = []
+            for value in spec:
+                try:
+                    values.append(getattr(TrainingConfig(**{name: value}), name))
+                except ValueError:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail=f"Invalid value for {name}: {value!r}"
+                    )
+                if name == "fine_tune_type" and value not in model["supported_fine_tune_types"]:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail=f"{model['name']} does not support {value} fine-tuning"
+                    )
+            space[name] = values
+            continue
+        if request.method == "grid":
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Grid search needs a list of values for {name}"
+            )
+        if field.annotation not in (int, float, Optional[int], Optional[float]):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"{name} is not numeric; give a list of values"
+            )
+        if spec.min >= spec.max or (spec.log and spec.min <= 0):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid range for {name}: need 0 < min < max for log ranges, min < max otherwise"
+            )
+        integer = spec.integer or field.annotation in (int, Optional[int])
+        # The field's bounds are one-sided, so valid ends mean valid samples
+        for end in (spec.min, spec.max):
+            try:
+                TrainingConfig(**{name: int(round(end)) if integer else end})
+            except ValueError:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Invalid range for {name}: {end:g} is not a valid value"
+                )
+        space[name] = {**spec.model_dump(), "integer": integer}
+    return space
+
+@router.post("/sweeps", response_model=dict)
+async def start_sweep(
+    project_id: str,
+    request: TrainingSweepCreate,
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
 ):
-    run_id = str(uuid.uuid4())
-    now = datetime.utcnow().isoformat()
-    job_name = f"llm-toolkit-{run_id[:8]}"
+    """Search ``parameters`` with trial runs of the model on the dataset.
+
+    Trials are launched by the sweep scheduler, at most
+    ``max_concurrency`` at a time, until ``max_trials`` have run or the
+    next one would take the estimated spend past ``budget``. With early
+    stopping, trials are compared on ``eval_loss`` at steps
+    ``min_steps * reduction_factor**k`` and all but the best
+    ``1 / reduction_factor`` are stopped (ASHA)."""
+    model, dataset = await _resolve(db, project_id, request.model_id, request.dataset_id, request.config)
+    if request.instance_type not in INSTANCE_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown instance type {request.instance_type}"
+        )
+    _check_capacity(request.instance_type)
+    parameters = _validate_space(request, model)
+    max_trials = request.max_trials or 20
+    if request.method == "grid":
+        max_trials = min(request.max_trials or 200, grid_size(parse_space(parameters)))
     
-    run_data = {
-        "id": run_id,
+    sweep_data = {
+        "id": str(uuid.uuid4()),
         "project_id": project_id,
-        "model_id": run.model_id,
-        "dataset_id": run.dataset_id,
-        "sagemaker_job_name": job_name,
-        "status": "starting",
-        "config": run.config.model_dump(),
-        "metrics": {
-            "current_epoch": 0,
-            "total_epochs": run.config.epochs,
-            "current_step": 0,
-            "total_steps": 0,
-            "train_loss": None,
-            "eval_loss": None,
-            "learning_rate": run.config.learning_rate,
-        },
-        "artifacts": {
-            "model_artifacts_s3": f"s3://llm-toolkit-artifacts/{project_id}/{run_id}/model",
-            "logs_s3": f"s3://llm-toolkit-artifacts/{project_id}/{run_id}/logs",
-            "checkpoints_s3": f"s3://llm-toolkit-artifacts/{project_id}/{run_id}/checkpoints",
-        },
-        "started_at": now,
+        "user_id": current_user["id"],
+        "name": request.name,
+        "model_id": request.model_id,
+        "dataset_id": request.dataset_id,
+        "instance_type": request.instance_type,
+        "config": request.config.model_dump(),
+        "parameters": parameters,
+        "method": request.method,
+        "max_trials": max_trials,
+        "max_concurrency": request.max_concurrency,
+        "budget": request.budget,
+        "early_stopping": request.early_stopping.model_dump(),
+        "seed": request.seed if request.seed is not None else random.randrange(2 ** 31),
+        "priority": request.priority,
+        "status": "running",
+        "trials": [],
+        "best_trial": None,
+        "spent": 0.0,
+        "budget_exhausted": False,
+        "error_message": None,
+        "created_at": datetime.utcnow().isoformat(),
         "completed_at": None,
-        "estimated_cost": 15.50,  # Mock
     }
     
-    training_runs_db[run_id] = run_data
+    await db.training_sweeps.add(sweep_data)
+    await db.commit()
+    get_sweep_scheduler().wake()
     
     return {
         "success": True,
-        "data": run_data
+        "data": sweep_data
+    }
+
+@router.get("/sweeps", response_model=dict)
+async def list_sweeps(
+    project_id: str,
+    page: PageParams = Depends(),
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
+):
+    return {
+        "success": True,
+        "data": await paginate(db.training_sweeps, page, project_id=project_id)
+    }
+
+@router.get("/sweeps/{sweep_id}", response_model=dict)
+async def get_sweep(
+    project_id: str,
+    sweep_id: str,
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
+):
+    """The sweep with its trials: parameters, run, status, latest
+    ``eval_loss`` and the value at each ASHA rung reached."""
+    sweep = await db.training_sweeps.get(sweep_id)
+    if not sweep or sweep["project_id"] != project_id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Sweep not found"
+        )
+    return {
+        "success": True,
+        "data": sweep
+    }
+
+@router.post("/sweeps/{sweep_id}/stop", response_model=dict)
+async def stop_sweep(
+    project_id: str,
+    sweep_id: str,
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
+):
+    """Launch no more trials and stop the running ones."""
+    sweep = await db.training_sweeps.get(sweep_id)
+    if not sweep or sweep["project_id"] != project_id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Sweep not found"
+        )
+    
+    if sweep["status"] not in ACTIVE_SWEEP_STATUSES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Sweep already {sweep['status']}"
+        )
+    
+    sweep["status"] = "stopping"
+    await db.training_sweeps.save(sweep)
+    await db.commit()
+    get_sweep_scheduler().wake()
+    
+    return {
+        "success": True,
+        "data": sweep
     }
 
 @router.get("/{run_id}", response_model=dict)
 async def get_training_run(
     project_id: str,
     run_id: str,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
 ):
-    run = training_runs_db.get(run_id)
+    run = await db.training_runs.get(run_id)
     if not run or run["project_id"] != project_id:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -124,67 +460,138 @@ async def get_training_run(
 async def get_training_logs(
     project_id: str,
     run_id: str,
-    current_user: dict = Depends(get_current_user)
+    params: LogParams = Depends(),
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
 ):
-    run = training_runs_db.get(run_id)
+    """A page of log lines matching the filters. Continue from
+    ``next_offset``; lines are filtered on the server, so sparse matches
+    may take several pages, each scanning at most a bounded number of
+    lines."""
+    run = await db.training_runs.get(run_id)
     if not run or run["project_id"] != project_id:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Training run not found"
         )
     
-    # Mock logs
+    page = await training_logs.get_training_logs().read(run, params.query)
     return {
         "success": True,
-        "data": {
-            "logs": [
-                {"timestamp": "2024-01-15T10:00:00Z", "message": "Starting training job..."},
-                {"timestamp": "2024-01-15T10:00:05Z", "message": "Loading model weights..."},
-                {"timestamp": "2024-01-15T10:01:00Z", "message": "Training started. Epoch 1/3"},
-            ]
-        }
+        "data": _log_page(page)
+    }
+
+def _log_page(page: LogPage) -> Dict[str, Any]:
+    return {
+        "logs": [line.to_dict() for line in page.lines],
+        "next_offset": page.next_offset,
+        "total_lines": page.total_lines,
     }
 
+async def _log_events(run_id: str, query: LogQuery) -> AsyncIterator[str]:
+    async for page in training_logs.get_training_logs().follow(run_id, query):
+        if page is None:
+            yield ": keep-alive\n\n"
+        else:
+            # The id is the offset to resume from
+            yield Event(page.next_offset, "logs", _log_page(page)).sse()
+    yield Event(query.offset, "end", {"next_offset": query.offset}).sse()
+
+@router.get("/{run_id}/logs/stream")
+async def stream_training_logs(
+    project_id: str,
+    run_id: str,
+    params: LogParams = Depends(),
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
+):
+    """Server-Sent Events following the log: ``logs`` events with the
+    matching lines as they are written, then ``end`` once the run has
+    finished (or ``until`` is passed). Reconnecting clients resume after
+    ``Last-Event-ID``."""
+    run = await db.training_runs.get(run_id)
+    if not run or run["project_id"] != project_id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Training run not found"
+        )
+    
+    query = params.query
+    if last_event_id and last_event_id.isdigit():
+        query.offset, query.tail = int(last_event_id), None
+    query.limit = min(query.limit, settings.TRAINING_LOG_STREAM_BATCH_LINES)
+    return StreamingResponse(
+        _log_events(run_id, query),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @router.get("/{run_id}/metrics", response_model=dict)
 async def get_training_metrics(
     project_id: str,
     run_id: str,
-    current_user: dict = Depends(get_current_user)
+    metrics: Optional[str] = Query(None, description=f"Comma-separated subset of {', '.join(COLUMNS)}"),
+    since_step: Optional[int] = Query(None, ge=0, description="Only points after this step (last_step of the previous poll)"),
+    points: int = Query(500, ge=3, le=10000, description="Downsample each series to at most this many points"),
+    method: str = Query("lttb", pattern=f"^({'|'.join(DOWNSAMPLE_METHODS)})$"),
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
 ):
-    run = training_runs_db.get(run_id)
+    """Step-level metric series of the run, columnar and downsampled on
+    the server."""
+    run = await db.training_runs.get(run_id)
     if not run or run["project_id"] != project_id:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Training run not found"
         )
     
-    # Mock metrics history
+    names = [name.strip() for name in metrics.split(",") if name.strip()] if metrics else list(COLUMNS)
+    unknown = sorted(set(names) - set(COLUMNS))
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown metrics: {', '.join(unknown)}"
+        )
+    
+    data = await training_metrics.get_training_metrics().query(
+        run, metrics=names, since_step=since_step, points=points, method=method
+    )
     return {
         "success": True,
-        "data": {
-            "loss_history": [
-                {"step": 100, "train_loss": 2.5, "eval_loss": 2.6},
-                {"step": 200, "train_loss": 1.8, "eval_loss": 1.9},
-                {"step": 300, "train_loss": 1.2, "eval_loss": 1.4},
-            ]
-        }
+        "data": data
     }
 
 @router.post("/{run_id}/stop", response_model=dict)
 async def stop_training(
     project_id: str,
     run_id: str,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
 ):
-    run = training_runs_db.get(run_id)
+    run = await db.training_runs.get(run_id)
     if not run or run["project_id"] != project_id:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Training run not found"
         )
     
-    run["status"] = "stopping"
-    training_runs_db[run_id] = run
+    # The orchestrator stops the job, or just marks the run stopped if it
+    # was never submitted. Applied to a fresh copy, as the orchestrator's
+    # own updates are, so a change it made since the read above is kept
+    async with session_scope() as fresh:
+        run = await fresh.training_runs.get(run_id)
+        if run["status"] in TERMINAL_STATUSES:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Training run already {run['status']}"
+            )
+        if run["status"] != "stopping":
+            run["status"] = "stopping"
+            await fresh.training_runs.save(run)
+            await fresh.commit()
+    get_training_orchestrator().wake()
     
     return {
         "success": True,
@@ -0,0 +1,173 @@
+import bisect
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from app.db.models import Base, Dataset, Endpoint, Project, ResearchSession, TrainingRun, TrainingSweep, User
+from app.db.repository import Repository, SortKey, record_columns
+
+
+class MemoryTable:
+    """Records of one model with an ordered index per filter column.
+
+    Every indexed column value maps to the sort keys of its records kept in
+    creation order, so ``project_id=...`` listings slice a page off the end
+    of one list instead of scanning and sorting the whole table.
+    """
+
+    def __init__(self, model: Type[Base]):
+        self.model = model
+        self.records: Dict[str, Dict[str, Any]] = {}
+        self.keys: Dict[str, SortKey] = {}
+        self.columns: Dict[str, Dict[str, Any]] = {}
+        self.order: List[SortKey] = []
+        self.indexes: Dict[str, Dict[Any, List[SortKey]]] = {
+            column: {} for column in model.__record_fields__ if column not in ("id", "created_at")
+        }
+
+    def insert(self, record: Dict[str, Any]) -> None:
+        columns = record_columns(self.model, record)
+        key = (columns["created_at"], columns["id"])
+        self.records[key[1]] = dict(record)
+        self.keys[key[1]] = key
+        self.columns[key[1]] = columns
+        bisect.insort(self.order, key)
+        for column, index in self.indexes.items():
+            bisect.insort(index.setdefault(columns[column], []), key)
+
+    def remove(self, record_id: str) -> None:
+        if record_id not in self.records:
+            return
+        key = self.keys.pop(record_id)
+        columns = self.columns.pop(record_id)
+        del self.records[record_id]
+        _discard(self.order, key)
+        for column, index in self.indexes.items():
+            keys = index.get(columns[column])
+            if keys is None:
+                continue
+            _discard(keys, key)
+            if not keys:
+                del index[columns[column]]
+
+    def candidates(self, filters: Dict[str, Any]) -> Tuple[List[SortKey], Dict[str, Any]]:
+        """Pick the smallest index matching one of the filters; the remaining
+        filters are checked per record."""
+        best: Optional[str] = None
+        for column in filters:
+            if column not in self.indexes:
+                continue
+            if best is None or len(self.indexes[column].get(filters[column], ())) < len(
+                self.indexes[best].get(filters[best], ())
+            ):
+                best = column
+        if best is None:
+            return self.order, filters
+        rest = {column: value for column, value in filters.items() if column != best}
+        return self.indexes[best].get(filters[best], []), rest
+
+    def matches(self, record_id: str, filters: Dict[str, Any]) -> bool:
+        columns = self.columns[record_id]
+        return all(columns.get(column) == value for column, value in filters.items())
+
+
+def _discard(keys: List[SortKey], key: SortKey) -> None:
+    i = bisect.bisect_left(keys, key)
+    if i < len(keys) and keys[i] == key:
+        del keys[i]
+
+
+class MemoryRepository(Repository):
+    """Repository over a process-local ``MemoryTable``.
+
+    Writes apply immediately; there is no transaction to roll back.
+    """
+
+    def __init__(self, table: MemoryTable):
+        self.table = table
+        self.model = table.model
+
+    async def get(self, record_id: str) -> Optional[Dict[str, Any]]:
+        record = self.table.records.get(record_id)
+        return dict(record) if record is not None else None
+
+    async def find_one(self, **filters: Any) -> Optional[Dict[str, Any]]:
+        if set(filters) == {"id"}:
+            return await self.get(filters["id"])
+        records = await self.list(limit=1, newest_first=False, **filters)
+        return records[0] if records else None
+
+    async def exists(self, **filters: Any) -> bool:
+        return await self.find_one(**filters) is not None
+
+    async def count(self, **filters: Any) -> int:
+        keys, rest = self.table.candidates(filters)
+        if not rest:
+            return len(keys)
+        return sum(1 for _, record_id in keys if self.table.matches(record_id, rest))
+
+    async def list(
+        self,
+        *,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        newest_first: bool = True,
+        after: Optional[SortKey] = None,
+        **filters: Any,
+    ) -> List[Dict[str, Any]]:
+        keys, rest = self.table.candidates(filters)
+        lo, hi = 0, len(keys)
+        if after is not None:
+            if newest_first:
+                hi = bisect.bisect_left(keys, after)
+            else:
+                lo = bisect.bisect_right(keys, after)
+        positions = range(hi - 1, lo - 1, -1) if newest_first else range(lo, hi)
+
+        if not rest:
+            # Fully served by the index: slice out just the requested page
+            stop = None if limit is None else offset + limit
+            return [self._record(keys[i]) for i in positions[offset:stop]]
+
+        records: List[Dict[str, Any]] = []
+        skipped = 0
+        for i in positions:
+            if not self.table.matches(keys[i][1], rest):
+                continue
+            if skipped < offset:
+                skipped += 1
+                continue
+            records.append(self._record(keys[i]))
+            if limit is not None and len(records) >= limit:
+                break
+        return records
+
+    def _record(self, key: SortKey) -> Dict[str, Any]:
+        return dict(self.table.records[key[1]])
+
+    async def add(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        self.table.remove(record["id"])
+        self.table.insert(record)
+        return record
+
+    async def save(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        # Reinserting keeps the indexes right when a filter column (a run's
+        # status, say) changed
+        return await self.add(record)
+
+    async def delete(self, record_id: str) -> None:
+        self.table.remove(record_id)
+
+
+class MemoryStore:
+    """Process-wide tables shared by every request."""
+
+    def __init__(self):
+        self.tables: Dict[Type[Base], MemoryTable] = {
+            model: MemoryTable(model)
+            for model in (User, Project, Dataset, TrainingRun, TrainingSweep, Endpoint, ResearchSession)
+        }
+
+    def repository(self, model: Type[Base]) -> MemoryRepository:
+        return MemoryRepository(self.tables[model])
+
+
+memory_store = MemoryStore()
@@ -0,0 +1,110 @@
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy import JSON, DateTime, Index, String
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+
+# Records keep their API shape in ``data``; the columns duplicate the
+# fields we filter and sort on so they can be indexed.
+DocumentJSON = JSON().with_variant(JSONB(), "postgresql")
+
+
+class Base(DeclarativeBase):
+    # column name -> record field it is copied from
+    __record_fields__: Dict[str, str] = {}
+
+
+class User(Base):
+    __tablename__ = "users"
+    __record_fields__ = {"id": "id", "email": "email", "created_at": "created_at"}
+
+    id: Mapped[str] = mapped_column(String(36), primary_key=True)
+    email: Mapped[str] = mapped_column(String(320), unique=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+    data: Mapped[Dict[str, Any]] = mapped_column(DocumentJSON)
+
+
+class Project(Base):
+    __tablename__ = "projects"
+    __record_fields__ = {"id": "id", "user_id": "user_id", "created_at": "created_at"}
+    __table_args__ = (Index("ix_projects_user_id_created_at", "user_id", "created_at"),)
+
+    id: Mapped[str] = mapped_column(String(36), primary_key=True)
+    user_id: Mapped[str] = mapped_column(String(36), index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+    data: Mapped[Dict[str, Any]] = mapped_column(DocumentJSON)
+
+
+class Dataset(Base):
+    __tablename__ = "datasets"
+    __record_fields__ = {
+        "id": "id",
+        "project_id": "project_id",
+        "content_hash": "content_hash",
+        "created_at": "created_at",
+    }
+    __table_args__ = (Index("ix_datasets_project_id_created_at", "project_id", "created_at"),)
+
+    id: Mapped[str] = mapped_column(String(36), primary_key=True)
+    project_id: Mapped[str] = mapped_column(String(36), index=True)
+    content_hash: Mapped[Optional[str]] = mapped_column(String(64), index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+    data: Mapped[Dict[str, Any]] = mapped_column(DocumentJSON)
+
+
+class TrainingRun(Base):
+    __tablename__ = "training_runs"
+    __record_fields__ = {
+        "id": "id",
+        "project_id": "project_id",
+        "status": "status",
+        "created_at": "started_at",
+    }
+    __table_args__ = (Index("ix_training_runs_project_id_created_at", "project_id", "created_at"),)
+
+    id: Mapped[str] = mapped_column(String(36), primary_key=True)
+    project_id: Mapped[str] = mapped_column(String(36), index=True)
+    status: Mapped[str] = mapped_column(String(32), index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+    data: Mapped[Dict[str, Any]] = mapped_column(DocumentJSON)
+
+
+class TrainingSweep(Base):
+    __tablename__ = "training_sweeps"
+    __record_fields__ = {
+        "id": "id",
+        "project_id": "project_id",
+        "status": "status",
+        "created_at": "created_at",
+    }
+    __table_args__ = (Index("ix_training_sweeps_project_id_created_at", "project_id", "created_at"),)
+
+    id: Mapped[str] = mapped_column(String(36), primary_key=True)
+    project_id: Mapped[str] = mapped_column(String(36), index=True)
+    status: Mapped[str] = mapped_column(String(32), index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+    data: Mapped[Dict[str, Any]] = mapped_column(DocumentJSON)
+
+
+class Endpoint(Base):
+    __tablename__ = "endpoints"
+    __record_fields__ = {"id": "id", "project_id": "project_id", "status": "status", "created_at": "created_at"}
+    __table_args__ = (Index("ix_endpoints_project_id_created_at", "project_id", "created_at"),)
+
+    id: Mapped[str] = mapped_column(String(36), primary_key=True)
+    project_id: Mapped[str] = mapped_column(String(36), index=True)
+    status: Mapped[str] = mapped_column(String(32), index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+    data: Mapped[Dict[str, Any]] = mapped_column(DocumentJSON)
+
+
+class ResearchSession(Base):
+    __tablename__ = "research_sessions"
+    __record_fields__ = {"id": "id", "project_id": "project_id", "created_at": "created_at"}
+    __table_args__ = (Index("ix_research_sessions_project_id_created_at", "project_id", "created_at"),)
+
+    id: Mapped[str] = mapped_column(String(36), primary_key=True)
+    project_id: Mapped[str] = mapped_column(String(36), index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+    data: Mapped[Dict[str, Any]] = mapped_column(DocumentJSON)
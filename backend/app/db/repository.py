@@ -0,0 +1,176 @@
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+from sqlalchemy import delete, func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import flag_modified
+
+from app.db.models import Base, Dataset, Endpoint, Project, ResearchSession, TrainingRun, TrainingSweep, User
+
+# (created_at, id): the order every listing uses
+SortKey = Tuple[datetime, str]
+
+
+def record_columns(model: Type[Base], record: Dict[str, Any]) -> Dict[str, Any]:
+    """Values of the model's indexed columns, taken from the record."""
+    values = {}
+    for column, field in model.__record_fields__.items():
+        value = record.get(field)
+        if column == "created_at" and isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        values[column] = value
+    return values
+
+
+class Repository(ABC):
+    """Dict-in, dict-out access to one collection.
+
+    Routers keep working with plain record dicts; filters name the
+    model's indexed columns. Listings are ordered by (created_at, id);
+    ``after`` continues a listing strictly past a previous sort key.
+    """
+
+    model: Type[Base]
+
+    def sort_key(self, record: Dict[str, Any]) -> SortKey:
+        columns = record_columns(self.model, record)
+        return columns["created_at"], columns["id"]
+
+    @abstractmethod
+    async def get(self, record_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def find_one(self, **filters: Any) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def exists(self, **filters: Any) -> bool:
+        ...
+
+    @abstractmethod
+    async def count(self, **filters: Any) -> int:
+        ...
+
+    @abstractmethod
+    async def list(
+        self,
+        *,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        newest_first: bool = True,
+        after: Optional[SortKey] = None,
+        **filters: Any,
+    ) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def add(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    async def save(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    async def delete(self, record_id: str) -> None:
+        ...
+
+
+class SQLRepository(Repository):
+    def __init__(self, session: AsyncSession, model: Type[Base]):
+        self.session = session
+        self.model = model
+
+    async def get(self, record_id: str) -> Optional[Dict[str, Any]]:
+        row = await self.session.get(self.model, record_id)
+        return dict(row.data) if row else None
+
+    async def find_one(self, **filters: Any) -> Optional[Dict[str, Any]]:
+        stmt = select(self.model.data).filter_by(**filters).limit(1)
+        data = await self.session.scalar(stmt)
+        return dict(data) if data is not None else None
+
+    async def exists(self, **filters: Any) -> bool:
+        stmt = select(self.model.id).filter_by(**filters).limit(1)
+        return await self.session.scalar(stmt) is not None
+
+    async def count(self, **filters: Any) -> int:
+        stmt = select(func.count()).select_from(self.model).filter_by(**filters)
+        return await self.session.scalar(stmt)
+
+    async def list(
+        self,
+        *,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        newest_first: bool = True,
+        after: Optional[SortKey] = None,
+        **filters: Any,
+    ) -> List[Dict[str, Any]]:
+        key = tuple_(self.model.created_at, self.model.id)
+        if newest_first:
+            order = (self.model.created_at.desc(), self.model.id.desc())
+        else:
+            order = (self.model.created_at.asc(), self.model.id.asc())
+        stmt = select(self.model.data).filter_by(**filters).order_by(*order)
+        if after is not None:
+            # Seek past the previous page on the (owner, created_at) index
+            # rather than counting through it with OFFSET
+            stmt = stmt.where(key < tuple_(*after) if newest_first else key > tuple_(*after))
+        if offset:
+            stmt = stmt.offset(offset)
+        if limit is not None:
+            stmt = stmt.limit(limit)
+        return [dict(data) for data in await self.session.scalars(stmt)]
+
+    async def add(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        self.session.add(self.model(**record_columns(self.model, record), data=record))
+        await self.session.flush()
+        return record
+
+    async def save(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        row = await self.session.get(self.model, record["id"])
+        if row is None:
+            return await self.add(record)
+        for column, value in record_columns(self.model, record).items():
+            setattr(row, column, value)
+        row.data = dict(record)
+        # Nested values may have been mutated in place
+        flag_modified(row, "data")
+        await self.session.flush()
+        return record
+
+    async def delete(self, record_id: str) -> None:
+        await self.session.execute(delete(self.model).where(self.model.id == record_id))
+
+
+class Database:
+    """Repositories sharing one unit of work (one per request)."""
+
+    def __init__(
+        self,
+        repository_factory: Callable[[Type[Base]], Repository],
+        session: Optional[AsyncSession] = None,
+    ):
+        self.session = session
+        self.users = repository_factory(User)
+        self.projects = repository_factory(Project)
+        self.datasets = repository_factory(Dataset)
+        self.training_runs = repository_factory(TrainingRun)
+        self.training_sweeps = repository_factory(TrainingSweep)
+        self.endpoints = repository_factory(Endpoint)
+        self.research_sessions = repository_factory(ResearchSession)
+
+    @classmethod
+    def for_session(cls, session: AsyncSession) -> "Database":
+        return cls(lambda model: SQLRepository(session, model), session)
+
+    async def commit(self) -> None:
+        if self.session is not None:
+            await self.session.commit()
+
+    async def rollback(self) -> None:
+        if self.session is not None:
+            await self.session.rollback()
@@ -0,0 +1,80 @@
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.core.config import settings
+from app.db.memory import memory_store
+from app.db.models import Base
+from app.db.repository import Database
+
+_ASYNC_DRIVERS = {
+    "postgresql://": "postgresql+asyncpg://",
+    "postgresql+psycopg2://": "postgresql+asyncpg://",
+    "sqlite://": "sqlite+aiosqlite://",
+}
+
+
+def async_database_url(url: str) -> str:
+    for sync_prefix, async_prefix in _ASYNC_DRIVERS.items():
+        if url.startswith(sync_prefix):
+            return async_prefix + url[len(sync_prefix):]
+    return url
+
+
+def _engine_options(url: str) -> Dict[str, Any]:
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "pool_size": settings.DATABASE_POOL_SIZE,
+        "max_overflow": settings.DATABASE_MAX_OVERFLOW,
+        "pool_pre_ping": True,
+        "pool_recycle": 1800,
+    }
+
+
+# memory:// keeps everything in this process (single worker, no persistence)
+IN_MEMORY = settings.DATABASE_URL.startswith("memory://")
+
+if IN_MEMORY:
+    engine = None
+    SessionLocal = None
+else:
+    _url = async_database_url(settings.DATABASE_URL)
+    engine = create_async_engine(_url, **_engine_options(_url))
+    SessionLocal = async_sessionmaker(engine, expire_on_commit=False)
+
+
+async def init_db() -> None:
+    if engine is None:
+        return
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+
+async def close_db() -> None:
+    if engine is not None:
+        await engine.dispose()
+
+
+@asynccontextmanager
+async def session_scope() -> AsyncIterator[Database]:
+    """Unit of work for code running outside a request (background jobs)."""
+    if SessionLocal is None:
+        yield Database(memory_store.repository)
+        return
+    async with SessionLocal() as session:
+        db = Database.for_session(session)
+        try:
+            yield db
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+
+
+async def get_db() -> AsyncIterator[Database]:
+    # FastAPI caches dependencies per request, so every dependency and the
+    # route itself share this one session
+    async with session_scope() as db:
+        yield db
@@ -5,14 +5,39 @@ import structlog
 
 from app.api import auth, projects, models, datasets, training, endpoints, research, assistant
 from app.core.config import settings
+from app.db.session import close_db, init_db
+from app.services.autoscaling import get_autoscaler, shutdown_autoscaler
+from app.services.inference import shutdown_inference_gateway
+from app.services.locks import shutdown_locks
+from app.services.orchestrator import get_training_orchestrator, shutdown_training_orchestrator
+from app.services.response_cache import get_response_cache, shutdown_response_cache
+from app.services.research import get_research_engine, shutdown_research_engine
+from app.services.sweeps import get_sweep_scheduler, shutdown_sweep_scheduler
+from app.services.training_queue import shutdown_training_queue
+from app.services.validation import validation_manager
+from app.services.workers import shutdown_process_pool
 
 logger = structlog.get_logger()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Starting LLM Toolkit API")
+    await init_db()
+    await get_autoscaler().start()
+    await get_training_orchestrator().start()
+    await get_sweep_scheduler().start()
     yield
     logger.info("Shutting down LLM Toolkit API")
+    await shutdown_sweep_scheduler()
+    await shutdown_training_orchestrator()
+    await shutdown_training_queue()
+    await shutdown_autoscaler()
+    await shutdown_research_engine()
+    await shutdown_inference_gateway()
+    await shutdown_response_cache()
+    await shutdown_locks()
+    shutdown_process_pool()
+    await close_db()
 
 app = FastAPI(
     title="LLM Toolkit API",
@@ -42,3 +67,13 @@ app.include_router(assistant.router, prefix="/api/assistant", tags=["assistant"]
 @app.get("/api/health")
 async def health_check():
     return {"status": "healthy", "version": "0.1.0"}
+
+@app.get("/api/health/caches")
+async def cache_stats():
+    engine = get_research_engine()
+    responses = get_response_cache()
+    return {
+        "validation": validation_manager.cache.stats(),
+        "research_fetch": engine.cache.stats() if engine.cache is not None else None,
+        "responses": responses.stats() if responses is not None else None,
+    }
@@ -0,0 +1,511 @@
+import asyncio
+import json
+import math
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import structlog
+
+from app.core.config import settings
+from app.db.session import session_scope
+from app.services.inference import LoadSample, get_inference_gateway
+from app.services.locks import get_locks
+
+logger = structlog.get_logger()
+
+# How long to stay on the in-process load board after Redis fails
+REDIS_RETRY_SECONDS = 30.0
+# Held by the one process that resizes endpoints
+LEADER_LOCK = "autoscaler"
+
+# Metrics that add up across instances; targets for them are per instance
+PER_INSTANCE_METRICS = ("rps", "tokens_per_second", "concurrency")
+METRICS = PER_INSTANCE_METRICS + ("p95_latency_ms",)
+
+
+def metric_value(load: LoadSample, metric: str) -> float:
+    return float(getattr(load, metric))
+
+
+def combine_loads(samples: List[LoadSample]) -> LoadSample:
+    """One endpoint's load across API processes, each of which sees only
+    the requests it served."""
+    idle = [sample.idle_seconds for sample in samples if sample.idle_seconds is not None]
+    return LoadSample(
+        rps=sum(sample.rps for sample in samples),
+        tokens_per_second=sum(sample.tokens_per_second for sample in samples),
+        p95_latency_ms=max((sample.p95_latency_ms for sample in samples), default=0.0),
+        queue_depth=sum(sample.queue_depth for sample in samples),
+        inflight=sum(sample.inflight for sample in samples),
+        idle_seconds=min(idle) if idle else None,
+    )
+
+
+class ScalingPolicy(ABC):
+    @abstractmethod
+    def desired(self, current: int, load: LoadSample) -> int:
+        """Instance count this policy wants, before limits and cooldowns."""
+        ...
+
+
+class TargetTracking(ScalingPolicy):
+    """Keeps ``metric`` at ``target``: per instance for rates and
+    concurrency, endpoint-wide for latency."""
+
+    def __init__(self, metric: str, target: float):
+        self.metric = metric
+        self.target = target
+
+    def desired(self, current: int, load: LoadSample) -> int:
+        value = metric_value(load, self.metric)
+        if self.metric in PER_INSTANCE_METRICS:
+            return math.ceil(value / self.target)
+        if current == 0:
+            return 0
+        # Latency falls roughly in proportion to added capacity
+        return math.ceil(current * value / self.target)
+
+
+@dataclass
+class ScalingStep:
+    change: int
+    above: Optional[float] = None
+    below: Optional[float] = None
+
+
+class StepScaling(ScalingPolicy):
+    """Adds or removes a fixed number of instances when ``metric``
+    crosses a step. The largest breached ``above`` bound wins; ``below``
+    steps apply only when no ``above`` step does."""
+
+    def __init__(self, metric: str, steps: List[ScalingStep]):
+        self.metric = metric
+        self.steps = steps
+
+    def desired(self, current: int, load: LoadSample) -> int:
+        value = metric_value(load, self.metric)
+        above = [step for step in self.steps if step.above is not None and value > step.above]
+        if above:
+            return current + max(above, key=lambda step: step.above).change
+        below = [step for step in self.steps if step.below is not None and value < step.below]
+        if below:
+            return current + min(below, key=lambda step: step.below).change
+        return current
+
+
+@dataclass
+class ScalingConfig:
+    policy: ScalingPolicy
+    min_instances: int = 1
+    max_instances: int = 4
+    scale_out_cooldown: float = 60.0
+    scale_in_cooldown: float = 300.0
+    scale_to_zero_after: Optional[float] = None
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> "ScalingConfig":
+        """Config stored on an endpoint record (see ``EndpointScaling``)."""
+        data = data or {}
+        metric = data.get("metric", "concurrency")
+        if data.get("policy") == "step":
+            policy: ScalingPolicy = StepScaling(metric, [ScalingStep(**step) for step in data.get("steps", [])])
+        else:
+            policy = TargetTracking(metric, data.get("target", 8.0))
+        return cls(
+            policy=policy,
+            min_instances=data.get("min_instances", 1),
+            max_instances=data.get("max_instances", 4),
+            scale_out_cooldown=data.get("scale_out_cooldown_seconds", 60.0),
+            scale_in_cooldown=data.get("scale_in_cooldown_seconds", 300.0),
+            scale_to_zero_after=data.get("scale_to_zero_after_seconds"),
+        )
+
+
+@dataclass
+class ScalingState:
+    last_scale_out: float = -math.inf
+    last_scale_in: float = -math.inf
+
+
+def decide(config: ScalingConfig, current: int, load: LoadSample, now: float, state: ScalingState) -> int:
+    """Instance count to move to, applying limits, scale-to-zero and
+    cooldowns to the policy's wish. Updates ``state`` when it scales."""
+    busy = load.concurrency > 0
+    # Unknown idle time (nothing served yet) never counts as idle
+    idle = load.idle_seconds
+    expired = config.scale_to_zero_after is not None and idle is not None and idle >= config.scale_to_zero_after
+    if config.scale_to_zero_after is not None and not busy and (current == 0 or expired):
+        # Only requests (through wake) bring it back from zero
+        target = 0
+    else:
+        target = config.policy.desired(current, load)
+        target = min(max(target, config.min_instances, 1), config.max_instances)
+    if target > current:
+        # Scaling up from zero is never held back: requests are waiting
+        if current > 0 and now - config.scale_out_cooldown < state.last_scale_out:
+            return current
+        state.last_scale_out = now
+    elif target < current:
+        # Scale in only once things have settled after any change
+        if now - config.scale_in_cooldown < max(state.last_scale_in, state.last_scale_out):
+            return current
+        state.last_scale_in = now
+    return target
+
+
+class Provisioner(ABC):
+    @abstractmethod
+    async def set_instance_count(self, endpoint: Dict[str, Any], count: int) -> None:
+        """Make ``count`` instances serve the endpoint; returns once they do."""
+        ...
+
+
+class LocalProvisioner(Provisioner):
+    """For the fake backend: instances exist as soon as the endpoint
+    record says so, since the gateway routes over ``instance_count``."""
+
+    async def set_instance_count(self, endpoint: Dict[str, Any], count: int) -> None:
+        pass
+
+
+class SageMakerProvisioner(Provisioner):
+    """Changes the desired instance count of the endpoint's production
+    variant. Classic SageMaker endpoints cannot run zero instances, so
+    scale-to-zero keeps one."""
+
+    VARIANT = "AllTraffic"
+
+    def __init__(self, region: Optional[str] = None):
+        import boto3
+
+        self._client = boto3.client("sagemaker", region_name=region or settings.AWS_REGION)
+
+    async def set_instance_count(self, endpoint: Dict[str, Any], count: int) -> None:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            None,
+            lambda: self._client.update_endpoint_weights_and_capacities(
+                EndpointName=endpoint["sagemaker_endpoint_name"],
+                DesiredWeightsAndCapacities=[
+                    {"VariantName": self.VARIANT, "DesiredInstanceCount": max(count, 1)}
+                ],
+            ),
+        )
+
+
+class LoadBoard(ABC):
+    """Where each API process reports the load it sees per endpoint, so
+    the leader can scale on all of it."""
+
+    name: str
+
+    @abstractmethod
+    async def publish(self, process_id: str, loads: Dict[str, LoadSample], ttl: float) -> None:
+        """Replace this process's report; it is ignored after ``ttl`` seconds."""
+        ...
+
+    @abstractmethod
+    async def collect(self) -> Dict[str, List[LoadSample]]:
+        """Current reports, by endpoint name."""
+        ...
+
+    async def aclose(self) -> None:
+        pass
+
+
+class MemoryLoadBoard(LoadBoard):
+    """Reports within one API process."""
+
+    name = "memory"
+
+    def __init__(self) -> None:
+        # process id -> (expires at, loads)
+        self._reports: Dict[str, Tuple[float, Dict[str, LoadSample]]] = {}
+
+    async def publish(self, process_id: str, loads: Dict[str, LoadSample], ttl: float) -> None:
+        self._reports[process_id] = (time.time() + ttl, loads)
+
+    async def collect(self) -> Dict[str, List[LoadSample]]:
+        now = time.time()
+        collected: Dict[str, List[LoadSample]] = {}
+        for process_id, (expires_at, loads) in list(self._reports.items()):
+            if expires_at <= now:
+                del self._reports[process_id]
+                continue
+            for name, load in loads.items():
+                collected.setdefault(name, []).append(load)
+        return collected
+
+
+class RedisLoadBoard(LoadBoard):
+    """Reports from every API process, in a Redis hash keyed by process.
+
+    While Redis is unreachable the in-process ``fallback`` serves instead,
+    so the leader scales on its own load only; Redis is retried after
+    ``REDIS_RETRY_SECONDS``.
+    """
+
+    name = "redis"
+    KEY = "llm-toolkit:autoscaling:load"
+
+    def __init__(self, url: str, fallback: LoadBoard):
+        import redis.asyncio as redis
+
+        self._errors = (redis.RedisError, OSError)
+        self._client = redis.from_url(url, socket_connect_timeout=1.0, socket_timeout=1.0)
+        self._fallback = fallback
+        self._retry_at = 0.0
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self._retry_at
+
+    async def publish(self, process_id: str, loads: Dict[str, LoadSample], ttl: float) -> None:
+        await self._fallback.publish(process_id, loads, ttl)
+        if self.available:
+            report = {
+                "expires_at": time.time() + ttl,
+                "loads": {name: asdict(load) for name, load in loads.items()},
+            }
+            try:
+                await self._client.hset(self.KEY, process_id, json.dumps(report))
+            except self._errors as e:
+                self._failed(e)
+
+    async def collect(self) -> Dict[str, List[LoadSample]]:
+        if self.available:
+            try:
+                raw = await self._client.hgetall(self.KEY)
+            except self._errors as e:
+                self._failed(e)
+            else:
+                return await self._parse(raw)
+        return await self._fallback.collect()
+
+    async def _parse(self, raw: Dict[bytes, bytes]) -> Dict[str, List[LoadSample]]:
+        now = time.time()
+        collected: Dict[str, List[LoadSample]] = {}
+        expired = []
+        for process_id, value in raw.items():
+            report = json.loads(value)
+            if report["expires_at"] <= now:
+                expired.append(process_id)
+                continue
+            for name, load in report["loads"].items():
+                collected.setdefault(name, []).append(LoadSample(**load))
+        if expired:
+            try:
+                await self._client.hdel(self.KEY, *expired)
+            except self._errors as e:
+                self._failed(e)
+        return collected
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    def _failed(self, error: Exception) -> None:
+        logger.warning("Autoscaling load board falling back to memory", error=str(error))
+        self._retry_at = time.monotonic() + REDIS_RETRY_SECONDS
+
+
+@dataclass
+class _Watch:
+    state: ScalingState = field(default_factory=ScalingState)
+    # When this process first saw the endpoint in service
+    since: float = field(default_factory=time.monotonic)
+    last_load: Optional[LoadSample] = None
+    events: Deque[Dict[str, Any]] = field(default_factory=lambda: deque(maxlen=50))
+    waking: Optional[asyncio.Future] = None
+
+
+class AutoscalingController:
+    """Resizes endpoints with ``auto_scaling`` enabled.
+
+    Every ``interval`` seconds each API process reports the load its
+    inference gateway sees per endpoint to the ``board``. One process at a
+    time holds the leader lock; it sums the reports, asks each endpoint's
+    policy for a target and, if that differs, applies it through the
+    provisioner and records the new ``instance_count``. Requests to an
+    endpoint scaled to zero call ``wake``, in any process, to bring one
+    instance back before they are served.
+    """
+
+    def __init__(self, provisioner: Provisioner, board: LoadBoard, interval: Optional[float] = None):
+        self.provisioner = provisioner
+        self.board = board
+        self.interval = interval or settings.AUTOSCALING_INTERVAL_SECONDS
+        self.process_id = uuid.uuid4().hex
+        self._watches: Dict[str, _Watch] = {}
+        self._leader_token: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def lease(self) -> float:
+        # Outlives a slow tick, and a dead leader is replaced soon after
+        return 3 * self.interval
+
+    def watch(self, endpoint_id: str) -> None:
+        self._watches.setdefault(endpoint_id, _Watch())
+
+    def status(self, endpoint_id: str) -> Optional[Dict[str, Any]]:
+        watch = self._watches.get(endpoint_id)
+        if watch is None:
+            return None
+        return {
+            "load": asdict(watch.last_load) if watch.last_load is not None else None,
+            "events": list(watch.events),
+        }
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def aclose(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._leader_token is not None:
+            await get_locks().release(LEADER_LOCK, self._leader_token)
+            self._leader_token = None
+        await self.board.aclose()
+
+    async def tick(self) -> None:
+        endpoints = await self._auto_scaled()
+        gateway = get_inference_gateway()
+        loads = {}
+        for endpoint in endpoints:
+            name = endpoint["sagemaker_endpoint_name"]
+            loads[name] = self._watches[endpoint["id"]].last_load = gateway.load(name)
+        await self.board.publish(self.process_id, loads, self.lease)
+        if not await self._lead():
+            return
+        reports = await self.board.collect()
+        for endpoint in endpoints:
+            try:
+                await self._evaluate(endpoint, reports.get(endpoint["sagemaker_endpoint_name"], []))
+            except Exception:
+                logger.exception("Autoscaling evaluation failed", endpoint_id=endpoint["id"])
+
+    async def wake(self, endpoint: Dict[str, Any]) -> Dict[str, Any]:
+        """Scale an endpoint at zero instances to one; concurrent callers
+        share the scale-up. Returns the updated record."""
+        self.watch(endpoint["id"])
+        watch = self._watches[endpoint["id"]]
+        if watch.waking is None:
+            watch.waking = asyncio.ensure_future(self._scale(endpoint["id"], 1, "cold start"))
+            watch.waking.add_done_callback(lambda _: setattr(watch, "waking", None))
+        record = await asyncio.wait_for(
+            asyncio.shield(watch.waking), settings.AUTOSCALING_COLD_START_TIMEOUT_SECONDS
+        )
+        watch.state.last_scale_out = time.monotonic()
+        return record
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.tick()
+            except Exception:
+                logger.exception("Autoscaling tick failed")
+
+    async def _auto_scaled(self) -> List[Dict[str, Any]]:
+        """In-service endpoints with ``auto_scaling``, watching exactly those
+        (endpoints may be created or changed by other processes)."""
+        endpoints: List[Dict[str, Any]] = []
+        after = None
+        async with session_scope() as db:
+            while True:
+                page = await db.endpoints.list(limit=100, newest_first=False, after=after, status="inservice")
+                endpoints.extend(endpoint for endpoint in page if endpoint.get("auto_scaling"))
+                if len(page) < 100:
+                    break
+                after = db.endpoints.sort_key(page[-1])
+        ids = {endpoint["id"] for endpoint in endpoints}
+        for endpoint_id in list(self._watches):
+            if endpoint_id not in ids and self._watches[endpoint_id].waking is None:
+                del self._watches[endpoint_id]
+        for endpoint_id in ids:
+            self.watch(endpoint_id)
+        return endpoints
+
+    async def _lead(self) -> bool:
+        """Whether this process is the leader, renewing or taking the lock."""
+        locks = get_locks()
+        if self._leader_token is not None:
+            if await locks.renew(LEADER_LOCK, self._leader_token, self.lease):
+                return True
+            logger.info("Autoscaler lost leadership", process_id=self.process_id)
+        self._leader_token = await locks.acquire(LEADER_LOCK, self.lease)
+        if self._leader_token is not None:
+            logger.info("Autoscaler took leadership", process_id=self.process_id)
+        return self._leader_token is not None
+
+    async def _evaluate(self, endpoint: Dict[str, Any], reports: List[LoadSample]) -> None:
+        watch = self._watches[endpoint["id"]]
+        load = combine_loads(reports)
+        if load.idle_seconds is None:
+            # Nothing served since a deploy or restart: idle since it was
+            # first watched, so scale-to-zero waits out its grace period
+            load.idle_seconds = time.monotonic() - watch.since
+        watch.last_load = load
+        current = endpoint["instance_count"]
+        target = decide(ScalingConfig.from_dict(endpoint.get("scaling")), current, load, time.monotonic(), watch.state)
+        if target != current:
+            await self._scale(endpoint["id"], target, "policy", load)
+
+    async def _scale(
+        self,
+        endpoint_id: str,
+        count: int,
+        reason: str,
+        load: Optional[LoadSample] = None,
+    ) -> Dict[str, Any]:
+        async with session_scope() as db:
+            endpoint = await db.endpoints.get(endpoint_id)
+            if endpoint is None:
+                raise LookupError(endpoint_id)
+            previous = endpoint["instance_count"]
+            if previous == count:
+                return endpoint
+            await self.provisioner.set_instance_count(endpoint, count)
+            endpoint["instance_count"] = count
+            endpoint["updated_at"] = datetime.utcnow().isoformat()
+            await db.endpoints.save(endpoint)
+            await db.commit()
+        logger.info("Endpoint scaled", endpoint_id=endpoint_id, instances=count, previous=previous, reason=reason)
+        # Watches come and go with the endpoint list; keep this event anyway
+        self._watches.setdefault(endpoint_id, _Watch()).events.append({
+            "at": endpoint["updated_at"],
+            "from": previous,
+            "to": count,
+            "reason": reason,
+            "load": asdict(load) if load is not None else None,
+        })
+        return endpoint
+
+
+_controller: Optional[AutoscalingController] = None
+
+
+def get_autoscaler() -> AutoscalingController:
+    global _controller
+    if _controller is None:
+        provisioner = SageMakerProvisioner() if settings.AUTOSCALING_PROVISIONER == "sagemaker" else LocalProvisioner()
+        board: LoadBoard = MemoryLoadBoard()
+        if settings.AUTOSCALING_BACKEND == "redis":
+            board = RedisLoadBoard(settings.REDIS_URL, fallback=board)
+        _controller = AutoscalingController(provisioner, board)
+    return _controller
+
+
+async def shutdown_autoscaler() -> None:
+    global _controller
+    if _controller is not None:
+        await _controller.aclose()
+        _controller = None
@@ -0,0 +1,212 @@
+"""Offline replay of a traffic trace against an autoscaling policy.
+
+Runs the same ``decide`` logic as the live controller on a discrete-event
+model of an endpoint, so policies can be compared on cost and latency
+without deploying anything; ``benchmarks.autoscaling`` is the command
+line. A trace is JSONL of ``{"at": seconds, "prompt_tokens",
+"completion_tokens"}``, or a synthetic day-shaped one.
+"""
+import heapq
+import itertools
+import json
+import math
+import random
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional
+
+from app.core.config import settings
+from app.services.autoscaling import ScalingConfig, ScalingState, decide
+from app.services.inference import LoadWindow
+
+
+@dataclass
+class TraceRequest:
+    at: float
+    prompt_tokens: int
+    completion_tokens: int
+
+
+def load_trace(path: str) -> List[TraceRequest]:
+    with open(path, encoding="utf-8") as f:
+        requests = [TraceRequest(**json.loads(line)) for line in f if line.strip()]
+    return sorted(requests, key=lambda request: request.at)
+
+
+def synthetic_trace(
+    duration: float,
+    base_rps: float,
+    peak_rps: float,
+    period: float = 3600.0,
+    seed: int = 0,
+) -> List[TraceRequest]:
+    """Poisson arrivals whose rate swings between ``base_rps`` and
+    ``peak_rps`` once per ``period``, with log-normal token counts."""
+    rng = random.Random(seed)
+    requests, now = [], 0.0
+    while True:
+        # Thinning: draw at the peak rate, keep in proportion to the rate now
+        now += rng.expovariate(peak_rps)
+        if now >= duration:
+            return requests
+        rate = base_rps + (peak_rps - base_rps) * (1 - math.cos(2 * math.pi * now / period)) / 2
+        if rng.random() < rate / peak_rps:
+            requests.append(TraceRequest(
+                at=now,
+                prompt_tokens=int(rng.lognormvariate(5.5, 0.8)),
+                completion_tokens=min(int(rng.lognormvariate(4.5, 0.7)), 1024),
+            ))
+
+
+class _Instance:
+    def __init__(self, created_at: float, ready_at: float, slots: int):
+        self.created_at = created_at
+        self.ready_at = ready_at
+        self.free = slots
+        self.busy = 0
+        self.draining = False
+
+
+def _percentile(ordered: List[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+def simulate(
+    trace: List[TraceRequest],
+    config: ScalingConfig,
+    initial_instances: int = 1,
+    slots_per_instance: Optional[int] = None,
+    base_latency: Optional[float] = None,
+    token_latency: Optional[float] = None,
+    prefill_latency: Optional[float] = None,
+    provisioning_delay: float = 120.0,
+    interval: Optional[float] = None,
+    window: Optional[float] = None,
+    cost_per_instance_hour: float = 1.41,
+) -> Dict[str, Any]:
+    """Replay ``trace`` and report latency, cost and scaling activity.
+
+    Each instance serves ``slots_per_instance`` requests at once; a
+    request holds its slot for the fake model server's latency (base +
+    prefill + decode). New instances serve after ``provisioning_delay``
+    but are billed from the moment they are requested. Instances removed
+    while busy finish their requests first.
+    """
+    slots = slots_per_instance or settings.INFERENCE_MAX_BATCH_SIZE
+    base = settings.INFERENCE_FAKE_BASE_LATENCY_MS / 1000 if base_latency is None else base_latency
+    per_token = settings.INFERENCE_FAKE_TOKEN_LATENCY_MS / 1000 if token_latency is None else token_latency
+    prefill = settings.INFERENCE_FAKE_PREFILL_LATENCY_MS / 1000 if prefill_latency is None else prefill_latency
+    interval = interval or settings.AUTOSCALING_INTERVAL_SECONDS
+    load_window = LoadWindow(window)
+    state = ScalingState()
+
+    events: List[Any] = []
+    order = itertools.count()
+
+    def schedule(at: float, kind: str, payload: Any = None) -> None:
+        heapq.heappush(events, (at, next(order), kind, payload))
+
+    instances: List[_Instance] = []
+    queue: Deque[TraceRequest] = deque()
+    latencies: List[float] = []
+    timeline: List[Dict[str, Any]] = []
+    instance_seconds = 0.0
+    max_queue = 0
+
+    def active() -> List[_Instance]:
+        return [instance for instance in instances if not instance.draining]
+
+    def resize(now: float, target: int, reason: str) -> None:
+        nonlocal instance_seconds
+        current = len(active())
+        if target > current:
+            for _ in range(target - current):
+                instance = _Instance(now, now + provisioning_delay, slots)
+                instances.append(instance)
+                schedule(instance.ready_at, "ready")
+        else:
+            # Drop instances still provisioning, then idle, then busy ones
+            victims = sorted(active(), key=lambda i: (i.ready_at <= now, i.busy))[:current - target]
+            for instance in victims:
+                instance.draining = True
+                if instance.busy == 0:
+                    instances.remove(instance)
+                    instance_seconds += now - instance.created_at
+        timeline.append({"at": round(now, 3), "from": current, "to": target, "reason": reason})
+
+    def dispatch(now: float) -> None:
+        while queue:
+            ready = [i for i in active() if i.ready_at <= now and i.free > 0]
+            if not ready:
+                return
+            instance = max(ready, key=lambda i: i.free)
+            request = queue.popleft()
+            instance.free -= 1
+            instance.busy += 1
+            service = base + prefill * request.prompt_tokens + per_token * request.completion_tokens
+            schedule(now + service, "done", (instance, request))
+
+    for _ in range(initial_instances):
+        instances.append(_Instance(0.0, 0.0, slots))
+    for request in trace:
+        schedule(request.at, "arrive", request)
+    end = trace[-1].at if trace else 0.0
+    schedule(interval, "tick")
+
+    now = 0.0
+    while events:
+        now, _, kind, payload = heapq.heappop(events)
+        if kind == "arrive":
+            queue.append(payload)
+            max_queue = max(max_queue, len(queue))
+            if not active():
+                # What the live path's wake() does for a scaled-to-zero endpoint
+                state.last_scale_out = now
+                resize(now, 1, "cold start")
+        elif kind == "done":
+            instance, request = payload
+            instance.free += 1
+            instance.busy -= 1
+            latencies.append(now - request.at)
+            load_window.record(now, now - request.at, request.completion_tokens)
+            if instance.draining and instance.busy == 0:
+                instances.remove(instance)
+                instance_seconds += now - instance.created_at
+        elif kind == "tick":
+            load = load_window.sample(
+                now,
+                queue_depth=len(queue),
+                inflight=sum(instance.busy for instance in instances),
+            )
+            if load.idle_seconds is None:
+                # As the controller does: idle since the endpoint was watched
+                load.idle_seconds = now
+            current = len(active())
+            target = decide(config, current, load, now, state)
+            if target != current:
+                resize(now, target, "policy")
+            if now < end or queue or any(instance.busy for instance in instances):
+                schedule(now + interval, "tick")
+        dispatch(now)
+
+    instance_seconds += sum(now - instance.created_at for instance in instances)
+    latencies.sort()
+    return {
+        "requests": len(trace),
+        "completed": len(latencies),
+        "duration_seconds": round(now, 3),
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+            "p50": round(_percentile(latencies, 0.50) * 1000, 2),
+            "p95": round(_percentile(latencies, 0.95) * 1000, 2),
+            "p99": round(_percentile(latencies, 0.99) * 1000, 2),
+        },
+        "max_queue_depth": max_queue,
+        "peak_instances": max((event["to"] for event in timeline), default=initial_instances),
+        "instance_hours": round(instance_seconds / 3600, 4),
+        "cost": round(instance_seconds / 3600 * cost_per_instance_hour, 4),
+        "scaling_events": len(timeline),
+        "timeline": timeline,
+    }
@@ -0,0 +1,82 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Generic, Hashable, Optional, TypeVar
+
+V = TypeVar("V")
+
+
+class LRUCache(Generic[V]):
+    """Thread-safe LRU cache bounded by total weight.
+
+    ``weigh`` maps a value to its cost (bytes, rows, ...); by default every
+    entry weighs 1 so ``capacity`` is an entry count. ``on_evict`` is
+    called with each key and value pushed out by capacity, outside the lock.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        weigh: Optional[Callable[[V], int]] = None,
+        on_evict: Optional[Callable[[Hashable, V], Any]] = None,
+    ):
+        self.capacity = capacity
+        self._weigh = weigh or (lambda value: 1)
+        self._on_evict = on_evict
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._weight = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[V]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: V) -> None:
+        weight = self._weigh(value)
+        evicted = []
+        with self._lock:
+            if key in self._entries:
+                self._weight -= self._entries.pop(key)[1]
+            if weight > self.capacity:
+                evicted.append((key, value))
+            else:
+                self._entries[key] = (value, weight)
+                self._weight += weight
+            while self._weight > self.capacity:
+                evicted_key, (evicted_value, evicted_weight) = self._entries.popitem(last=False)
+                self._weight -= evicted_weight
+                self.evictions += 1
+                evicted.append((evicted_key, evicted_value))
+        if self._on_evict is not None:
+            for evicted_key, evicted_value in evicted:
+                self._on_evict(evicted_key, evicted_value)
+
+    def pop(self, key: Hashable) -> Optional[V]:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            self._weight -= entry[1]
+            return entry[0]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "weight": self._weight,
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,361 @@
+import csv
+import hashlib
+import io
+import re
+import zlib
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.ingestion import IngestResult, ingest_chunks, iter_csv_rows, iter_lines, parse_record, row_text
+from app.services.jobs import DatasetJob
+from app.services.storage import StorageBackend
+from app.services.validation import check_schema
+
+DEFAULT_THRESHOLD = 0.8
+NUM_PERM = 64
+SHINGLE_WORDS = 5
+SEED = 1
+# Pick LSH bands so a pair at the threshold becomes a candidate this often
+CANDIDATE_RECALL = 0.9
+# Signatures are kept as b-bit (8-bit) minhashes to bound memory per row
+SIGNATURE_COLLISION = 1 / 256
+MAX_SHINGLES_PER_SLICE = 4096
+VERIFY_SLICE = 100_000
+MAX_REPORTED_CLUSTERS = 100
+MAX_REPORTED_ROWS = 20
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    return _WHITESPACE.sub(" ", text).strip().lower()
+
+
+def lsh_params(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """Return ``(bands, rows)`` with the most rows per band (fewest spurious
+    candidates) that still reaches ``CANDIDATE_RECALL`` at ``threshold``."""
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        if 1 - (1 - threshold ** rows) ** bands >= CANDIDATE_RECALL:
+            best = (bands, rows)
+    return best
+
+
+_permutations: Dict[Tuple[int, int], Tuple[np.ndarray, np.ndarray]] = {}
+
+
+def _get_permutations(num_perm: int, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    # Multiply-shift hashing: odd 64-bit multipliers, keep the high 32 bits
+    key = (num_perm, seed)
+    if key not in _permutations:
+        rng = np.random.default_rng(seed)
+        a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+        _permutations[key] = (a[:, None], b[:, None])
+    return _permutations[key]
+
+
+def _shingle_hashes(text: str) -> np.ndarray:
+    words = text.split(" ")
+    if len(words) <= SHINGLE_WORDS:
+        shingles = {text}
+    else:
+        shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    return np.fromiter((zlib.crc32(s.encode()) for s in shingles), dtype=np.uint64, count=len(shingles))
+
+
+def minhash(text: str, num_perm: int, seed: int = SEED) -> np.ndarray:
+    a, b = _get_permutations(num_perm, seed)
+    hashes = _shingle_hashes(text)
+    signature = np.full(num_perm, np.iinfo(np.uint32).max, dtype=np.uint32)
+    for i in range(0, len(hashes), MAX_SHINGLES_PER_SLICE):
+        chunk = hashes[None, i:i + MAX_SHINGLES_PER_SLICE]
+        values = ((a * chunk + b) >> np.uint64(32)).min(axis=1).astype(np.uint32)
+        np.minimum(signature, values, out=signature)
+    return signature
+
+
+@dataclass
+class FingerprintBatch:
+    valid: np.ndarray       # bool (n,)
+    exact: np.ndarray       # uint64 (n,)
+    signatures: np.ndarray  # uint8 (n, num_perm)
+    band_keys: np.ndarray   # uint32 (n, bands)
+
+
+def fingerprint_batch(start: int, records: List[Any], num_perm: int, bands: int) -> FingerprintBatch:
+    """Exact hash, MinHash signature and LSH band keys per row. Runs in a
+    worker process."""
+    n = len(records)
+    valid = np.zeros(n, dtype=bool)
+    exact = np.zeros(n, dtype=np.uint64)
+    full = np.zeros((n, num_perm), dtype=np.uint32)
+    for i, record in enumerate(records):
+        _, row, error = parse_record(record)
+        if error is not None or check_schema(row) is not None:
+            continue
+        text = normalize_text(row_text(row))
+        valid[i] = True
+        exact[i] = int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "little")
+        full[i] = minhash(text, num_perm)
+
+    rows = num_perm // bands
+    mixers = np.random.default_rng(SEED + 1).integers(1, 2 ** 63, size=rows, dtype=np.uint64)
+    band_keys = (full.reshape(n, bands, rows).astype(np.uint64) * mixers).sum(axis=2) >> np.uint64(32)
+    return FingerprintBatch(valid, exact, (full & 0xFF).astype(np.uint8), band_keys.astype(np.uint32))
+
+
+def _run_pairs(members: np.ndarray, keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Pair every member of a run of equal keys with the run's first
+    (lowest-index) member."""
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    sorted_members = members[order]
+    is_start = np.empty(len(keys), dtype=bool)
+    if len(keys):
+        is_start[0] = True
+        is_start[1:] = sorted_keys[1:] != sorted_keys[:-1]
+    firsts = sorted_members[is_start][np.cumsum(is_start) - 1]
+    duplicate = ~is_start
+    return firsts[duplicate], sorted_members[duplicate]
+
+
+class _UnionFind:
+    # Only rows that appear in a duplicate pair are tracked
+    def __init__(self):
+        self.parent: Dict[int, int] = {}
+
+    def find(self, x: int) -> int:
+        root = x
+        while self.parent.get(root, root) != root:
+            root = self.parent[root]
+        while x != root:
+            self.parent[x], x = root, self.parent.get(x, x)
+        return root
+
+    def union(self, x: int, y: int) -> None:
+        self.parent.setdefault(x, x)
+        self.parent.setdefault(y, y)
+        rx, ry = self.find(x), self.find(y)
+        if rx != ry:
+            # The lowest row index stays the cluster representative
+            self.parent[max(rx, ry)] = min(rx, ry)
+
+
+@dataclass
+class DedupResult:
+    threshold: float
+    num_perm: int
+    bands: int
+    total_rows: int = 0
+    invalid_rows: int = 0
+    exact_duplicate_rows: int = 0
+    near_duplicate_rows: int = 0
+    cluster_count: int = 0
+    clusters: List[Dict[str, Any]] = field(default_factory=list)
+    derived: Optional[IngestResult] = None
+    derived_dataset_id: Optional[str] = None
+
+    @property
+    def unique_rows(self) -> int:
+        return self.total_rows - self.invalid_rows - self.exact_duplicate_rows - self.near_duplicate_rows
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "threshold": self.threshold,
+            "num_perm": self.num_perm,
+            "bands": self.bands,
+            "total_rows": self.total_rows,
+            "invalid_rows": self.invalid_rows,
+            "unique_rows": self.unique_rows,
+            "exact_duplicate_rows": self.exact_duplicate_rows,
+            "near_duplicate_rows": self.near_duplicate_rows,
+            "cluster_count": self.cluster_count,
+            "clusters": self.clusters,
+            "derived_dataset_id": self.derived_dataset_id,
+        }
+
+
+class DedupJob(DatasetJob):
+    """Finds exact and near-duplicate rows with MinHash/LSH.
+
+    Fingerprints are computed in the process pool and kept as fixed-width
+    NumPy columns (about 150 bytes per row with the defaults), so memory
+    grows linearly with row count and holds no per-row Python objects.
+    Optionally writes a deduplicated copy that keeps the first row of
+    every cluster and drops rows that fail schema validation.
+    """
+
+    description = "Dataset deduplication"
+
+    def __init__(
+        self,
+        storage: StorageBackend,
+        storage_key: str,
+        file_format: str,
+        total_rows: int,
+        threshold: float = DEFAULT_THRESHOLD,
+        write_derived: bool = False,
+        num_perm: int = NUM_PERM,
+    ):
+        super().__init__(storage, storage_key, file_format, total_rows)
+        self.threshold = threshold
+        self.write_derived = write_derived
+        self.num_perm = num_perm
+        self.bands, _ = lsh_params(num_perm, threshold)
+
+    def execute(self) -> Optional[DedupResult]:
+        parts: List[FingerprintBatch] = []
+        for batch in self.map_batches(fingerprint_batch, self.num_perm, self.bands):
+            parts.append(batch)
+            self.rows_processed += len(batch.valid)
+        if self.cancelled:
+            return None
+
+        result = DedupResult(self.threshold, self.num_perm, self.bands)
+        valid = np.concatenate([p.valid for p in parts]) if parts else np.zeros(0, dtype=bool)
+        exact = np.concatenate([p.exact for p in parts]) if parts else np.zeros(0, dtype=np.uint64)
+        signatures = np.concatenate([p.signatures for p in parts]) if parts else np.zeros((0, self.num_perm), np.uint8)
+        band_keys = np.concatenate([p.band_keys for p in parts]) if parts else np.zeros((0, self.bands), np.uint32)
+        del parts
+
+        result.total_rows = len(valid)
+        result.invalid_rows = int((~valid).sum())
+        rows = np.flatnonzero(valid)
+        clusters = _UnionFind()
+
+        # Exact duplicates: equal normalized-text hashes
+        firsts, dupes = _run_pairs(rows, exact[rows])
+        result.exact_duplicate_rows = len(dupes)
+        for x, y in zip(firsts.tolist(), dupes.tolist()):
+            clusters.union(x, y)
+
+        # Near duplicates among the remaining distinct rows
+        distinct = np.setdiff1d(rows, dupes, assume_unique=True)
+        candidates = [_run_pairs(distinct, band_keys[distinct, band]) for band in range(self.bands)]
+        if candidates:
+            pair_codes = np.unique(np.concatenate([
+                first.astype(np.int64) * result.total_rows + second for first, second in candidates
+            ]))
+        else:
+            pair_codes = np.zeros(0, dtype=np.int64)
+        for i in range(0, len(pair_codes), VERIFY_SLICE):
+            codes = pair_codes[i:i + VERIFY_SLICE]
+            first, second = codes // result.total_rows, codes % result.total_rows
+            agreement = (signatures[first] == signatures[second]).mean(axis=1)
+            similarity = (agreement - SIGNATURE_COLLISION) / (1 - SIGNATURE_COLLISION)
+            keep = similarity >= self.threshold
+            for x, y in zip(first[keep].tolist(), second[keep].tolist()):
+                clusters.union(x, y)
+
+        members: Dict[int, List[int]] = {}
+        for row in clusters.parent:
+            members.setdefault(clusters.find(row), []).append(row)
+        drop = np.zeros(result.total_rows, dtype=bool)
+        for root, rows_in_cluster in members.items():
+            rows_in_cluster.sort()
+            drop[rows_in_cluster[1:]] = True
+        result.near_duplicate_rows = int(drop.sum()) - result.exact_duplicate_rows
+        result.cluster_count = len(members)
+        for root, rows_in_cluster in sorted(members.items(), key=lambda item: -len(item[1]))[:MAX_REPORTED_CLUSTERS]:
+            is_exact = len({int(exact[row]) for row in rows_in_cluster}) == 1
+            result.clusters.append({
+                "representative_row": root,
+                "size": len(rows_in_cluster),
+                "kind": "exact" if is_exact else "near",
+                "rows": rows_in_cluster[:MAX_REPORTED_ROWS],
+            })
+
+        if self.write_derived and not self.cancelled:
+            keep = valid & ~drop
+            result.derived = ingest_chunks(self._iter_kept_chunks(keep), self._storage, self.file_format)
+        return result
+
+    def _iter_kept_chunks(self, keep: np.ndarray) -> Iterator[bytes]:
+        chunk_size = settings.DATASET_UPLOAD_CHUNK_SIZE
+        lines = iter_lines(self._storage.iter_chunks(self.storage_key, chunk_size))
+        buffer = io.BytesIO()
+        if self.file_format == "jsonl":
+            records = (line for line in lines if line.strip())
+            for index, line in enumerate(records):
+                if keep[index]:
+                    buffer.write(line + b"\n")
+                    if buffer.tell() >= chunk_size:
+                        yield buffer.getvalue()
+                        buffer = io.BytesIO()
+        else:
+            text = io.TextIOWrapper(buffer, encoding="utf-8", newline="", write_through=True)
+            writer = None
+            for row in iter_csv_rows(lines):
+                if row.error is not None or not keep[row.index]:
+                    continue
+                if writer is None:
+                    writer = csv.DictWriter(text, fieldnames=list(row.data))
+                    writer.writeheader()
+                writer.writerow(row.data)
+                if buffer.tell() >= chunk_size:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    def result_dict(self) -> Dict[str, Any]:
+        return self.result.to_dict()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            **super().to_dict(),
+            "threshold": self.threshold,
+            "write_derived": self.write_derived,
+        }
+
+
+class DedupManager:
+    """Tracks the latest deduplication job per dataset."""
+
+    def __init__(self):
+        self._jobs: Dict[str, DedupJob] = {}
+
+    def get(self, dataset_id: str) -> Optional[DedupJob]:
+        return self._jobs.get(dataset_id)
+
+    def start(
+        self,
+        dataset: Dict[str, Any],
+        storage: StorageBackend,
+        threshold: float,
+        write_derived: bool,
+        on_complete: Optional[Callable[[DedupResult], Any]] = None,
+    ) -> DedupJob:
+        job = self._jobs.get(dataset["id"])
+        if job and job.is_active:
+            if job.threshold == threshold and job.write_derived == write_derived:
+                return job
+            job.cancel()
+        job = DedupJob(
+            storage,
+            dataset["storage_key"],
+            dataset["format"],
+            dataset["row_count"],
+            threshold=threshold,
+            write_derived=write_derived,
+        )
+        if on_complete:
+            job.add_callback(on_complete)
+        self._jobs[dataset["id"]] = job
+        return job.start()
+
+    def discard(self, dataset_id: str) -> None:
+        job = self._jobs.pop(dataset_id, None)
+        if job:
+            job.cancel()
+
+
+dedup_manager = DedupManager()
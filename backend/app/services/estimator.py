@@ -0,0 +1,290 @@
+import asyncio
+import json
+import math
+from array import array
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.services.cache import LRUCache
+from app.services.validation import ValidationManager, validation_manager
+
+
+@dataclass(frozen=True)
+class InstanceType:
+    name: str
+    gpus: int
+    gpu_memory_gb: float  # per GPU
+    tflops: float  # dense bf16/fp16 peak per GPU
+    price_per_hour: float  # on-demand training price
+
+
+# SageMaker training instances the toolkit can launch
+INSTANCE_TYPES: Dict[str, InstanceType] = {
+    instance.name: instance
+    for instance in (
+        InstanceType("ml.g4dn.xlarge", 1, 16, 65, 0.736),
+        InstanceType("ml.g5.xlarge", 1, 24, 70, 1.408),
+        InstanceType("ml.g5.2xlarge", 1, 24, 70, 1.515),
+        InstanceType("ml.g5.12xlarge", 4, 24, 70, 7.09),
+        InstanceType("ml.g5.48xlarge", 8, 24, 70, 20.36),
+        InstanceType("ml.p3.2xlarge", 1, 16, 125, 3.825),
+        InstanceType("ml.p4d.24xlarge", 8, 40, 312, 37.688),
+    )
+}
+
+# Model FLOP utilization reached by the trainer; 4-bit base weights are
+# dequantized on every matmul
+MFU = 0.35
+QUANTIZED_MFU = 0.25
+# Provisioning, image pull and model download before the first step
+STARTUP_SECONDS = 360
+# CUDA context, allocator fragmentation and framework buffers per GPU
+OVERHEAD_GB = 1.5
+FRAGMENTATION = 1.1
+# Sequence length rows are packed into
+PACKED_SEQUENCE_LENGTH = 4096
+
+
+def packed_sequence_length(context_length: int) -> int:
+    return min(context_length, PACKED_SEQUENCE_LENGTH)
+
+
+def parse_parameter_count(value: str) -> float:
+    """``"2.7B"`` -> 2.7e9."""
+    scale = {"K": 1e3, "M": 1e6, "B": 1e9, "T": 1e12}
+    value = value.strip().upper()
+    if value and value[-1] in scale:
+        return float(value[:-1]) * scale[value[-1]]
+    return float(value)
+
+
+def expected_batch_max(lengths: np.ndarray, batch_size: int) -> float:
+    """Expected length of the longest of ``batch_size`` rows drawn at
+    random, i.e. what every row of an unpacked batch is padded to."""
+    ordered = np.sort(lengths).astype(np.float64)
+    cdf = np.arange(1, len(ordered) + 1) / len(ordered)
+    weights = cdf ** batch_size - np.concatenate(([0.0], cdf[:-1])) ** batch_size
+    return float(ordered @ weights)
+
+
+@dataclass
+class DatasetProfile:
+    """Token statistics of a dataset as seen by one model: totals from
+    the dataset record, per-row lengths when a validation result for the
+    model's context length is cached."""
+
+    content_hash: str
+    rows: int
+    tokens: int
+    lengths: Optional[np.ndarray] = None
+    packed_sequences: Optional[int] = None
+
+
+@dataclass
+class InstanceEstimate:
+    instance_type: str
+    gpus: int
+    fits: bool
+    memory_per_gpu_gb: float
+    gpu_memory_gb: float
+    steps: int
+    tokens_per_second: float
+    duration_seconds: int
+    cost: float
+    reason: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass
+class TrainingEstimate:
+    sequence_length: int
+    tokens_per_epoch: int
+    padding_ratio: float  # share of processed tokens that are padding
+    trainable_parameters: int
+    instances: List[InstanceEstimate]
+
+    def get(self, instance_type: str) -> Optional[InstanceEstimate]:
+        return next((i for i in self.instances if i.instance_type == instance_type), None)
+
+    @property
+    def recommended(self) -> Optional[InstanceEstimate]:
+        fitting = [i for i in self.instances if i.fits]
+        return min(fitting, key=lambda i: i.cost) if fitting else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        recommended = self.recommended
+        return {
+            "sequence_length": self.sequence_length,
+            "tokens_per_epoch": self.tokens_per_epoch,
+            "padding_ratio": round(self.padding_ratio, 4),
+            "trainable_parameters": self.trainable_parameters,
+            "recommended_instance": recommended.instance_type if recommended else None,
+            "instances": [i.to_dict() for i in self.instances],
+        }
+
+
+def estimate(model: Dict[str, Any], dataset: DatasetProfile, config: Dict[str, Any]) -> TrainingEstimate:
+    """Steps, memory, wall-clock and cost of fine-tuning ``model`` on
+    ``dataset`` with ``config`` on every instance type.
+
+    The model shape is approximated from the parameter count (a
+    Llama-style decoder with ``P ~ 12 * layers * d_model**2`` and 128
+    dimensions per layer), which is close enough for the catalog's
+    models. Weights, gradients and AdamW state are assumed sharded
+    across an instance's GPUs (FSDP); ``batch_size`` is per GPU.
+    Instance prices are scaled so the model's recommended instance costs
+    the catalog's ``estimated_cost_per_hour``. Raises ValueError for a
+    config no run could use.
+    """
+    parameters = parse_parameter_count(model["parameter_count"])
+    d_model = (parameters * 128 / 12) ** (1 / 3)
+    layers = max(1, round(d_model / 128))
+    fine_tune_type = config.get("fine_tune_type", "lora")
+    batch_size = config.get("batch_size", 4)
+    epochs = config.get("epochs", 3)
+    rank = 16 if config.get("lora_rank") is None else config["lora_rank"]
+    for name, value in (("epochs", epochs), ("batch_size", batch_size), ("lora_rank", rank)):
+        if value < 1:
+            raise ValueError(f"{name} must be at least 1, got {value}")
+    bits = config.get("quantization_bits") or (4 if fine_tune_type == "qlora" else 16)
+    context_length = model["context_length"]
+
+    # Tokens processed per epoch: packed rows fill whole sequences,
+    # unpacked batches are padded to their longest row
+    if dataset.lengths is not None and len(dataset.lengths):
+        lengths = np.minimum(dataset.lengths, context_length)
+        real_tokens = int(lengths.sum())
+        longest = int(lengths.max())
+        padded_row = expected_batch_max(lengths, batch_size)
+    else:
+        real_tokens = min(dataset.tokens, dataset.rows * context_length)
+        mean = real_tokens / max(dataset.rows, 1)
+        longest = int(min(context_length, 2 * mean))
+        padded_row = mean
+    if config.get("packing"):
+        sequence_length = packed_sequence_length(context_length)
+        # A packing plan's sequence count, or the ideal if there is none
+        sequences = dataset.packed_sequences or math.ceil(real_tokens / sequence_length)
+        tokens_per_epoch = sequences * sequence_length
+    else:
+        sequence_length = max(longest, 1)
+        sequences = dataset.rows
+        tokens_per_epoch = int(dataset.rows * padded_row)
+    padding_ratio = 1 - real_tokens / tokens_per_epoch if tokens_per_epoch else 0.0
+
+    if fine_tune_type == "full":
+        trainable = parameters
+    else:
+        # Adapters on the four attention projections of every layer
+        trainable = layers * 4 * 2 * rank * d_model
+    checkpointing = config.get("gradient_checkpointing", True)
+    # Forward and activation gradients over the frozen weights, weight
+    # gradients only for the trainable ones; checkpointing reruns the forward
+    flops_per_token = 4 * parameters + 2 * trainable + (2 * parameters if checkpointing else 0)
+
+    states = parameters * bits / 8 + trainable * 14  # bf16 grads, fp32 master weights and AdamW moments
+    per_layer = 2 * d_model if checkpointing else 34 * d_model
+    activations = batch_size * sequence_length * (layers * per_layer + 34 * d_model)
+    prices = _prices(model)
+
+    instances = []
+    for instance in INSTANCE_TYPES.values():
+        memory = (states / instance.gpus + activations) * FRAGMENTATION / 1e9 + OVERHEAD_GB
+        reason = None
+        if instance.gpus * instance.gpu_memory_gb < model["min_gpu_memory_gb"]:
+            reason = f"{model['name']} needs at least {model['min_gpu_memory_gb']} GB of GPU memory"
+        elif memory > instance.gpu_memory_gb:
+            reason = (
+                f"Needs ~{memory:.1f} GB per GPU, {instance.name} has {instance.gpu_memory_gb:g} GB; "
+                "lower batch_size, enable gradient_checkpointing or use qlora"
+            )
+        steps = math.ceil(sequences / (batch_size * instance.gpus)) * epochs
+        tokens_per_second = (
+            instance.gpus * instance.tflops * 1e12 * (QUANTIZED_MFU if bits < 16 else MFU) / flops_per_token
+        )
+        duration = int(STARTUP_SECONDS + tokens_per_epoch * epochs / tokens_per_second)
+        instances.append(InstanceEstimate(
+            instance_type=instance.name,
+            gpus=instance.gpus,
+            fits=reason is None,
+            memory_per_gpu_gb=round(memory, 2),
+            gpu_memory_gb=instance.gpu_memory_gb,
+            steps=steps,
+            tokens_per_second=round(tokens_per_second, 1),
+            duration_seconds=duration,
+            cost=round(duration / 3600 * prices[instance.name], 2),
+            reason=reason,
+        ))
+    instances.sort(key=lambda i: (not i.fits, i.cost))
+    return TrainingEstimate(sequence_length, tokens_per_epoch, padding_ratio, int(trainable), instances)
+
+
+def _prices(model: Dict[str, Any]) -> Dict[str, float]:
+    reference = INSTANCE_TYPES.get(model.get("recommended_instance", ""))
+    if reference is None or not model.get("estimated_cost_per_hour"):
+        return {name: instance.price_per_hour for name, instance in INSTANCE_TYPES.items()}
+    scale = model["estimated_cost_per_hour"] / reference.price_per_hour
+    return {name: instance.price_per_hour * scale for name, instance in INSTANCE_TYPES.items()}
+
+
+class TrainingEstimator:
+    """Memoizes estimates by (dataset content, model, config), so a form
+    can ask again on every change."""
+
+    def __init__(self, capacity: int = 4096):
+        self.cache: LRUCache[TrainingEstimate] = LRUCache(capacity)
+
+    async def estimate(
+        self, model: Dict[str, Any], dataset: DatasetProfile, config: Dict[str, Any]
+    ) -> TrainingEstimate:
+        key = (
+            dataset.content_hash,
+            dataset.lengths is not None,
+            dataset.packed_sequences,
+            model["id"],
+            json.dumps(config, sort_keys=True),
+        )
+        result = self.cache.get(key)
+        if result is None:
+            # Sorting the row lengths of a large dataset takes a while
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(None, estimate, model, dataset, config)
+            self.cache.put(key, result)
+        return result
+
+    async def estimate_run(
+        self, model: Dict[str, Any], dataset: Dict[str, Any], config: Dict[str, Any]
+    ) -> TrainingEstimate:
+        """Estimate for a dataset record, using its row lengths if it was
+        validated for the model's context length."""
+        context_length = model["context_length"]
+        validated = validation_manager.cache.get(ValidationManager.cache_key(dataset, context_length))
+        profile = profile_dataset(dataset, context_length, validated.token_lengths if validated else None)
+        return await self.estimate(model, profile, config)
+
+
+def profile_dataset(
+    dataset: Dict[str, Any], context_length: int, lengths: Optional[array] = None
+) -> DatasetProfile:
+    plan = dataset.get("packing_plans", {}).get(str(packed_sequence_length(context_length)))
+    return DatasetProfile(
+        content_hash=dataset["content_hash"],
+        rows=dataset.get("row_count") or 0,
+        tokens=dataset.get("estimated_tokens") or 0,
+        lengths=np.frombuffer(lengths, dtype=np.uint32) if lengths is not None else None,
+        packed_sequences=plan["sequences"] if plan else None,
+    )
+
+
+_estimator: Optional[TrainingEstimator] = None
+
+
+def get_training_estimator() -> TrainingEstimator:
+    global _estimator
+    if _estimator is None:
+        _estimator = TrainingEstimator()
+    return _estimator
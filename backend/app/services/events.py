@@ -0,0 +1,145 @@
+import asyncio
+import itertools
+import json
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional
+
+from app.core.config import settings
+
+
+@dataclass
+class Event:
+    id: int
+    type: str
+    data: Dict[str, Any]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"id": self.id, "event": self.type, "data": self.data}
+
+    def sse(self) -> str:
+        return f"id: {self.id}\nevent: {self.type}\ndata: {json.dumps(self.data, default=str)}\n\n"
+
+
+class EventChannel:
+    """Append-only event log written by one producer and read by many.
+
+    The producer never waits on subscribers. Each subscriber keeps its own
+    position in the log and pulls at the pace its connection drains, so a
+    slow client only delays itself. A subscriber that falls further behind
+    than the retained window, or resumes from an id this channel never
+    issued, gets a fresh snapshot of ``state`` instead.
+    """
+
+    def __init__(self, state: Dict[str, Any], retain: Optional[int] = None):
+        self.state = state
+        self.closed = False
+        self._events: Deque[Event] = deque(maxlen=retain or settings.STREAM_EVENT_BUFFER)
+        self._last_id = 0
+        self._wakeup = asyncio.Event()
+
+    @property
+    def last_id(self) -> int:
+        return self._last_id
+
+    def publish(self, event_type: str, data: Dict[str, Any]) -> Event:
+        self._last_id += 1
+        event = Event(self._last_id, event_type, data)
+        self._events.append(event)
+        # Wake everyone waiting on the current generation, then start a new one
+        self._wakeup.set()
+        self._wakeup = asyncio.Event()
+        return event
+
+    def close(self, data: Optional[Dict[str, Any]] = None) -> None:
+        if not self.closed:
+            self.publish("end", data or {})
+            self.closed = True
+
+    def since(self, position: int) -> Optional[List[Event]]:
+        """Events after ``position``, or None if they are no longer retained."""
+        if position > self._last_id:
+            return None
+        if position == self._last_id:
+            return []
+        first = self._events[0].id if self._events else self._last_id + 1
+        if position < first - 1:
+            return None
+        return list(itertools.islice(self._events, position - first + 1, None))
+
+    def snapshot(self) -> Event:
+        # Positioned before the end marker so a closed channel still delivers it
+        position = self._last_id - 1 if self.closed else self._last_id
+        return Event(position, "snapshot", self.state)
+
+    async def subscribe(
+        self,
+        last_event_id: Optional[int] = None,
+        heartbeat: Optional[float] = None,
+    ) -> AsyncIterator[Optional[Event]]:
+        """Yield events after ``last_event_id`` (a snapshot first when not
+        resuming) until the channel closes. Yields None every ``heartbeat``
+        seconds of silence so transports can send keep-alives."""
+        heartbeat = heartbeat or settings.STREAM_HEARTBEAT_SECONDS
+        position = -1 if last_event_id is None else last_event_id
+        while True:
+            events = self.since(position)
+            if events is None:
+                snapshot = self.snapshot()
+                position = snapshot.id
+                yield snapshot
+                continue
+            for event in events:
+                position = event.id
+                yield event
+            if self.closed and position >= self._last_id:
+                return
+            if events:
+                # Check for more before sleeping; the consumer may have been slow
+                continue
+            wakeup = self._wakeup
+            try:
+                await asyncio.wait_for(wakeup.wait(), heartbeat)
+            except asyncio.TimeoutError:
+                yield None
+
+
+class EventHub:
+    """Channels keyed by resource id.
+
+    Closed channels linger for a while so clients that reconnect right after
+    the end can still resume from the tail.
+    """
+
+    def __init__(self, linger: float = 60.0):
+        self.linger = linger
+        self._channels: Dict[str, EventChannel] = {}
+
+    def open(self, key: str, state: Dict[str, Any]) -> EventChannel:
+        channel = self._channels.get(key)
+        if channel is None or channel.closed:
+            channel = EventChannel(state)
+            self._channels[key] = channel
+        return channel
+
+    def get(self, key: str) -> Optional[EventChannel]:
+        return self._channels.get(key)
+
+    def close(self, key: str, data: Optional[Dict[str, Any]] = None) -> None:
+        channel = self._channels.get(key)
+        if channel is None or channel.closed:
+            return
+        channel.close(data)
+        asyncio.get_running_loop().call_later(self.linger, self._expire, key, channel)
+
+    def discard(self, key: str) -> None:
+        channel = self._channels.pop(key, None)
+        if channel is not None:
+            channel.close()
+
+    def _expire(self, key: str, channel: EventChannel) -> None:
+        if self._channels.get(key) is channel:
+            del self._channels[key]
+
+
+research_events = EventHub()
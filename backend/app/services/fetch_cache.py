@@ -0,0 +1,268 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import structlog
+
+from app.core.config import settings
+from app.services.cache import LRUCache
+from app.services.search import FetchedPage
+
+logger = structlog.get_logger()
+
+# Longest a response may declare itself fresh for
+MAX_TTL_SECONDS = 7 * 24 * 3600
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+_TRACKING_PARAMS = re.compile(r"^(utm_\w+|gclid|fbclid|mc_cid|mc_eid|ref_src)$")
+_MAX_AGE = re.compile(r"max-age=(\d+)")
+
+Download = Callable[[str, Dict[str, str]], Awaitable[FetchedPage]]
+Parse = Callable[[FetchedPage], Awaitable[Tuple[str, str]]]
+
+
+def normalize_url(url: str) -> str:
+    """Cache key for a URL: lower-cased scheme and host, no default port,
+    fragment or tracking parameters, query parameters sorted."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != _DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (name, value)
+        for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not _TRACKING_PARAMS.match(name)
+    )
+    return urlunsplit((scheme, host, parts.path or "/", urlencode(query), ""))
+
+
+def freshness(page: FetchedPage, default_ttl: int) -> Optional[int]:
+    """Seconds the response may be served without revalidation, or None if
+    it must not be stored."""
+    cache_control = page.headers.get("cache-control", "").lower()
+    if "no-store" in cache_control or "private" in cache_control:
+        return None
+    if "no-cache" in cache_control:
+        return 0
+    match = _MAX_AGE.search(cache_control)
+    if match:
+        return min(int(match.group(1)), MAX_TTL_SECONDS)
+    return default_ttl
+
+
+@dataclass
+class CachedPage:
+    url: str
+    title: str
+    text: str
+    fetched_at: float
+    expires_at: float
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+@dataclass
+class _IndexEntry:
+    """What the index keeps in memory; the text stays on disk. Entries
+    found on disk at startup know only their size until first read."""
+    size: int
+    expires_at: Optional[float] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+class FetchCache:
+    """Extracted page text shared by every research session.
+
+    Entries live as JSON files under ``directory``, named by a hash of
+    their URL. An in-memory LRU index bounds their total size and deletes
+    evicted files; at startup it is rebuilt from the files' sizes alone,
+    and each entry's freshness is read with its text. Stale
+    entries with an ETag or Last-Modified are revalidated with a
+    conditional request, and concurrent loads of one URL share a single
+    download.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        max_bytes: Optional[int] = None,
+        ttl: Optional[int] = None,
+    ):
+        self.directory = os.path.abspath(directory or settings.RESEARCH_FETCH_CACHE_DIR)
+        self.ttl = settings.RESEARCH_FETCH_CACHE_TTL_SECONDS if ttl is None else ttl
+        self._index: LRUCache[_IndexEntry] = LRUCache(
+            max_bytes or settings.RESEARCH_FETCH_CACHE_BYTES,
+            weigh=lambda entry: entry.size,
+            on_evict=self._evicted,
+        )
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._loaded: Optional[asyncio.Task] = None
+        self.counters = {"hits": 0, "misses": 0, "revalidated": 0, "coalesced": 0}
+
+    async def load(self, url: str, download: Download, parse: Parse) -> Tuple[Optional[CachedPage], str]:
+        """Page text for ``url`` and how it was served: ``hit``,
+        ``revalidated``, ``miss`` or ``coalesced`` (joined another load)."""
+        await self._ensure_loaded()
+        key = normalize_url(url)
+        flight = self._inflight.get(key)
+        if flight is not None:
+            self.counters["coalesced"] += 1
+            page, _ = await asyncio.shield(flight)
+            return page, "coalesced"
+
+        digest = _digest(key)
+        entry = self._index.get(digest)
+        if entry is not None and (entry.expires_at is None or time.time() < entry.expires_at):
+            page = await self._read(key)
+            if page is not None and time.time() < page.expires_at:
+                self.counters["hits"] += 1
+                return page, "hit"
+            # _read filled in what the file records about it, or dropped it
+            entry = self._index.get(digest)
+
+        task = asyncio.ensure_future(self._refresh(key, url, entry, download, parse))
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shielded: one session giving up must not cancel the download the
+        # others are waiting on
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        index = self._index.stats()
+        return {
+            **self.counters,
+            "entries": index["entries"],
+            "bytes": index["weight"],
+            "capacity_bytes": index["capacity"],
+            "evictions": index["evictions"],
+        }
+
+    async def _refresh(
+        self,
+        key: str,
+        url: str,
+        entry: Optional[_IndexEntry],
+        download: Download,
+        parse: Parse,
+    ) -> Tuple[Optional[CachedPage], str]:
+        headers: Dict[str, str] = {}
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+        page = await download(url, headers)
+
+        if page.status == 304 and entry is not None:
+            cached = await self._read(key)
+            if cached is not None:
+                ttl = freshness(page, self.ttl)
+                cached.expires_at = time.time() + (ttl or 0)
+                await self._write(key, cached)
+                self.counters["revalidated"] += 1
+                return cached, "revalidated"
+            # The file vanished under us; fetch it in full
+            page = await download(url, {})
+
+        self.counters["misses"] += 1
+        if not page.ok:
+            return None, "miss"
+        title, text = await parse(page)
+        now = time.time()
+        ttl = freshness(page, self.ttl)
+        cached = CachedPage(
+            url=key,
+            title=title,
+            text=text,
+            fetched_at=now,
+            expires_at=now + (ttl or 0),
+            etag=page.headers.get("etag"),
+            last_modified=page.headers.get("last-modified"),
+        )
+        # Worth storing only if it can be served fresh or revalidated later
+        if ttl is not None and text and (ttl > 0 or cached.etag or cached.last_modified):
+            await self._write(key, cached)
+        return cached, "miss"
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest[:2], f"{digest}.json")
+
+    async def _read(self, key: str) -> Optional[CachedPage]:
+        digest = _digest(key)
+        loop = asyncio.get_running_loop()
+        try:
+            data = await loop.run_in_executor(None, _read_json, self._path(digest))
+        except (OSError, ValueError):
+            self._index.pop(digest)
+            return None
+        page = CachedPage(**data)
+        entry = self._index.get(digest)
+        if entry is not None:
+            entry.expires_at, entry.etag, entry.last_modified = page.expires_at, page.etag, page.last_modified
+        return page
+
+    async def _write(self, key: str, page: CachedPage) -> None:
+        digest = _digest(key)
+        loop = asyncio.get_running_loop()
+        try:
+            size = await loop.run_in_executor(None, _write_json, self._path(digest), asdict(page))
+        except OSError as e:
+            logger.warning("Could not write fetch cache entry", url=key, error=str(e))
+            return
+        self._index.put(digest, _IndexEntry(size, page.expires_at, page.etag, page.last_modified))
+
+    def _evicted(self, digest: Hashable, entry: _IndexEntry) -> None:
+        try:
+            os.remove(self._path(str(digest)))
+        except FileNotFoundError:
+            pass
+
+    async def _ensure_loaded(self) -> None:
+        # Rebuild the index from disk once, oldest files first so LRU order
+        # roughly survives a restart
+        if self._loaded is None:
+            self._loaded = asyncio.ensure_future(
+                asyncio.get_running_loop().run_in_executor(None, self._scan)
+            )
+        await asyncio.shield(self._loaded)
+
+    def _scan(self) -> None:
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, path))
+        # Sizes only: the files are read when their URLs are next loaded
+        for _, size, path in sorted(files):
+            self._index.put(os.path.basename(path)[: -len(".json")], _IndexEntry(size))
+
+
+def _digest(key: str) -> str:
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def _read_json(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_json(path: str, data: Dict[str, Any]) -> int:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.part"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+    return os.path.getsize(path)
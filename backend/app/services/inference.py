@@ -0,0 +1,682 @@
+import asyncio
+import hashlib
+import json
+import random
+import time
+from abc import ABC, abstractmethod
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Sequence, Tuple
+
+import structlog
+
+from app.core.config import settings
+from app.services.cache import LRUCache
+from app.services.llm import Message, count_message_tokens, count_tokens
+from app.services.routing import PrefixRouter, prefix_key, prompt_prefix
+
+logger = structlog.get_logger()
+
+
+@dataclass
+class GenerationRequest:
+    messages: List[Message]
+    max_tokens: int = 512
+    temperature: float = 0.7
+    top_p: float = 0.9
+
+    @property
+    def sampling(self) -> Tuple[int, float, float]:
+        return self.max_tokens, self.temperature, self.top_p
+
+
+@dataclass
+class Generation:
+    text: str
+    prompt_tokens: int
+    completion_tokens: int
+
+    @property
+    def usage(self) -> Dict[str, int]:
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.prompt_tokens + self.completion_tokens,
+        }
+
+
+class InferenceError(Exception):
+    """The model backend failed to serve a request."""
+
+
+class InferenceBackend(ABC):
+    """Model server behind an endpoint.
+
+    ``generate`` receives a whole micro-batch for one endpoint and returns
+    the completion texts in request order. ``stream`` serves one request
+    and yields text as the model produces it. ``instance`` is the endpoint
+    instance the gateway routed to; backends that balance instances
+    themselves ignore it.
+    """
+
+    @abstractmethod
+    async def generate(
+        self,
+        endpoint: str,
+        requests: Sequence[GenerationRequest],
+        instance: int = 0,
+    ) -> List[str]:
+        ...
+
+    async def stream(self, endpoint: str, request: GenerationRequest, instance: int = 0) -> AsyncIterator[str]:
+        # Backends without token streaming deliver the whole text at once
+        texts = await self.generate(endpoint, [request], instance)
+        yield texts[0]
+
+    async def aclose(self) -> None:
+        pass
+
+
+_FILLER = (
+    "the model weighs the request and writes a plausible continuation that stays "
+    "on topic while keeping each sentence short clear and grounded in context"
+).split()
+
+
+def fake_completion(request: GenerationRequest) -> List[str]:
+    """Deterministic words answering ``request``: the same prompt always
+    gets the same 16-111 words, capped at ``max_tokens``."""
+    prompt = "\n".join(message["content"] for message in request.messages)
+    digest = hashlib.sha1(prompt.encode()).digest()
+    length = min(int.from_bytes(digest[:2], "big") % 96 + 16, request.max_tokens)
+    return [_FILLER[(digest[2] + i) % len(_FILLER)] for i in range(length)]
+
+
+class FakeModelServer(InferenceBackend):
+    """Local stand-in for a model server, for tests and benchmarks.
+
+    Models batched decoding: a batch takes ``base_latency``, plus
+    ``prefill_latency`` per prompt token, plus ``token_latency`` per token
+    of its longest completion, since every sequence in a batch advances
+    one token per decoding step. Each simulated instance keeps an LRU of
+    the prompt prefixes it has seen; prompt tokens in a cached prefix cost
+    nothing to prefill, as with a server-side KV prefix cache. With
+    ``jitter``, every delay is scaled by a random factor in
+    ``[1 - jitter, 1 + jitter]``.
+    """
+
+    def __init__(
+        self,
+        base_latency: Optional[float] = None,
+        token_latency: Optional[float] = None,
+        prefill_latency: Optional[float] = None,
+        prefix_cache_entries: Optional[int] = None,
+        jitter: Optional[float] = None,
+    ):
+        # Seconds; the settings are in milliseconds
+        self.base_latency = settings.INFERENCE_FAKE_BASE_LATENCY_MS / 1000 if base_latency is None else base_latency
+        self.token_latency = (
+            settings.INFERENCE_FAKE_TOKEN_LATENCY_MS / 1000 if token_latency is None else token_latency
+        )
+        self.prefill_latency = (
+            settings.INFERENCE_FAKE_PREFILL_LATENCY_MS / 1000 if prefill_latency is None else prefill_latency
+        )
+        self.prefix_cache_entries = prefix_cache_entries or settings.INFERENCE_FAKE_PREFIX_CACHE_ENTRIES
+        self.jitter = settings.INFERENCE_FAKE_LATENCY_JITTER if jitter is None else jitter
+        self.batches = 0
+        self.prefix_hits = 0
+        self.prefix_misses = 0
+        self._prefix_caches: Dict[Tuple[str, int], LRUCache[bool]] = {}
+
+    async def generate(
+        self,
+        endpoint: str,
+        requests: Sequence[GenerationRequest],
+        instance: int = 0,
+    ) -> List[str]:
+        completions = [fake_completion(request) for request in requests]
+        self.batches += 1
+        prefill = sum(self._prefill(endpoint, instance, request) for request in requests)
+        longest = max(len(words) for words in completions)
+        await self._sleep(self.base_latency + prefill + self.token_latency * longest)
+        return [" ".join(words) for words in completions]
+
+    async def stream(self, endpoint: str, request: GenerationRequest, instance: int = 0) -> AsyncIterator[str]:
+        words = fake_completion(request)
+        await self._sleep(self.base_latency + self._prefill(endpoint, instance, request))
+        for i, word in enumerate(words):
+            await self._sleep(self.token_latency)
+            yield word if i == 0 else f" {word}"
+
+    def stats(self) -> Dict[str, int]:
+        return {"batches": self.batches, "prefix_hits": self.prefix_hits, "prefix_misses": self.prefix_misses}
+
+    async def _sleep(self, seconds: float) -> None:
+        if self.jitter:
+            seconds *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        await asyncio.sleep(seconds)
+
+    def _prefill(self, endpoint: str, instance: int, request: GenerationRequest) -> float:
+        """Seconds spent on the prompt tokens the instance has not cached.
+        Tokens are approximated by whitespace-separated words."""
+        total = sum(len(message["content"].split()) + 1 for message in request.messages)
+        prefix = prompt_prefix(request.messages)
+        cache = self._prefix_caches.get((endpoint, instance))
+        if cache is None:
+            cache = self._prefix_caches[(endpoint, instance)] = LRUCache(self.prefix_cache_entries)
+        key = prefix_key(request.messages)
+        cached = 0
+        if cache.get(key):
+            self.prefix_hits += 1
+            cached = len(prefix.split())
+        else:
+            self.prefix_misses += 1
+            cache.put(key, True)
+        return self.prefill_latency * max(total - cached, 0)
+
+
+def render_prompt(messages: Sequence[Message]) -> str:
+    return "".join(f"<|{m['role']}|>\n{m['content']}\n" for m in messages) + "<|assistant|>\n"
+
+
+class SageMakerBackend(InferenceBackend):
+    """Invokes SageMaker real-time endpoints.
+
+    The Hugging Face inference containers accept a list of ``inputs`` per
+    call but only one set of generation parameters, so a micro-batch is
+    split by sampling parameters and each group sent as one invocation.
+    SageMaker does not expose individual instances, so ``instance`` is
+    ignored and its own load balancer picks one.
+    """
+
+    def __init__(self, region: Optional[str] = None):
+        import boto3
+
+        self._client = boto3.client("sagemaker-runtime", region_name=region or settings.AWS_REGION)
+
+    async def generate(
+        self,
+        endpoint: str,
+        requests: Sequence[GenerationRequest],
+        instance: int = 0,
+    ) -> List[str]:
+        groups: Dict[Tuple[int, float, float], List[int]] = {}
+        for i, request in enumerate(requests):
+            groups.setdefault(request.sampling, []).append(i)
+        loop = asyncio.get_running_loop()
+        texts: List[str] = [""] * len(requests)
+        results = await asyncio.gather(*(
+            loop.run_in_executor(None, self._invoke, endpoint, [requests[i] for i in members])
+            for members in groups.values()
+        ))
+        for members, outputs in zip(groups.values(), results):
+            if len(outputs) != len(members):
+                raise InferenceError(f"Endpoint returned {len(outputs)} completions for {len(members)} inputs")
+            for i, text in zip(members, outputs):
+                texts[i] = text
+        return texts
+
+    async def stream(self, endpoint: str, request: GenerationRequest, instance: int = 0) -> AsyncIterator[str]:
+        loop = asyncio.get_running_loop()
+        payload = {**_payload([request]), "inputs": render_prompt(request.messages), "stream": True}
+        try:
+            response = await loop.run_in_executor(
+                None,
+                lambda: self._client.invoke_endpoint_with_response_stream(
+                    EndpointName=endpoint,
+                    ContentType="application/json",
+                    Body=json.dumps(payload),
+                ),
+            )
+        except Exception as e:
+            raise InferenceError(str(e)) from e
+        body = response["Body"]
+        events = iter(body)
+        buffer = b""
+        try:
+            while True:
+                try:
+                    event = await loop.run_in_executor(None, next, events, None)
+                except Exception as e:
+                    raise InferenceError(str(e)) from e
+                if event is None:
+                    return
+                buffer += event.get("PayloadPart", {}).get("Bytes", b"")
+                # Server-sent lines may be split across payload parts
+                *lines, buffer = buffer.split(b"\n")
+                for line in lines:
+                    if not line.startswith(b"data:"):
+                        continue
+                    token = json.loads(line[5:]).get("token", {})
+                    if token.get("text") and not token.get("special"):
+                        yield token["text"]
+        finally:
+            # Stops generation on the endpoint when the caller goes away
+            body.close()
+
+    def _invoke(self, endpoint: str, requests: List[GenerationRequest]) -> List[str]:
+        payload = _payload(requests)
+        try:
+            response = self._client.invoke_endpoint(
+                EndpointName=endpoint,
+                ContentType="application/json",
+                Body=json.dumps(payload),
+            )
+            outputs = json.loads(response["Body"].read())
+        except Exception as e:
+            raise InferenceError(str(e)) from e
+        # One list of candidates per input
+        return [(output[0] if isinstance(output, list) else output)["generated_text"] for output in outputs]
+
+
+def _payload(requests: List[GenerationRequest]) -> Dict[str, Any]:
+    max_tokens, temperature, top_p = requests[0].sampling
+    return {
+        "inputs": [render_prompt(request.messages) for request in requests],
+        "parameters": {
+            "max_new_tokens": max_tokens,
+            "temperature": max(temperature, 0.01),
+            "top_p": top_p,
+            "do_sample": temperature > 0,
+            "return_full_text": False,
+        },
+    }
+
+
+@dataclass
+class _Pending:
+    request: GenerationRequest
+    future: asyncio.Future
+    enqueued_at: float
+
+
+@dataclass
+class LoadSample:
+    """An endpoint's recent load, as seen by the autoscaler."""
+    rps: float = 0.0
+    tokens_per_second: float = 0.0
+    p95_latency_ms: float = 0.0
+    queue_depth: int = 0
+    inflight: int = 0
+    idle_seconds: Optional[float] = None  # since the last completed request; None if there was none
+
+    @property
+    def concurrency(self) -> int:
+        return self.queue_depth + self.inflight
+
+
+class LoadWindow:
+    """Requests completed over the last ``span`` seconds.
+
+    Timestamps are passed in, so the autoscaling simulator can feed it
+    virtual time.
+    """
+
+    def __init__(self, span: Optional[float] = None):
+        self.span = span or settings.AUTOSCALING_METRIC_WINDOW_SECONDS
+        self.last_at: Optional[float] = None
+        self._samples: Deque[Tuple[float, float, int]] = deque()
+
+    def record(self, now: float, latency: float, tokens: int) -> None:
+        self._samples.append((now, latency, tokens))
+        self.last_at = now
+        self._trim(now)
+
+    def sample(self, now: float, queue_depth: int = 0, inflight: int = 0) -> LoadSample:
+        self._trim(now)
+        # Until a full window has passed, rates are over the time seen so far
+        span = min(self.span, max(now - self._samples[0][0], 1.0)) if self._samples else self.span
+        latencies = sorted(latency for _, latency, _ in self._samples)
+        p95 = latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)] if latencies else 0.0
+        return LoadSample(
+            rps=len(self._samples) / span,
+            tokens_per_second=sum(tokens for _, _, tokens in self._samples) / span,
+            p95_latency_ms=p95 * 1000,
+            queue_depth=queue_depth,
+            inflight=inflight,
+            idle_seconds=None if self.last_at is None else now - self.last_at,
+        )
+
+    def _trim(self, now: float) -> None:
+        while self._samples and self._samples[0][0] < now - self.span:
+            self._samples.popleft()
+
+
+@dataclass
+class EndpointMetrics:
+    requests: int = 0
+    batches: int = 0
+    streams: int = 0
+    errors: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    max_queue_depth: int = 0
+    batch_sizes: Counter = field(default_factory=Counter)
+    window: LoadWindow = field(default_factory=LoadWindow)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "streams": self.streams,
+            "errors": self.errors,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "max_queue_depth": self.max_queue_depth,
+            "mean_batch_size": round((self.requests - self.streams) / self.batches, 2) if self.batches else 0.0,
+            "batch_sizes": dict(sorted(self.batch_sizes.items())),
+        }
+
+
+class _InstanceQueue:
+    """Requests waiting for, and running on, one endpoint instance."""
+
+    def __init__(self, instance: int, max_inflight: int):
+        self.instance = instance
+        self.pending: Deque[_Pending] = deque()
+        self.ready = asyncio.Event()
+        self.full = asyncio.Event()
+        self.slots = asyncio.Semaphore(max_inflight)
+        self.inflight_batches = 0
+        self.inflight_requests = 0
+        self.requests = 0
+        self.worker: Optional[asyncio.Task] = None
+        self.batches: set = set()
+
+    @property
+    def outstanding(self) -> int:
+        return len(self.pending) + self.inflight_requests
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "instance": self.instance,
+            "queue_depth": len(self.pending),
+            "inflight_requests": self.inflight_requests,
+            "requests": self.requests,
+        }
+
+
+class _Endpoint:
+    def __init__(self, router: PrefixRouter):
+        self.router = router
+        self.instances: List[_InstanceQueue] = []
+        self.metrics = EndpointMetrics()
+
+
+class InferenceGateway:
+    """Coalesces concurrent requests to an endpoint into micro-batches.
+
+    Each request is first routed to one of the endpoint's instances by its
+    prompt prefix (see ``PrefixRouter``). Every instance has a queue and a
+    dispatcher, which takes a batch once one of the instance's in-flight
+    slots is free and either the batch is full or its oldest request has
+    waited ``window`` seconds. Batches run concurrently up to
+    ``max_inflight`` per instance, so while the backend is busy new
+    arrivals build up into the next, larger batch. Results are handed back
+    to each caller with usage counted by tiktoken.
+    """
+
+    def __init__(
+        self,
+        backend: InferenceBackend,
+        window: Optional[float] = None,
+        max_batch_size: Optional[int] = None,
+        max_inflight: Optional[int] = None,
+        max_outstanding: Optional[int] = None,
+    ):
+        self.backend = backend
+        self.window = settings.INFERENCE_BATCH_WINDOW_MS / 1000 if window is None else window
+        self.max_batch_size = max_batch_size or settings.INFERENCE_MAX_BATCH_SIZE
+        self.max_inflight = max_inflight or settings.INFERENCE_MAX_INFLIGHT_BATCHES
+        self.max_outstanding = max_outstanding
+        self._endpoints: Dict[str, _Endpoint] = {}
+
+    async def generate(self, endpoint: str, request: GenerationRequest, instance_count: int = 1) -> Generation:
+        state = self._endpoint(endpoint, instance_count)
+        queue = self._route(state, request)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        queue.pending.append(_Pending(request, future, time.monotonic()))
+        state.metrics.max_queue_depth = max(
+            state.metrics.max_queue_depth, sum(len(q.pending) for q in state.instances)
+        )
+        queue.ready.set()
+        if len(queue.pending) >= self.max_batch_size:
+            queue.full.set()
+        return await future
+
+    def stream(self, endpoint: str, request: GenerationRequest, instance_count: int = 1) -> "GenerationStream":
+        """Token-by-token generation for one request.
+
+        Streams bypass micro-batching, since each relays its own tokens
+        as they arrive, but are routed like batched requests and share
+        the backend and the endpoint's metrics.
+        """
+        return GenerationStream(self, endpoint, request, instance_count)
+
+    def load(self, endpoint: str) -> LoadSample:
+        """Recent request rate, token throughput and latency, plus current
+        queue depth and in-flight requests across the endpoint's instances."""
+        state = self._endpoints.get(endpoint)
+        if state is None:
+            return LoadSample()
+        return state.metrics.window.sample(
+            time.monotonic(),
+            queue_depth=sum(len(q.pending) for q in state.instances),
+            inflight=sum(q.inflight_requests for q in state.instances),
+        )
+
+    def metrics(self, endpoint: str) -> Dict[str, Any]:
+        state = self._endpoints.get(endpoint)
+        if state is None:
+            return {
+                "queue_depth": 0,
+                "inflight_batches": 0,
+                "inflight_requests": 0,
+                **EndpointMetrics().snapshot(),
+                "routing": {"sticky": 0, "spilled": 0},
+                "instances": [],
+            }
+        return {
+            "queue_depth": sum(len(q.pending) for q in state.instances),
+            "inflight_batches": sum(q.inflight_batches for q in state.instances),
+            "inflight_requests": sum(q.inflight_requests for q in state.instances),
+            **state.metrics.snapshot(),
+            "routing": dict(state.router.counters),
+            "instances": [queue.snapshot() for queue in state.instances],
+        }
+
+    async def discard(self, endpoint: str) -> None:
+        state = self._endpoints.pop(endpoint, None)
+        if state is not None:
+            await asyncio.gather(*(self._stop(queue) for queue in state.instances))
+
+    async def aclose(self) -> None:
+        states = list(self._endpoints.values())
+        self._endpoints.clear()
+        await asyncio.gather(*(self._stop(queue) for state in states for queue in state.instances))
+        await self.backend.aclose()
+
+    def _endpoint(self, endpoint: str, instance_count: int) -> _Endpoint:
+        state = self._endpoints.get(endpoint)
+        if state is None:
+            state = self._endpoints[endpoint] = _Endpoint(PrefixRouter(instance_count, self.max_outstanding))
+        instance_count = max(instance_count, 1)
+        state.router.instance_count = instance_count
+        while len(state.instances) < instance_count:
+            queue = _InstanceQueue(len(state.instances), self.max_inflight)
+            queue.worker = asyncio.create_task(self._dispatch(endpoint, state, queue))
+            state.instances.append(queue)
+        # Queues of removed instances are kept and drain on their own; new
+        # requests just stop being routed to them
+        return state
+
+    def _route(self, state: _Endpoint, request: GenerationRequest) -> _InstanceQueue:
+        active = state.instances[:state.router.instance_count]
+        instance, _ = state.router.choose(
+            prefix_key(request.messages), [queue.outstanding for queue in active]
+        )
+        queue = active[instance]
+        queue.requests += 1
+        return queue
+
+    async def _dispatch(self, endpoint: str, state: _Endpoint, queue: _InstanceQueue) -> None:
+        while True:
+            await queue.ready.wait()
+            await queue.slots.acquire()
+            if queue.pending and len(queue.pending) < self.max_batch_size:
+                remaining = queue.pending[0].enqueued_at + self.window - time.monotonic()
+                if remaining > 0:
+                    queue.full.clear()
+                    try:
+                        await asyncio.wait_for(queue.full.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        pass
+            batch = []
+            while queue.pending and len(batch) < self.max_batch_size:
+                pending = queue.pending.popleft()
+                # Callers that went away while queued are dropped here
+                if not pending.future.done():
+                    batch.append(pending)
+            if not queue.pending:
+                queue.ready.clear()
+                queue.full.clear()
+            if not batch:
+                queue.slots.release()
+                continue
+            task = asyncio.create_task(self._run(endpoint, state, queue, batch))
+            queue.batches.add(task)
+            task.add_done_callback(queue.batches.discard)
+            task.add_done_callback(lambda _: queue.slots.release())
+
+    async def _run(self, endpoint: str, state: _Endpoint, queue: _InstanceQueue, batch: List[_Pending]) -> None:
+        metrics = state.metrics
+        metrics.batches += 1
+        metrics.requests += len(batch)
+        metrics.batch_sizes[len(batch)] += 1
+        queue.inflight_batches += 1
+        queue.inflight_requests += len(batch)
+        requests = [pending.request for pending in batch]
+        try:
+            texts = await self.backend.generate(endpoint, requests, queue.instance)
+            if len(texts) != len(batch):
+                # Which caller a completion belongs to is unknown, so none are served
+                raise InferenceError(f"Backend returned {len(texts)} completions for {len(batch)} requests")
+            loop = asyncio.get_running_loop()
+            usage = await loop.run_in_executor(None, _count_usage, requests, texts)
+        except asyncio.CancelledError:
+            _fail(batch, InferenceError("Inference gateway shut down"))
+            raise
+        except Exception as e:
+            metrics.errors += 1
+            logger.warning("Inference batch failed", endpoint=endpoint, size=len(batch), error=str(e))
+            _fail(batch, e if isinstance(e, InferenceError) else InferenceError(str(e)))
+            return
+        finally:
+            queue.inflight_batches -= 1
+            queue.inflight_requests -= len(batch)
+        now = time.monotonic()
+        for pending, text, (prompt_tokens, completion_tokens) in zip(batch, texts, usage):
+            metrics.prompt_tokens += prompt_tokens
+            metrics.completion_tokens += completion_tokens
+            metrics.window.record(now, now - pending.enqueued_at, completion_tokens)
+            if not pending.future.done():
+                pending.future.set_result(Generation(text, prompt_tokens, completion_tokens))
+
+    async def _stop(self, queue: _InstanceQueue) -> None:
+        tasks = [queue.worker, *queue.batches] if queue.worker is not None else list(queue.batches)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        _fail(list(queue.pending), InferenceError("Inference gateway shut down"))
+        queue.pending.clear()
+
+
+def _fail(batch: List[_Pending], error: Exception) -> None:
+    for pending in batch:
+        if not pending.future.done():
+            pending.future.set_exception(error)
+
+
+class GenerationStream:
+    """Text deltas of one streamed generation.
+
+    Iterate it for the deltas; once iteration finishes ``generation``
+    holds the full text and its usage. Cancelling the iteration (e.g. on
+    client disconnect) cancels generation in the backend.
+    """
+
+    def __init__(
+        self,
+        gateway: InferenceGateway,
+        endpoint: str,
+        request: GenerationRequest,
+        instance_count: int = 1,
+    ):
+        self.endpoint = endpoint
+        self.request = request
+        self.instance_count = instance_count
+        self.generation: Optional[Generation] = None
+        self._gateway = gateway
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        state = self._gateway._endpoint(self.endpoint, self.instance_count)
+        queue = self._gateway._route(state, self.request)
+        metrics = state.metrics
+        metrics.requests += 1
+        metrics.streams += 1
+        queue.inflight_requests += 1
+        started_at = time.monotonic()
+        parts = []
+        try:
+            async for delta in self._gateway.backend.stream(self.endpoint, self.request, queue.instance):
+                parts.append(delta)
+                yield delta
+        except InferenceError:
+            metrics.errors += 1
+            raise
+        except Exception as e:
+            metrics.errors += 1
+            raise InferenceError(str(e)) from e
+        finally:
+            queue.inflight_requests -= 1
+        text = "".join(parts)
+        loop = asyncio.get_running_loop()
+        [(prompt_tokens, completion_tokens)] = await loop.run_in_executor(
+            None, _count_usage, [self.request], [text]
+        )
+        metrics.prompt_tokens += prompt_tokens
+        metrics.completion_tokens += completion_tokens
+        now = time.monotonic()
+        metrics.window.record(now, now - started_at, completion_tokens)
+        self.generation = Generation(text, prompt_tokens, completion_tokens)
+
+
+def _count_usage(requests: List[GenerationRequest], texts: List[str]) -> List[Tuple[int, int]]:
+    return [
+        (count_message_tokens(request.messages), count_tokens(text))
+        for request, text in zip(requests, texts)
+    ]
+
+
+_gateway: Optional[InferenceGateway] = None
+
+
+def get_inference_gateway() -> InferenceGateway:
+    global _gateway
+    if _gateway is None:
+        backend = SageMakerBackend() if settings.INFERENCE_BACKEND == "sagemaker" else FakeModelServer()
+        _gateway = InferenceGateway(backend)
+    return _gateway
+
+
+def set_inference_gateway(gateway: InferenceGateway) -> None:
+    global _gateway
+    _gateway = gateway
+
+
+async def shutdown_inference_gateway() -> None:
+    global _gateway
+    if _gateway is not None:
+        await _gateway.aclose()
+        _gateway = None
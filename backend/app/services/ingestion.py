@@ -0,0 +1,226 @@
+import codecs
+import csv
+import hashlib
+import json
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from app.services.storage import StorageBackend
+
+# Rough heuristic used until the dataset is tokenized during validation
+CHARS_PER_TOKEN = 4
+MAX_REPORTED_ERRORS = 100
+
+
+class ParsedRow(NamedTuple):
+    index: int
+    data: Optional[Dict[str, Any]]
+    error: Optional[str]
+
+
+# Raw JSONL lines are parsed in worker processes; CSV has to be parsed in order
+Record = Union[bytes, ParsedRow]
+
+
+def read_chunks(fileobj: BinaryIO, chunk_size: int) -> Iterator[bytes]:
+    while chunk := fileobj.read(chunk_size):
+        yield chunk
+
+
+def iter_lines(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Split a stream of byte chunks into lines without holding more than
+    one chunk plus a partial line in memory."""
+    pending = b""
+    first = True
+    for chunk in chunks:
+        if first:
+            chunk = chunk.removeprefix(codecs.BOM_UTF8)
+            first = False
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line.rstrip(b"\r")
+    if pending:
+        yield pending.rstrip(b"\r")
+
+
+def parse_jsonl_line(line: bytes) -> Dict[str, Any]:
+    try:
+        data = json.loads(line)
+    except ValueError as e:
+        raise ValueError(f"Invalid JSON: {e}")
+    if not isinstance(data, dict):
+        raise ValueError("Row is not a JSON object")
+    return data
+
+
+def iter_jsonl_rows(lines: Iterable[bytes]) -> Iterator[ParsedRow]:
+    index = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield ParsedRow(index, parse_jsonl_line(line), None)
+        except ValueError as e:
+            yield ParsedRow(index, None, str(e))
+        index += 1
+
+
+def iter_csv_rows(lines: Iterable[bytes]) -> Iterator[ParsedRow]:
+    # csv pulls extra lines itself for quoted fields that span newlines
+    text_lines = (line.decode("utf-8", errors="replace") + "\n" for line in lines)
+    reader = csv.DictReader(text_lines)
+    index = 0
+    try:
+        for row in reader:
+            if None in row:
+                yield ParsedRow(index, None, "Row has more fields than the header")
+            else:
+                yield ParsedRow(index, row, None)
+            index += 1
+    except csv.Error as e:
+        # The reader cannot resume after a structural error
+        yield ParsedRow(index, None, f"Malformed CSV: {e}")
+
+
+def iter_rows(lines: Iterable[bytes], file_format: str) -> Iterator[ParsedRow]:
+    if file_format == "jsonl":
+        return iter_jsonl_rows(lines)
+    return iter_csv_rows(lines)
+
+
+def parse_record(record: Record) -> ParsedRow:
+    if isinstance(record, bytes):
+        try:
+            return ParsedRow(-1, parse_jsonl_line(record), None)
+        except ValueError as e:
+            return ParsedRow(-1, None, str(e))
+    return record
+
+
+def iter_record_batches(
+    storage: StorageBackend,
+    key: str,
+    file_format: str,
+    batch_size: int,
+    chunk_size: int,
+) -> Iterator[Tuple[int, List[Record]]]:
+    """Yield ``(first_row_index, records)`` batches of a stored dataset,
+    cheap enough to ship to a worker process."""
+    lines = iter_lines(storage.iter_chunks(key, chunk_size))
+    if file_format == "jsonl":
+        records = (line for line in lines if line.strip())
+    else:
+        records = iter_csv_rows(lines)
+    start, batch = 0, []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield start, batch
+            start, batch = start + len(batch), []
+    if batch:
+        yield start, batch
+
+
+def row_text(row: Dict[str, Any]) -> str:
+    """Concatenate the text a row contributes to training, including chat
+    style ``messages`` lists."""
+    parts = []
+    for value in row.values():
+        if isinstance(value, str):
+            parts.append(value)
+        elif isinstance(value, list):
+            for item in value:
+                if isinstance(item, dict) and isinstance(item.get("content"), str):
+                    parts.append(item["content"])
+                elif isinstance(item, str):
+                    parts.append(item)
+    return "\n".join(parts)
+
+
+def blob_key(content_hash: str) -> str:
+    return f"blobs/sha256/{content_hash[:2]}/{content_hash}"
+
+
+@dataclass
+class IngestResult:
+    storage_key: str = ""
+    content_hash: str = ""
+    staging_key: str = ""  # where the content waits until ``publish_blob``
+    deduplicated: bool = False
+    size_bytes: int = 0
+    row_count: int = 0
+    char_count: int = 0
+    columns: Dict[str, None] = field(default_factory=dict)  # ordered set
+    errors: List[str] = field(default_factory=list)
+    error_count: int = 0
+
+    @property
+    def estimated_tokens(self) -> int:
+        return self.char_count // CHARS_PER_TOKEN
+
+    def add(self, row: ParsedRow) -> None:
+        self.row_count += 1
+        if row.error:
+            self.error_count += 1
+            if len(self.errors) < MAX_REPORTED_ERRORS:
+                self.errors.append(f"Row {row.index + 1}: {row.error}")
+            return
+        for column in row.data:
+            self.columns.setdefault(column, None)
+        self.char_count += len(row_text(row.data))
+
+
+def _tee(chunks: Iterable[bytes], sinks: List[Callable[[bytes], Any]], result: IngestResult) -> Iterator[bytes]:
+    for chunk in chunks:
+        for sink in sinks:
+            sink(chunk)
+        result.size_bytes += len(chunk)
+        yield chunk
+
+
+def ingest_chunks(chunks: Iterable[bytes], storage: StorageBackend, file_format: str) -> IngestResult:
+    """Stream ``chunks`` into storage and profile their rows in a single pass.
+
+    The content is hashed while it streams and is left in a staging key;
+    ``publish_blob`` then stores it content-addressed, so identical files
+    share one blob. Blocking; call from a worker thread.
+    """
+    result = IngestResult()
+    hasher = hashlib.sha256()
+    result.staging_key = f"staging/{uuid.uuid4().hex}"
+    with storage.open_writer(result.staging_key) as writer:
+        chunks = _tee(chunks, [writer.write, hasher.update], result)
+        for row in iter_rows(iter_lines(chunks), file_format):
+            result.add(row)
+        # The CSV parser stops at a structural error; store the rest anyway
+        for _ in chunks:
+            pass
+
+    result.content_hash = hasher.hexdigest()
+    result.storage_key = blob_key(result.content_hash)
+    return result
+
+
+def publish_blob(storage: StorageBackend, result: IngestResult) -> None:
+    """Move staged content to its blob, or drop it if the blob exists.
+
+    Blobs are deleted when their last dataset is, so hold the content's
+    blob lock from here until the dataset record is committed. Blocking.
+    """
+    if storage.exists(result.storage_key):
+        storage.delete(result.staging_key)
+        result.deduplicated = True
+    else:
+        storage.move(result.staging_key, result.storage_key)
+    result.staging_key = ""
+
+
+def ingest_file(
+    fileobj: BinaryIO,
+    storage: StorageBackend,
+    file_format: str,
+    chunk_size: int,
+) -> IngestResult:
+    return ingest_chunks(read_chunks(fileobj, chunk_size), storage, file_format)
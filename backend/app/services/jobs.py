@@ -0,0 +1,150 @@
+import asyncio
+import inspect
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import structlog
+
+from app.core.config import settings
+from app.services.ingestion import Record, iter_record_batches
+from app.services.storage import StorageBackend
+from app.services.workers import get_process_pool, worker_count
+
+logger = structlog.get_logger()
+
+
+class DatasetJob(ABC):
+    """Background job that streams a stored dataset through the process pool.
+
+    ``execute`` runs in a thread and is expected to check ``cancelled``
+    between batches. Completion callbacks run on the event loop and may be
+    coroutines.
+    """
+
+    description = "Dataset job"
+
+    def __init__(
+        self,
+        storage: StorageBackend,
+        storage_key: str,
+        file_format: str,
+        total_rows: int,
+        batch_size: Optional[int] = None,
+    ):
+        self.id = str(uuid.uuid4())
+        self.storage_key = storage_key
+        self.file_format = file_format
+        self.total_rows = total_rows
+        self.batch_size = batch_size or settings.VALIDATION_BATCH_SIZE
+        self.status = "pending"
+        self.rows_processed = 0
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.started_at = datetime.utcnow().isoformat()
+        self.completed_at: Optional[str] = None
+        self._storage = storage
+        self._cancelled = threading.Event()
+        self._callbacks: List[Callable[[Any], Any]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_active(self) -> bool:
+        return self.status in ("pending", "running")
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    @property
+    def progress(self) -> float:
+        if not self.total_rows:
+            return 1.0 if self.status == "completed" else 0.0
+        return min(self.rows_processed / self.total_rows, 1.0)
+
+    def add_callback(self, callback: Callable[[Any], Any]) -> None:
+        self._callbacks.append(callback)
+
+    def start(self) -> "DatasetJob":
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def wait(self) -> None:
+        if self._task is not None:
+            # Shielded so a disconnecting client does not cancel a shared job
+            await asyncio.shield(self._task)
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    @abstractmethod
+    def execute(self) -> Any:
+        ...
+
+    @abstractmethod
+    def result_dict(self) -> Dict[str, Any]:
+        ...
+
+    async def _run(self) -> None:
+        self.status = "running"
+        loop = asyncio.get_running_loop()
+        try:
+            self.result = await loop.run_in_executor(None, self.execute)
+            self.status = "cancelled" if self.cancelled else "completed"
+        except Exception as e:
+            logger.exception(f"{self.description} failed", storage_key=self.storage_key)
+            self.status = "failed"
+            self.error = str(e)
+        self.completed_at = datetime.utcnow().isoformat()
+        if self.status == "completed":
+            await self.notify()
+
+    async def notify(self) -> None:
+        for callback in self._callbacks:
+            outcome = callback(self.result)
+            if inspect.isawaitable(outcome):
+                await outcome
+
+    def iter_batches(self) -> Iterator[Tuple[int, List[Record]]]:
+        return iter_record_batches(
+            self._storage,
+            self.storage_key,
+            self.file_format,
+            self.batch_size,
+            settings.DATASET_UPLOAD_CHUNK_SIZE,
+        )
+
+    def map_batches(self, fn: Callable[..., Any], *args: Any) -> Iterator[Any]:
+        """Run ``fn(start, records, *args)`` for every batch in the pool and
+        yield results in order, keeping a bounded number of batches in flight."""
+        pool = get_process_pool()
+        window = 2 * worker_count()
+        pending = deque()
+        try:
+            for start, batch in self.iter_batches():
+                if self.cancelled:
+                    return
+                pending.append(pool.submit(fn, start, batch, *args))
+                if len(pending) >= window:
+                    yield pending.popleft().result()
+            while pending and not self.cancelled:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "rows_processed": self.rows_processed,
+            "total_rows": self.total_rows,
+            "progress": self.progress,
+            "started_at": self.started_at,
+            "completed_at": self.completed_at,
+            "error": self.error,
+            "result": self.result_dict() if self.status == "completed" else None,
+        }
@@ -0,0 +1,189 @@
+import asyncio
+import re
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import AsyncIterator, Dict, List, Optional
+
+import structlog
+import tiktoken
+
+from app.core.config import settings
+from app.services.ingestion import CHARS_PER_TOKEN
+
+logger = structlog.get_logger()
+
+Message = Dict[str, str]
+
+
+@lru_cache(maxsize=8)
+def _encoding(name: str):
+    # tiktoken downloads an encoding the first time it is used; offline,
+    # counts fall back to an estimate rather than failing the request
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        logger.warning("Tokenizer unavailable, estimating token counts", encoding=name, error=str(e))
+        return None
+
+
+def count_tokens(text: str, encoding: Optional[str] = None) -> int:
+    enc = _encoding(encoding or settings.TOKENIZER_ENCODING)
+    if enc is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(enc.encode_ordinary(text))
+
+
+def count_message_tokens(messages: List[Message], encoding: Optional[str] = None) -> int:
+    # Chat formats add a few tokens of framing per message
+    return sum(count_tokens(m["content"], encoding) + 4 for m in messages) + 2
+
+
+@dataclass
+class Completion:
+    text: str
+    prompt_tokens: int
+    completion_tokens: int
+
+
+class LLMClient(ABC):
+    """Chat completion backend used by research synthesis."""
+
+    @abstractmethod
+    async def complete(self, messages: List[Message], max_tokens: int) -> Completion:
+        ...
+
+    async def stream(self, messages: List[Message], max_tokens: int) -> AsyncIterator[str]:
+        """Text deltas; clients without native streaming yield one piece."""
+        completion = await self.complete(messages, max_tokens)
+        yield completion.text
+
+
+class OpenAIClient(LLMClient):
+    def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None):
+        from openai import AsyncOpenAI
+
+        self.model = model or settings.RESEARCH_LLM_MODEL
+        self._client = AsyncOpenAI(api_key=api_key or settings.OPENAI_API_KEY)
+
+    async def complete(self, messages: List[Message], max_tokens: int) -> Completion:
+        response = await self._client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=0.2,
+        )
+        text = response.choices[0].message.content or ""
+        if response.usage is not None:
+            return Completion(text, response.usage.prompt_tokens, response.usage.completion_tokens)
+        return Completion(text, count_message_tokens(messages), count_tokens(text))
+
+    async def stream(self, messages: List[Message], max_tokens: int) -> AsyncIterator[str]:
+        response = await self._client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=0.2,
+            stream=True,
+        )
+        async for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+_SENTENCE = re.compile(r"(?<=[.!?])\s+")
+_WORD = re.compile(r"\w+")
+_PASSAGE = re.compile(r"^\[(\d+)\]\s*(.*)$")
+_NOTE = re.compile(r"^(?:[-*]\s*)?(.*?)\s*\[(\d+)\]$")
+_FORMAT = re.compile(r"^Output format: (\S+)", re.MULTILINE)
+_QUESTION = re.compile(r"^Question: (.*)$", re.MULTILINE)
+
+
+class FakeLLMClient(LLMClient):
+    """Deterministic, offline stand-in for a chat model.
+
+    Answers extractively: it picks the sentences from the ``[n] ...``
+    passages (or ``... [n]`` notes) in the prompt that share most words
+    with the question and lays them out in the requested output format,
+    citing passage numbers.
+    Token counts are real tiktoken counts.
+    """
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+
+    async def complete(self, messages: List[Message], max_tokens: int) -> Completion:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        text = self._answer(messages, max_tokens)
+        return Completion(text, count_message_tokens(messages), count_tokens(text))
+
+    async def stream(self, messages: List[Message], max_tokens: int) -> AsyncIterator[str]:
+        text = self._answer(messages, max_tokens)
+        for line in text.splitlines(keepends=True):
+            if self.delay:
+                await asyncio.sleep(self.delay / 10)
+            yield line
+
+    def _answer(self, messages: List[Message], max_tokens: int) -> str:
+        prompt = "\n".join(m["content"] for m in messages)
+        question = _QUESTION.search(prompt)
+        terms = set(_WORD.findall((question.group(1) if question else "").lower()))
+        output_format = _FORMAT.search(prompt)
+        sentences = []
+        for line in prompt.splitlines():
+            line = line.strip()
+            match = _PASSAGE.match(line)
+            if match:
+                number, text = match.groups()
+            else:
+                match = _NOTE.match(line)
+                if not match:
+                    continue
+                text, number = match.groups()
+            for sentence in _SENTENCE.split(text):
+                words = set(_WORD.findall(sentence.lower()))
+                if len(words) >= 4 and not sentence.startswith("Question:"):
+                    sentences.append((-len(terms & words), len(sentences), sentence.strip(), number))
+        sentences.sort()
+        picked, seen, budget = [], set(), max_tokens
+        for _, _, sentence, number in sentences:
+            if sentence.lower() in seen:
+                continue
+            seen.add(sentence.lower())
+            cost = count_tokens(sentence) + 4
+            if cost > budget:
+                break
+            budget -= cost
+            picked.append(f"{sentence} [{number}]")
+        return _layout(picked, output_format.group(1) if output_format else "notes")
+
+
+def _layout(points: List[str], output_format: str) -> str:
+    if not points:
+        return "No relevant information was found in the sources."
+    if output_format == "report":
+        half = max(len(points) // 2, 1)
+        return "\n\n".join([
+            "## Summary\n\n" + points[0],
+            "## Key findings\n\n" + "\n".join(f"- {p}" for p in points[1:half + 1]),
+            "## Details\n\n" + " ".join(points[half + 1:] or points[:1]),
+        ])
+    if output_format == "faq":
+        return "\n\n".join(f"**Q{i}: What do the sources say?**\n{p}" for i, p in enumerate(points, 1))
+    if output_format == "pros-cons":
+        half = (len(points) + 1) // 2
+        pros = "\n".join(f"- {p}" for p in points[:half])
+        cons = "\n".join(f"- {p}" for p in points[half:]) or "- None identified in the sources."
+        return f"## Pros\n\n{pros}\n\n## Cons\n\n{cons}"
+    return "\n".join(f"- {p}" for p in points)
+
+
+_client: Optional[LLMClient] = None
+
+
+def get_llm_client() -> LLMClient:
+    global _client
+    if _client is None:
+        _client = OpenAIClient() if settings.OPENAI_API_KEY else FakeLLMClient()
+    return _client
@@ -0,0 +1,168 @@
+import asyncio
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+import structlog
+
+from app.core.config import settings
+
+logger = structlog.get_logger()
+
+# How long to stay on in-process locks after Redis fails
+REDIS_RETRY_SECONDS = 30.0
+# How often ``hold`` retries a lock someone else has
+POLL_SECONDS = 0.05
+
+
+class LockStore(ABC):
+    """Named locks that expire after ``ttl`` seconds unless renewed, so a
+    holder that dies does not keep one forever."""
+
+    name: str
+
+    @abstractmethod
+    async def acquire(self, name: str, ttl: float) -> Optional[str]:
+        """Take ``name`` if it is free; returns the token to renew or
+        release it with, or None if it is held."""
+        ...
+
+    @abstractmethod
+    async def renew(self, name: str, token: str, ttl: float) -> bool:
+        """Extend a held lock; False if it expired and was lost."""
+        ...
+
+    @abstractmethod
+    async def release(self, name: str, token: str) -> None:
+        ...
+
+    @asynccontextmanager
+    async def hold(self, name: str, ttl: float = 60.0) -> AsyncIterator[None]:
+        """Wait for ``name`` and hold it for the block."""
+        while (token := await self.acquire(name, ttl)) is None:
+            await asyncio.sleep(POLL_SECONDS)
+        try:
+            yield
+        finally:
+            await self.release(name, token)
+
+    async def aclose(self) -> None:
+        pass
+
+
+class MemoryLockStore(LockStore):
+    """Locks within one API process."""
+
+    name = "memory"
+
+    def __init__(self) -> None:
+        # name -> (token, expires at, in monotonic seconds)
+        self._held: Dict[str, Tuple[str, float]] = {}
+
+    async def acquire(self, name: str, ttl: float) -> Optional[str]:
+        now = time.monotonic()
+        held = self._held.get(name)
+        if held is not None and held[1] > now:
+            return None
+        token = uuid.uuid4().hex
+        self._held[name] = (token, now + ttl)
+        return token
+
+    async def renew(self, name: str, token: str, ttl: float) -> bool:
+        held = self._held.get(name)
+        if held is None or held[0] != token or held[1] <= time.monotonic():
+            return False
+        self._held[name] = (token, time.monotonic() + ttl)
+        return True
+
+    async def release(self, name: str, token: str) -> None:
+        held = self._held.get(name)
+        if held is not None and held[0] == token:
+            del self._held[name]
+
+
+class RedisLockStore(LockStore):
+    """Locks shared by every API process, as ``SET NX PX`` keys.
+
+    While Redis is unreachable the in-process ``fallback`` serves instead,
+    so processes only exclude each other again once Redis is back; it is
+    retried after ``REDIS_RETRY_SECONDS``.
+    """
+
+    name = "redis"
+    PREFIX = "llm-toolkit:lock:"
+    # Only touch the key if this process still holds it
+    _RENEW = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('pexpire', KEYS[1], ARGV[2]) end return 0"
+    _RELEASE = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+    def __init__(self, url: str, fallback: LockStore):
+        import redis.asyncio as redis
+
+        self._errors = (redis.RedisError, OSError)
+        self._client = redis.from_url(url, socket_connect_timeout=1.0, socket_timeout=1.0)
+        self._fallback = fallback
+        self._retry_at = 0.0
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self._retry_at
+
+    async def acquire(self, name: str, ttl: float) -> Optional[str]:
+        if self.available:
+            token = uuid.uuid4().hex
+            try:
+                if await self._client.set(self.PREFIX + name, token, nx=True, px=int(ttl * 1000)):
+                    return token
+                return None
+            except self._errors as e:
+                self._failed(e)
+        return await self._fallback.acquire(name, ttl)
+
+    async def renew(self, name: str, token: str, ttl: float) -> bool:
+        if await self._fallback.renew(name, token, ttl):
+            return True
+        if self.available:
+            try:
+                return bool(await self._client.eval(self._RENEW, 1, self.PREFIX + name, token, int(ttl * 1000)))
+            except self._errors as e:
+                self._failed(e)
+        return False
+
+    async def release(self, name: str, token: str) -> None:
+        # Held in one or the other, depending on where it was taken
+        await self._fallback.release(name, token)
+        if self.available:
+            try:
+                await self._client.eval(self._RELEASE, 1, self.PREFIX + name, token)
+            except self._errors as e:
+                # Expires on its own
+                self._failed(e)
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    def _failed(self, error: Exception) -> None:
+        logger.warning("Locks falling back to memory", error=str(error))
+        self._retry_at = time.monotonic() + REDIS_RETRY_SECONDS
+
+
+_locks: Optional[LockStore] = None
+
+
+def get_locks() -> LockStore:
+    global _locks
+    if _locks is None:
+        store: LockStore = MemoryLockStore()
+        if settings.LOCK_BACKEND == "redis":
+            store = RedisLockStore(settings.REDIS_URL, fallback=store)
+        _locks = store
+    return _locks
+
+
+async def shutdown_locks() -> None:
+    global _locks
+    if _locks is not None:
+        await _locks.aclose()
+        _locks = None
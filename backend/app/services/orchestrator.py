@@ -0,0 +1,703 @@
+import asyncio
+import hashlib
+import math
+import time
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, Set, Tuple, TypeVar
+
+import structlog
+from tenacity import AsyncRetrying, retry_if_exception_type, stop_after_attempt, wait_exponential_jitter
+
+from app.core.config import settings
+from app.db.session import session_scope
+from app.services.estimator import TrainingEstimate
+from app.services.training_queue import (
+    TrainingQueue,
+    get_training_queue,
+    occupant,
+    placement_changed,
+    placement_record,
+    to_seconds,
+)
+
+logger = structlog.get_logger()
+
+T = TypeVar("T")
+
+# Runs are created "queued"; once admitted they are "pending", the
+# orchestrator submits them ("starting") and follows their job until it
+# reaches a terminal status
+ACTIVE_STATUSES = ("starting", "training", "stopping")
+# Runs holding a slot of their instance type and project
+ADMITTED_STATUSES = ("pending",) + ACTIVE_STATUSES
+TERMINAL_STATUSES = ("completed", "failed", "stopped")
+
+# Reconciliation looks back this far past the previous pass, so jobs
+# modified while it ran (or under clock skew) are not missed
+RECONCILE_OVERLAP = timedelta(seconds=60)
+
+
+class ProviderError(Exception):
+    """The training provider rejected a call."""
+
+    def __init__(self, message: str, code: Optional[str] = None):
+        super().__init__(message)
+        self.code = code
+
+
+class TransientProviderError(ProviderError):
+    """Throttling or a service hiccup; the call can be retried."""
+
+
+async def with_backoff(call: Callable[..., Awaitable[T]], *args: Any, **kwargs: Any) -> T:
+    """Await ``call``, retrying transient provider errors with jittered
+    exponential backoff."""
+    async for attempt in AsyncRetrying(
+        retry=retry_if_exception_type(TransientProviderError),
+        wait=wait_exponential_jitter(initial=1, max=30),
+        stop=stop_after_attempt(6),
+        reraise=True,
+    ):
+        with attempt:
+            return await call(*args, **kwargs)
+    raise AssertionError("unreachable")
+
+
+@dataclass
+class JobStatus:
+    status: str  # a run status
+    secondary_status: Optional[str] = None
+    metrics: Dict[str, Any] = field(default_factory=dict)
+    failure_reason: Optional[str] = None
+    billable_seconds: Optional[int] = None
+
+
+class TrainingProvider(ABC):
+    """Where training jobs run.
+
+    ``changed_jobs`` narrows each reconciliation pass to the jobs that may
+    have changed; ``poll`` then fetches the status of a batch of runs.
+    """
+
+    name: str
+
+    @abstractmethod
+    async def submit(self, run: Dict[str, Any], dataset: Optional[Dict[str, Any]]) -> None:
+        """Start the run's job. Submitting a job that already exists is
+        not an error, so a submission interrupted by a restart can be
+        repeated."""
+        ...
+
+    @abstractmethod
+    async def stop(self, run: Dict[str, Any]) -> None:
+        ...
+
+    async def changed_jobs(self, since: Optional[datetime]) -> Optional[Set[str]]:
+        """Names of jobs modified since ``since``, or None when every
+        active run should be polled."""
+        return None
+
+    @abstractmethod
+    async def poll(self, runs: Sequence[Dict[str, Any]]) -> Dict[str, JobStatus]:
+        """Status of each run's job, keyed by run id."""
+        ...
+
+
+def _seconds_since(timestamp: str, now: datetime) -> float:
+    return (now - datetime.fromisoformat(timestamp)).total_seconds()
+
+
+class FakeTrainingProvider(TrainingProvider):
+    """Simulated jobs for local development.
+
+    A job spends ``startup`` seconds starting and ``duration`` seconds
+    training with a falling loss, then completes; a ``failure_rate`` share
+    of jobs fail halfway. Progress is derived from the timestamps on the
+    run record alone, so jobs carry on across API restarts.
+    """
+
+    name = "fake"
+    STOP_SECONDS = 2.0
+
+    def __init__(
+        self,
+        startup: Optional[float] = None,
+        duration: Optional[float] = None,
+        failure_rate: float = 0.0,
+        steps_per_epoch: int = 100,
+    ):
+        self.startup = settings.TRAINING_FAKE_STARTUP_SECONDS if startup is None else startup
+        self.duration = settings.TRAINING_FAKE_DURATION_SECONDS if duration is None else duration
+        self.failure_rate = failure_rate
+        self.steps_per_epoch = steps_per_epoch
+
+    async def submit(self, run: Dict[str, Any], dataset: Optional[Dict[str, Any]]) -> None:
+        pass
+
+    async def stop(self, run: Dict[str, Any]) -> None:
+        pass
+
+    async def poll(self, runs: Sequence[Dict[str, Any]]) -> Dict[str, JobStatus]:
+        now = datetime.utcnow()
+        return {run["id"]: self.status(run, now) for run in runs}
+
+    def status(self, run: Dict[str, Any], now: datetime) -> JobStatus:
+        job = run["job"]
+        elapsed = _seconds_since(job["submitted_at"], now)
+        if job.get("stop_requested_at"):
+            stopping_for = _seconds_since(job["stop_requested_at"], now)
+            metrics = self.metrics(run, (elapsed - stopping_for - self.startup) / self.duration)
+            if stopping_for < self.STOP_SECONDS:
+                return JobStatus("stopping", "Stopping", metrics)
+            return JobStatus("stopped", "Stopped", metrics, billable_seconds=int(elapsed - stopping_for))
+        if elapsed < self.startup:
+            return JobStatus("starting", "Starting")
+        progress = (elapsed - self.startup) / self.duration
+        if progress >= 0.5 and self._fails(run):
+            return JobStatus(
+                "failed",
+                "Failed",
+                self.metrics(run, 0.5),
+                failure_reason="AlgorithmError: training loss diverged (simulated)",
+                billable_seconds=int(self.startup + self.duration / 2),
+            )
+        if progress >= 1:
+            return JobStatus(
+                "completed", "Completed", self.metrics(run, 1.0), billable_seconds=int(self.startup + self.duration)
+            )
+        return JobStatus("training", "Training", self.metrics(run, progress))
+
+    def _fails(self, run: Dict[str, Any]) -> bool:
+        digest = hashlib.sha1(run["sagemaker_job_name"].encode()).digest()
+        return int.from_bytes(digest[:4], "big") / 2**32 < self.failure_rate
+
+    def metrics(self, run: Dict[str, Any], progress: float) -> Dict[str, Any]:
+        progress = min(max(progress, 0.0), 1.0)
+        config = run["config"]
+        epochs = config["epochs"]
+        total_steps = epochs * self.steps_per_epoch
+        # A synthetic curve shaped by the hyperparameters, so sweeps have
+        # something to find: the loss bottoms out lowest near a learning
+        # rate of 2e-4 and LoRA rank 16, higher rates fall faster early
+        lr = max(config.get("learning_rate") or 1e-4, 1e-7)
+        rank = config.get("lora_rank") or 16
+        digest = hashlib.sha1(run["sagemaker_job_name"].encode()).digest()
+        noise = (int.from_bytes(digest[4:8], "big") / 2**32 - 0.5) * 0.04
+        floor = 0.35 + 0.25 * math.log10(lr / 2e-4) ** 2 + 0.03 * abs(math.log2(rank / 16)) + noise
+        speed = 4 * min(max(lr / 1e-4, 0.3), 3.0) ** 0.5
+        train_loss = floor + 2.1 * math.exp(-speed * progress)
+        return {
+            "current_epoch": min(int(progress * epochs) + 1, epochs),
+            "total_epochs": epochs,
+            "current_step": int(progress * total_steps),
+            "total_steps": total_steps,
+            "train_loss": round(train_loss, 4),
+            "eval_loss": round(train_loss * 1.05 + 0.02, 4),
+        }
+
+
+class SageMakerTrainingProvider(TrainingProvider):
+    """Runs jobs as SageMaker training jobs named after the run.
+
+    SageMaker has no batch describe, so each pass lists the toolkit's
+    jobs modified since the previous one (100 per page) and describes
+    only those. Every call is retried with backoff when throttled.
+    """
+
+    name = "sagemaker"
+    JOB_PREFIX = "llm-toolkit-"
+    TRANSIENT_CODES = {
+        "ThrottlingException",
+        "Throttling",
+        "TooManyRequestsException",
+        "RequestLimitExceeded",
+        "ServiceUnavailable",
+        "InternalFailure",
+    }
+    # Loss lines printed by the Hugging Face Trainer
+    METRIC_DEFINITIONS = [
+        {"Name": "train_loss", "Regex": r"'loss': ([0-9.]+)"},
+        {"Name": "eval_loss", "Regex": r"'eval_loss': ([0-9.]+)"},
+        {"Name": "current_epoch", "Regex": r"'epoch': ([0-9.]+)"},
+    ]
+
+    def __init__(self, region: Optional[str] = None, concurrency: Optional[int] = None):
+        import boto3
+
+        self._client = boto3.client("sagemaker", region_name=region or settings.AWS_REGION)
+        self._slots = asyncio.Semaphore(concurrency or settings.TRAINING_SUBMIT_CONCURRENCY)
+
+    async def _call(self, method: str, **kwargs: Any) -> Dict[str, Any]:
+        from botocore.exceptions import BotoCoreError, ClientError
+
+        loop = asyncio.get_running_loop()
+        async with self._slots:
+            try:
+                return await loop.run_in_executor(None, lambda: getattr(self._client, method)(**kwargs))
+            except ClientError as e:
+                code = e.response.get("Error", {}).get("Code", "")
+                if code in self.TRANSIENT_CODES:
+                    raise TransientProviderError(str(e), code) from e
+                raise ProviderError(str(e), code) from e
+            except BotoCoreError as e:
+                # Connection and endpoint errors
+                raise TransientProviderError(str(e)) from e
+
+    async def submit(self, run: Dict[str, Any], dataset: Optional[Dict[str, Any]]) -> None:
+        if dataset is None:
+            raise ProviderError(f"Dataset {run['dataset_id']} not found")
+        hyperparameters = {"model_id": run["model_id"], **run["config"]}
+        channels = [{
+            "ChannelName": "train",
+            "DataSource": {"S3DataSource": {
+                "S3DataType": "S3Prefix",
+                "S3Uri": dataset["s3_uri"],
+                "S3DataDistributionType": "FullyReplicated",
+            }},
+        }]
+        if run.get("packing_index"):
+            channels.append({
+                "ChannelName": "packing",
+                "DataSource": {"S3DataSource": {
+                    "S3DataType": "S3Prefix",
+                    "S3Uri": run["packing_index"],
+                    "S3DataDistributionType": "FullyReplicated",
+                }},
+            })
+        try:
+            await with_backoff(
+                self._call,
+                "create_training_job",
+                TrainingJobName=run["sagemaker_job_name"],
+                AlgorithmSpecification={
+                    "TrainingImage": settings.TRAINING_IMAGE_URI,
+                    "TrainingInputMode": "File",
+                    "MetricDefinitions": self.METRIC_DEFINITIONS,
+                },
+                RoleArn=settings.SAGEMAKER_EXECUTION_ROLE,
+                HyperParameters={key: str(value) for key, value in hyperparameters.items() if value is not None},
+                InputDataConfig=channels,
+                OutputDataConfig={"S3OutputPath": run["artifacts"]["model_artifacts_s3"]},
+                CheckpointConfig={"S3Uri": run["artifacts"]["checkpoints_s3"]},
+                ResourceConfig={"InstanceType": run["instance_type"], "InstanceCount": 1, "VolumeSizeInGB": 100},
+                StoppingCondition={"MaxRuntimeInSeconds": 24 * 3600},
+            )
+        except ProviderError as e:
+            if e.code != "ResourceInUse":
+                raise
+
+    async def stop(self, run: Dict[str, Any]) -> None:
+        await with_backoff(self._call, "stop_training_job", TrainingJobName=run["sagemaker_job_name"])
+
+    async def changed_jobs(self, since: Optional[datetime]) -> Optional[Set[str]]:
+        if since is None:
+            return None
+        names: Set[str] = set()
+        kwargs: Dict[str, Any] = {"NameContains": self.JOB_PREFIX, "LastModifiedTimeAfter": since, "MaxResults": 100}
+        while True:
+            page = await with_backoff(self._call, "list_training_jobs", **kwargs)
+            names.update(summary["TrainingJobName"] for summary in page["TrainingJobSummaries"])
+            if not page.get("NextToken"):
+                return names
+            kwargs["NextToken"] = page["NextToken"]
+
+    async def poll(self, runs: Sequence[Dict[str, Any]]) -> Dict[str, JobStatus]:
+        descriptions = await asyncio.gather(*(
+            with_backoff(self._call, "describe_training_job", TrainingJobName=run["sagemaker_job_name"])
+            for run in runs
+        ))
+        return {run["id"]: self._status(description) for run, description in zip(runs, descriptions)}
+
+    @staticmethod
+    def _status(description: Dict[str, Any]) -> JobStatus:
+        secondary = description.get("SecondaryStatus")
+        job_status = description["TrainingJobStatus"]
+        if job_status == "InProgress":
+            status = "training" if secondary in ("Training", "Uploading") else "starting"
+        else:
+            status = job_status.lower()
+        metrics = {m["MetricName"]: m["Value"] for m in description.get("FinalMetricDataList", [])}
+        if "current_epoch" in metrics:
+            metrics["current_epoch"] = math.ceil(metrics["current_epoch"])
+        return JobStatus(
+            status=status,
+            secondary_status=secondary,
+            metrics=metrics,
+            failure_reason=description.get("FailureReason"),
+            billable_seconds=description.get("BillableTimeInSeconds"),
+        )
+
+
+def new_training_run(
+    project_id: str,
+    dataset: Dict[str, Any],
+    model_id: str,
+    config: Dict[str, Any],
+    instance_type: str,
+    estimates: TrainingEstimate,
+    user_id: Optional[str] = None,
+    priority: int = 0,
+) -> Dict[str, Any]:
+    """A queued run record; push it to the training queue once saved."""
+    run_id = str(uuid.uuid4())
+    now = datetime.utcnow().isoformat()
+    estimate = estimates.get(instance_type)
+    packing_index = None
+    if config.get("packing"):
+        # Planned ahead with POST /datasets/{id}/packing; without a plan
+        # the job packs as it reads
+        plan = dataset.get("packing_plans", {}).get(str(estimates.sequence_length))
+        packing_index = plan["s3_uri"] if plan else None
+    return {
+        "id": run_id,
+        "project_id": project_id,
+        "model_id": model_id,
+        "dataset_id": dataset["id"],
+        "sagemaker_job_name": f"{SageMakerTrainingProvider.JOB_PREFIX}{run_id[:8]}",
+        "instance_type": instance_type,
+        "user_id": user_id,
+        "status": "queued",
+        "config": config,
+        "packing_index": packing_index,
+        "metrics": {
+            "current_epoch": 0,
+            "total_epochs": config["epochs"],
+            "current_step": 0,
+            "total_steps": estimate.steps if estimate else 0,
+            "train_loss": None,
+            "eval_loss": None,
+            "learning_rate": config["learning_rate"],
+        },
+        "artifacts": {
+            "model_artifacts_s3": f"s3://llm-toolkit-artifacts/{project_id}/{run_id}/model",
+            "logs_s3": f"s3://llm-toolkit-artifacts/{project_id}/{run_id}/logs",
+            "checkpoints_s3": f"s3://llm-toolkit-artifacts/{project_id}/{run_id}/checkpoints",
+        },
+        # Place in the training queue, kept by the orchestrator
+        "queue": {
+            "priority": priority,
+            "enqueued_at": now,
+            "position": None,
+            "waiting_for": None,
+            "estimated_start_at": None,
+            "admitted_at": None,
+        },
+        # Provider-side state kept by the orchestrator
+        "job": None,
+        "started_at": now,
+        "completed_at": None,
+        "error_message": None,
+        "estimated_cost": estimate.cost if estimate else None,
+        "estimated_duration_seconds": estimate.duration_seconds if estimate else None,
+    }
+
+
+class TrainingOrchestrator:
+    """Drives training runs through their provider from one background task.
+
+    Each pass admits ``queued`` runs from the training queue, submits
+    ``pending`` runs, sends stops for ``stopping`` runs and reconciles
+    every active run against the provider, ``batch_size`` runs per
+    database round trip and at most ``concurrency`` provider calls at a
+    time. All state lives on the run records, so after a
+    restart the next pass carries on where the last one left off. A
+    failed pass is retried with exponential backoff.
+    """
+
+    def __init__(
+        self,
+        provider: TrainingProvider,
+        interval: Optional[float] = None,
+        batch_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        queue: Optional[TrainingQueue] = None,
+    ):
+        self.provider = provider
+        self.queue = queue or get_training_queue()
+        self.interval = interval or settings.TRAINING_RECONCILE_INTERVAL_SECONDS
+        self.batch_size = batch_size or settings.TRAINING_RECONCILE_BATCH_SIZE
+        self._slots = asyncio.Semaphore(concurrency or settings.TRAINING_SUBMIT_CONCURRENCY)
+        self._wake = asyncio.Event()
+        self._since: Optional[datetime] = None
+        # Queue records last saved, by run id; unchanged ones are not saved again
+        self._placements: Dict[str, Dict[str, Any]] = {}
+        self._resynced_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    def wake(self) -> None:
+        """Run the next pass now, e.g. after a run is created or stopped."""
+        self._wake.set()
+
+    async def aclose(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def tick(self) -> None:
+        await self._admit_queued()
+        await self._submit_pending()
+        await self._send_stops()
+        await self._reconcile()
+
+    async def _loop(self) -> None:
+        failures = 0
+        while True:
+            self._wake.clear()
+            try:
+                await self.tick()
+                failures = 0
+                delay = self.interval
+            except Exception:
+                failures += 1
+                delay = min(self.interval * 2 ** failures, 600.0)
+                logger.exception("Training reconciliation failed", retry_in=delay)
+            # Not wait_for: on 3.11 it swallows a cancellation that races
+            # a wake(), and aclose() would never return
+            waiter = asyncio.ensure_future(self._wake.wait())
+            try:
+                await asyncio.wait({waiter}, timeout=delay)
+            finally:
+                waiter.cancel()
+
+    async def _runs(self, status: str) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Runs with ``status`` in creation order, a batch at a time."""
+        after = None
+        while True:
+            async with session_scope() as db:
+                runs = await db.training_runs.list(
+                    limit=self.batch_size, newest_first=False, after=after, status=status
+                )
+                if runs:
+                    after = db.training_runs.sort_key(runs[-1])
+            if runs:
+                yield runs
+            if len(runs) < self.batch_size:
+                return
+
+    async def _bounded(self, call: Awaitable[T]) -> T:
+        async with self._slots:
+            return await call
+
+    async def _update(self, changes: List[Tuple[str, Callable[[Dict[str, Any]], bool]]]) -> None:
+        """Apply each change to a freshly read copy of its run, since the
+        API may have changed the run since it was listed; ``change``
+        returns whether there is anything to save."""
+        if not changes:
+            return
+        async with session_scope() as db:
+            for run_id, change in changes:
+                run = await db.training_runs.get(run_id)
+                if run is not None and change(run):
+                    await db.training_runs.save(run)
+            await db.commit()
+
+    async def _admit_queued(self) -> None:
+        """Move queued runs that fit under the instance capacity and the
+        project quota to ``pending``, and record the others' position and
+        estimated start."""
+        async with self.queue.admission() as acquired:
+            if not acquired:
+                # Another process is admitting
+                return
+            since_resync = time.monotonic() - (self._resynced_at or 0.0)
+            if self._resynced_at is None or since_resync >= settings.TRAINING_QUEUE_RESYNC_SECONDS:
+                started = datetime.utcnow()
+                await self.queue.resync([run async for runs in self._runs("queued") for run in runs], started)
+                self._resynced_at = time.monotonic()
+            occupants = [
+                occupant(run) for status in ADMITTED_STATUSES async for runs in self._runs(status) for run in runs
+            ]
+            now = to_seconds(datetime.utcnow().isoformat())
+            placements = await self.queue.plan(occupants, now)
+            left: List[str] = []
+            changes = []
+            for run_id, placement in placements.items():
+                last = self._placements.get(run_id)
+                if last and not placement.admitted and not placement_changed(
+                    last, placement_record(last, placement, now)
+                ):
+                    continue
+
+                def place(current: Dict[str, Any], placement=placement) -> bool:
+                    if current["status"] != "queued":
+                        # Stopped while queued
+                        left.append(current["id"])
+                        return False
+                    record = placement_record(current["queue"], placement, now)
+                    self._placements[current["id"]] = record
+                    if placement.admitted:
+                        logger.info("Training run admitted", run_id=current["id"], queued_at=record["enqueued_at"])
+                        current.update(status="pending", queue=record)
+                        left.append(current["id"])
+                        return True
+                    if not placement_changed(current["queue"], record):
+                        return False
+                    current["queue"] = record
+                    return True
+
+                changes.append((run_id, place))
+            await self._update(changes)
+            # Only once the runs are saved, so an interrupted pass admits them again
+            await self.queue.remove(left)
+            self._placements = {
+                run_id: record for run_id, record in self._placements.items()
+                if run_id in placements and run_id not in left
+            }
+
+    async def _submit_pending(self) -> None:
+        async for runs in self._runs("pending"):
+            async with session_scope() as db:
+                datasets = {dataset_id: await db.datasets.get(dataset_id) for dataset_id in {r["dataset_id"] for r in runs}}
+            results = await asyncio.gather(
+                *(self._bounded(self._submit(run, datasets[run["dataset_id"]])) for run in runs)
+            )
+            await self._update([(run["id"], change) for run, change in zip(runs, results) if change is not None])
+
+    async def _submit(
+        self,
+        run: Dict[str, Any],
+        dataset: Optional[Dict[str, Any]],
+    ) -> Optional[Callable[[Dict[str, Any]], bool]]:
+        now = datetime.utcnow().isoformat()
+        try:
+            await self.provider.submit(run, dataset)
+        except TransientProviderError as e:
+            logger.warning("Training job submission deferred", run_id=run["id"], error=str(e))
+            return None
+        except ProviderError as e:
+            error = str(e)
+            logger.warning("Training job submission failed", run_id=run["id"], error=error)
+
+            def failed(current: Dict[str, Any]) -> bool:
+                if current["status"] not in ("pending", "stopping"):
+                    return False
+                current.update(status="failed", error_message=error, completed_at=now)
+                return True
+
+            return failed
+
+        logger.info("Training job submitted", run_id=run["id"], job_name=run["sagemaker_job_name"])
+
+        def submitted(current: Dict[str, Any]) -> bool:
+            current["job"] = {**(current.get("job") or {}), "provider": self.provider.name, "submitted_at": now}
+            if current["status"] == "pending":
+                current["status"] = "starting"
+            # A run stopped meanwhile stays "stopping" and is stopped next pass
+            return True
+
+        return submitted
+
+    async def _send_stops(self) -> None:
+        async for runs in self._runs("stopping"):
+            runs = [run for run in runs if not (run.get("job") or {}).get("stop_requested_at")]
+            results = await asyncio.gather(*(self._bounded(self._stop(run)) for run in runs))
+            await self._update([(run["id"], change) for run, change in zip(runs, results) if change is not None])
+
+    async def _stop(self, run: Dict[str, Any]) -> Optional[Callable[[Dict[str, Any]], bool]]:
+        now = datetime.utcnow().isoformat()
+        if not (run.get("job") or {}).get("submitted_at"):
+            # Never reached the provider; nothing to stop
+            await self.queue.remove([run["id"]])
+
+            def stopped(current: Dict[str, Any]) -> bool:
+                if (current.get("job") or {}).get("submitted_at"):
+                    return False
+                current.update(status="stopped", completed_at=now)
+                if current.get("queue"):
+                    current["queue"] = {
+                        **current["queue"], "position": None, "waiting_for": None, "estimated_start_at": None
+                    }
+                return True
+
+            return stopped
+        try:
+            await self.provider.stop(run)
+        except TransientProviderError as e:
+            logger.warning("Training job stop deferred", run_id=run["id"], error=str(e))
+            return None
+        except ProviderError as e:
+            # Usually the job already finished; reconciliation records how
+            logger.warning("Training job stop rejected", run_id=run["id"], error=str(e))
+
+        def stop_requested(current: Dict[str, Any]) -> bool:
+            current["job"] = {**current["job"], "stop_requested_at": now}
+            return True
+
+        return stop_requested
+
+    async def _reconcile(self) -> None:
+        started = datetime.utcnow()
+        changed = await self.provider.changed_jobs(self._since)
+        # A run that moves on during the pass shows up again under its new status
+        seen: Set[str] = set()
+        for status in ACTIVE_STATUSES:
+            async for runs in self._runs(status):
+                runs = [
+                    run for run in runs
+                    if run["id"] not in seen
+                    and (run.get("job") or {}).get("submitted_at")
+                    and (changed is None or run["sagemaker_job_name"] in changed)
+                ]
+                if not runs:
+                    continue
+                seen.update(run["id"] for run in runs)
+                statuses = await self.provider.poll(runs)
+                await self._update([
+                    (run_id, lambda current, job_status=job_status: self._apply(current, job_status))
+                    for run_id, job_status in statuses.items()
+                ])
+        # Only a complete pass moves the watermark; otherwise the next
+        # pass looks at the same jobs again
+        self._since = started - RECONCILE_OVERLAP
+
+    @staticmethod
+    def _apply(run: Dict[str, Any], job_status: JobStatus) -> bool:
+        if run["status"] in TERMINAL_STATUSES:
+            return False
+        status = job_status.status
+        if run["status"] == "stopping" and status not in TERMINAL_STATUSES:
+            # Stop requested; the job has not caught up yet
+            status = "stopping"
+        job = {**run["job"], "secondary_status": job_status.secondary_status}
+        if job_status.billable_seconds is not None:
+            job["billable_seconds"] = job_status.billable_seconds
+        metrics = {**run["metrics"], **job_status.metrics}
+        if (status, job, metrics) == (run["status"], run["job"], run["metrics"]):
+            return False
+        if status != run["status"]:
+            logger.info("Training run status changed", run_id=run["id"], previous=run["status"], status=status)
+        run.update(status=status, job=job, metrics=metrics)
+        if status in TERMINAL_STATUSES:
+            run["completed_at"] = datetime.utcnow().isoformat()
+            if job_status.failure_reason:
+                run["error_message"] = job_status.failure_reason
+        return True
+
+
+_orchestrator: Optional[TrainingOrchestrator] = None
+
+
+def get_training_orchestrator() -> TrainingOrchestrator:
+    global _orchestrator
+    if _orchestrator is None:
+        if settings.TRAINING_PROVIDER == "sagemaker":
+            provider: TrainingProvider = SageMakerTrainingProvider()
+        else:
+            provider = FakeTrainingProvider()
+        _orchestrator = TrainingOrchestrator(provider)
+    return _orchestrator
+
+
+async def shutdown_training_orchestrator() -> None:
+    global _orchestrator
+    if _orchestrator is not None:
+        await _orchestrator.aclose()
+        _orchestrator = None
@@ -0,0 +1,150 @@
+import io
+from array import array
+from dataclasses import dataclass
+from typing import Any, Dict, List, Union
+
+import numpy as np
+
+from app.services.estimator import expected_batch_max
+from app.services.storage import StorageBackend
+
+# Bumped when the index file layout changes
+INDEX_VERSION = 1
+
+
+@dataclass
+class PackingPlan:
+    """Rows of a dataset grouped into sequences of at most ``capacity``
+    tokens. Sequence ``i`` holds rows ``order[offsets[i]:offsets[i + 1]]``;
+    rows with no tokens (invalid rows) are left out, longer rows are
+    truncated to ``capacity``."""
+
+    capacity: int
+    order: np.ndarray  # uint32 row indices, grouped by sequence
+    offsets: np.ndarray  # int64, one more than there are sequences
+    tokens: int  # after truncation
+    rows: int
+    unpacked_tokens: int  # processed without packing, padded per batch
+    batch_size: int
+
+    @property
+    def sequences(self) -> int:
+        return len(self.offsets) - 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        packed = self.sequences * self.capacity
+        return {
+            "capacity": self.capacity,
+            "rows": self.rows,
+            "packed_rows": len(self.order),
+            "sequences": self.sequences,
+            "tokens": self.tokens,
+            "packed_padding_ratio": round(1 - self.tokens / packed, 4) if packed else 0.0,
+            "unpacked_tokens": self.unpacked_tokens,
+            "unpacked_padding_ratio": (
+                round(1 - self.tokens / self.unpacked_tokens, 4) if self.unpacked_tokens else 0.0
+            ),
+            "batch_size": self.batch_size,
+            # Tokens pushed through the model per epoch, relative to unpacked
+            "packed_vs_unpacked": round(packed / self.unpacked_tokens, 4) if self.unpacked_tokens else 1.0,
+        }
+
+    def to_bytes(self) -> bytes:
+        """The index as an ``.npz`` the training job loads with ``np.load``."""
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            version=np.uint32(INDEX_VERSION),
+            capacity=np.uint32(self.capacity),
+            order=self.order,
+            offsets=self.offsets,
+        )
+        return buffer.getvalue()
+
+    def save(self, storage: StorageBackend, key: str) -> None:
+        with storage.open_writer(key) as writer:
+            writer.write(self.to_bytes())
+
+
+def plan_packing(lengths: Union[array, np.ndarray], capacity: int, batch_size: int = 1) -> PackingPlan:
+    """Best-fit decreasing over a histogram of row lengths.
+
+    Rows are placed longest first, each into the open sequence with the
+    least room that still fits it; when none fits, new sequences are
+    filled with as many rows of that length as they hold. Rows of one
+    length are placed together, and open sequences are tracked by how
+    much room they have left, so each step moves a whole group of rows
+    into a whole group of sequences: the work grows with the number of
+    distinct lengths rather than the number of rows, and millions of
+    rows pack in under a second.
+
+    ``batch_size`` only affects the unpacked comparison: without packing
+    every row of a batch is padded to the batch's longest row.
+    """
+    lengths = np.minimum(np.asarray(lengths, dtype=np.int64), capacity)
+    rows = len(lengths)
+    # Row indices by length, longest first
+    by_length = np.argsort(-lengths, kind="stable").astype(np.uint32)
+    counts = np.bincount(lengths, minlength=capacity + 1)
+
+    # Sequences (by id) with exactly ``room`` tokens left, and how many
+    room_ids: List[List[int]] = [[] for _ in range(capacity + 1)]
+    room_count = np.zeros(capacity + 1, dtype=np.int64)
+    assignment = np.empty(rows, dtype=np.int64)
+    sequences = 0
+    position = 0
+    for length in range(capacity, 0, -1):
+        remaining = int(counts[length])
+        while remaining:
+            rows_here = by_length[position : position + remaining]
+            candidates = np.flatnonzero(room_count[length:])
+            if len(candidates):
+                room = length + int(candidates[0])
+                ids = room_ids[room]
+                take = min(remaining, len(ids))
+                chosen = ids[len(ids) - take :]
+                del ids[len(ids) - take :]
+                room_count[room] -= take
+            else:
+                # Nothing open fits: fill new sequences with as many rows
+                # of this length as each holds
+                per_sequence = capacity // length
+                full, last = divmod(remaining, per_sequence)
+                first = sequences
+                sequences += full + (1 if last else 0)
+                assignment[rows_here] = first + np.arange(remaining) // per_sequence
+                left = capacity - per_sequence * length
+                if left and full:
+                    room_ids[left].extend(range(first, first + full))
+                    room_count[left] += full
+                if last:
+                    room_ids[capacity - last * length].append(first + full)
+                    room_count[capacity - last * length] += 1
+                position += remaining
+                break
+            assignment[rows_here[:take]] = chosen
+            if room > length:
+                room_ids[room - length].extend(chosen)
+                room_count[room - length] += take
+            position += take
+            remaining -= take
+
+    placed = by_length[:position]
+    order = placed[np.argsort(assignment[placed], kind="stable")]
+    offsets = np.zeros(sequences + 1, dtype=np.int64)
+    np.cumsum(np.bincount(assignment[placed], minlength=sequences), out=offsets[1:])
+    valid = lengths[lengths > 0]
+    unpacked = int(round(len(valid) * expected_batch_max(valid, batch_size))) if len(valid) else 0
+    return PackingPlan(
+        capacity=capacity,
+        order=order,
+        offsets=offsets,
+        tokens=int(valid.sum()),
+        rows=rows,
+        unpacked_tokens=unpacked,
+        batch_size=batch_size,
+    )
+
+
+def index_key(content_hash: str, capacity: int) -> str:
+    return f"packing/{content_hash[:2]}/{content_hash}-{capacity}.npz"
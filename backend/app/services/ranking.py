@@ -0,0 +1,228 @@
+import math
+import re
+import threading
+import zlib
+from abc import ABC, abstractmethod
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+_TOKEN = re.compile(r"\w+")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from has have how in is it its of on or "
+    "than that the their this to was were what when where which who why will with".split()
+)
+
+BM25 = "bm25"
+VECTOR = "vector"
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in _TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def chunk_words(text: str, size: int, overlap: int) -> List[str]:
+    """Overlapping windows of ``size`` words."""
+    words = text.split()
+    if not words:
+        return []
+    step = max(size - overlap, 1)
+    return [" ".join(words[i:i + size]) for i in range(0, max(len(words) - overlap, 1), step)]
+
+
+class Embedder(ABC):
+    dim: int
+
+    @abstractmethod
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """L2-normalised float32 vectors, one row per text."""
+        ...
+
+
+class HashingEmbedder(Embedder):
+    """Signed feature hashing of unigrams and bigrams.
+
+    Deterministic and dependency-free: a stand-in for a real embedding
+    model that still ranks texts sharing vocabulary close together.
+    """
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+            if not features:
+                continue
+            hashes = np.fromiter(
+                (zlib.crc32(feature.encode()) for feature in features),
+                dtype=np.uint32,
+                count=len(features),
+            )
+            # Low bits pick the bucket, the top bit the sign
+            signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+            np.add.at(vectors[row], (hashes % self.dim).astype(np.intp), signs)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+
+@dataclass
+class Chunk:
+    id: int
+    url: str
+    title: str
+    text: str
+
+
+class ChunkIndex:
+    """Chunks of one session's documents, searchable by BM25 or vectors.
+
+    Documents are chunked, tokenized and (in vector mode) embedded once
+    when added. Vector scores against a query only ever need the new rows;
+    BM25 scores depend on corpus-wide statistics, so they are cached until
+    the index grows. Scoring is vectorised over postings and top-k uses
+    ``argpartition``, so queries stay fast at tens of thousands of chunks.
+    Safe to call from worker threads.
+    """
+
+    K1 = 1.5
+    B = 0.75
+
+    def __init__(
+        self,
+        embedder: Optional[Embedder] = None,
+        chunk_words: Optional[int] = None,
+        chunk_overlap: Optional[int] = None,
+    ):
+        self.embedder = embedder
+        self.chunk_words = chunk_words or settings.RESEARCH_CHUNK_WORDS
+        self.chunk_overlap = settings.RESEARCH_CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap
+        self.chunks: List[Chunk] = []
+        self._urls: List[str] = []
+        self._doc_ids: List[int] = []
+        self._lengths: List[int] = []
+        self._postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        self._vectors: Optional[np.ndarray] = None
+        self._bm25_cache: Dict[str, np.ndarray] = {}
+        self._vector_cache: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def mode(self) -> str:
+        return VECTOR if self.embedder is not None else BM25
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def add(self, url: str, title: str, text: str) -> int:
+        """Index a document; returns the number of chunks it produced."""
+        pieces = chunk_words(text, self.chunk_words, self.chunk_overlap)
+        if not pieces:
+            return 0
+        # Embedding is the expensive part; keep it outside the lock
+        vectors = self.embedder.embed(pieces) if self.embedder is not None else None
+        with self._lock:
+            doc_id = len(self._urls)
+            self._urls.append(url)
+            for piece in pieces:
+                chunk_id = len(self.chunks)
+                self.chunks.append(Chunk(chunk_id, url, title, piece))
+                self._doc_ids.append(doc_id)
+                tokens = tokenize(piece)
+                self._lengths.append(len(tokens))
+                for term, tf in Counter(tokens).items():
+                    ids, tfs = self._postings.setdefault(term, ([], []))
+                    ids.append(chunk_id)
+                    tfs.append(tf)
+            if vectors is not None:
+                self._append_vectors(vectors)
+            self._bm25_cache.clear()
+        return len(pieces)
+
+    def scores(self, query: str) -> np.ndarray:
+        """Score of every chunk against ``query``, indexed by chunk id."""
+        with self._lock:
+            if self.embedder is not None:
+                return self._vector_scores(query)
+            scores = self._bm25_cache.get(query)
+            if scores is None:
+                scores = self._bm25_cache[query] = self._bm25_scores(query)
+            return scores
+
+    def top_k(self, query: str, k: int) -> List[Tuple[Chunk, float]]:
+        scores = self.scores(query)
+        if not len(scores) or k <= 0:
+            return []
+        if k < len(scores):
+            candidates = np.argpartition(-scores, k - 1)[:k]
+        else:
+            candidates = np.arange(len(scores))
+        ordered = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(self.chunks[i], float(scores[i])) for i in ordered]
+
+    def document_scores(self, query: str) -> Dict[str, float]:
+        """Relevance of each document in [0, 1]: its best chunk's score,
+        relative to the best document for BM25, cosine for vectors."""
+        scores = self.scores(query)
+        if not len(scores):
+            return {}
+        with self._lock:
+            doc_ids = np.asarray(self._doc_ids[:len(scores)], dtype=np.intp)
+            urls = list(self._urls)
+        best = np.full(len(urls), -np.inf, dtype=np.float32)
+        np.maximum.at(best, doc_ids, scores)
+        if self.embedder is None:
+            top = best.max()
+            best = best / top if top > 0 else np.zeros_like(best)
+        best = np.clip(best, 0.0, 1.0)
+        return {url: round(float(score), 4) for url, score in zip(urls, best)}
+
+    def _bm25_scores(self, query: str) -> np.ndarray:
+        n = len(self.chunks)
+        scores = np.zeros(n, dtype=np.float32)
+        if not n:
+            return scores
+        lengths = np.asarray(self._lengths, dtype=np.float32)
+        average = float(lengths.mean()) or 1.0
+        norm = self.K1 * (1 - self.B + self.B * lengths / average)
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            ids = np.asarray(posting[0], dtype=np.intp)
+            tf = np.asarray(posting[1], dtype=np.float32)
+            idf = math.log(1 + (n - len(ids) + 0.5) / (len(ids) + 0.5))
+            scores[ids] += idf * tf * (self.K1 + 1) / (tf + norm[ids])
+        return scores
+
+    def _vector_scores(self, query: str) -> np.ndarray:
+        n = len(self.chunks)
+        cached = self._vector_cache.get(query)
+        have = 0 if cached is None else len(cached)
+        if have == n:
+            return cached
+        # Cosine against the new rows only; earlier scores cannot change
+        query_vector = self.embedder.embed([query])[0]
+        fresh = self._vectors[have:n] @ query_vector
+        scores = fresh if cached is None else np.concatenate([cached, fresh])
+        self._vector_cache[query] = scores
+        return scores
+
+    def _append_vectors(self, vectors: np.ndarray) -> None:
+        start = len(self.chunks) - len(vectors)
+        needed = start + len(vectors)
+        if self._vectors is None or len(self._vectors) < needed:
+            # Grow geometrically so appends stay amortised O(rows)
+            capacity = max(needed, 2 * (0 if self._vectors is None else len(self._vectors)), 256)
+            grown = np.zeros((capacity, vectors.shape[1]), dtype=np.float32)
+            if self._vectors is not None:
+                grown[:start] = self._vectors[:start]
+            self._vectors = grown
+        self._vectors[start:needed] = vectors
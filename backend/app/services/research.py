@@ -0,0 +1,515 @@
+import asyncio
+import re
+import time
+import uuid
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import httpx
+import structlog
+
+from app.core.config import settings
+from app.db.session import session_scope
+from app.services.events import EventChannel, research_events
+from app.services.fetch_cache import CachedPage, FetchCache
+from app.services.llm import LLMClient, get_llm_client
+from app.services.ranking import VECTOR, ChunkIndex, Embedder, HashingEmbedder
+from app.services.search import (
+    FetchedPage,
+    Fetcher,
+    HttpFetcher,
+    SearchProvider,
+    SearchResult,
+    StubCorpus,
+    domain_allowed,
+    domain_of,
+    parse_page,
+)
+from app.services.synthesis import Synthesizer, batch_passages, cited_sources, select_passages
+from app.services.workers import get_process_pool
+
+logger = structlog.get_logger()
+
+SNIPPET_CHARS = 300
+
+
+@dataclass(frozen=True)
+class DepthProfile:
+    max_queries: int
+    results_per_query: int
+    max_sources: int
+    # Seconds for searching and fetching sources. Ranking and synthesis
+    # run after it and are not counted, so a session takes longer overall
+    search_budget: float
+    context_tokens: int  # source passages handed to synthesis
+
+
+DEPTH_PROFILES = {
+    "quick": DepthProfile(
+        max_queries=3, results_per_query=5, max_sources=10, search_budget=30.0, context_tokens=6000
+    ),
+    "in-depth": DepthProfile(
+        max_queries=8, results_per_query=10, max_sources=40, search_budget=180.0, context_tokens=16000
+    ),
+}
+NO_SOURCES_REPORT = "No relevant sources were found for this question."
+
+
+class ResearchError(Exception):
+    """A session cannot run; its message is stored as the session's error."""
+
+_FACETS = (
+    "overview",
+    "latest developments",
+    "advantages and disadvantages",
+    "examples",
+    "statistics",
+    "expert analysis",
+    "criticism",
+    "comparison",
+)
+_CLAUSE_SPLIT = re.compile(r"[;?]|,|\band\b|\bvs\.?\b|\bversus\b", re.IGNORECASE)
+
+
+def plan_queries(question: str, max_queries: int) -> List[str]:
+    """Sub-queries for a question: the question itself, its separate
+    clauses, then the question narrowed to common research facets."""
+    base = question.strip().rstrip("?.! ")
+    candidates = [base]
+    clauses = [c.strip() for c in _CLAUSE_SPLIT.split(base)]
+    candidates += [c for c in clauses if len(c.split()) >= 2]
+    candidates += [f"{base} {facet}" for facet in _FACETS]
+    queries: List[str] = []
+    seen = set()
+    for query in candidates:
+        key = query.lower()
+        if key not in seen:
+            seen.add(key)
+            queries.append(query)
+    return queries[:max_queries]
+
+
+class _DomainSlots:
+    """Per-domain semaphores that disappear once no fetch is using them."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._slots: Dict[str, List[Any]] = {}
+
+    @asynccontextmanager
+    async def acquire(self, domain: str) -> AsyncIterator[None]:
+        entry = self._slots.get(domain)
+        if entry is None:
+            entry = self._slots[domain] = [asyncio.Semaphore(self.limit), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._slots[domain]
+
+
+def _now() -> str:
+    return datetime.utcnow().isoformat()
+
+
+class ResearchRun:
+    """One research session executing on the event loop.
+
+    Progress is written into the session dict (which is also the event
+    channel's snapshot state), published as deltas, and persisted when a
+    step finishes.
+    """
+
+    def __init__(self, engine: "ResearchEngine", session: Dict[str, Any], channel: EventChannel):
+        self.engine = engine
+        self.session = session
+        self.channel = channel
+        self.profile = DEPTH_PROFILES.get(session.get("depth", "quick"), DEPTH_PROFILES["quick"])
+        # Chunks of every fetched page, reused by ranking and synthesis
+        self.index = ChunkIndex(engine.embedder if engine.ranking_mode == VECTOR else None)
+        self.fetch_stats = {"hit": 0, "revalidated": 0, "miss": 0, "coalesced": 0}
+        self.persist = True
+        self._seen_urls: set = set()
+        self._source_slots = self.profile.max_sources
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def session_id(self) -> str:
+        return self.session["id"]
+
+    @property
+    def is_active(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> "ResearchRun":
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _run(self) -> None:
+        status = "completed"
+        watcher = asyncio.create_task(self._watch_stop())
+        try:
+            await self.execute()
+        except asyncio.CancelledError:
+            status = "stopped"
+        except ResearchError as e:
+            logger.warning("Research session failed", session_id=self.session_id, error=str(e))
+            status = "failed"
+            self.session["error"] = str(e)
+        except Exception as e:
+            logger.exception("Research session failed", session_id=self.session_id)
+            status = "failed"
+            self.session["error"] = str(e)
+        watcher.cancel()
+        self.session["fetch_stats"] = self.fetch_stats
+        self.session["status"] = status
+        self.session["completed_at"] = _now()
+        self.channel.publish("status", {"status": status, "completed_at": self.session["completed_at"]})
+        await self.save()
+        research_events.close(self.session_id, {"status": status})
+
+    async def _watch_stop(self) -> None:
+        """Cancel the run once a stop is requested through another process,
+        which records it on the session rather than stopping it."""
+        while not self.session.get("stop_requested_at"):
+            await asyncio.sleep(settings.RESEARCH_STOP_POLL_SECONDS)
+            async with session_scope() as db:
+                record = await db.research_sessions.get(self.session_id)
+            if record is not None and record.get("stop_requested_at"):
+                self.session["stop_requested_at"] = record["stop_requested_at"]
+        logger.info("Research session stop requested", session_id=self.session_id)
+        self._task.cancel()
+
+    async def execute(self) -> None:
+        if self.engine.search is None:
+            raise ResearchError("No search provider configured")
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.profile.search_budget
+
+        plan = self.add_step("plan", self.session["question"])
+        queries = plan_queries(self.session["question"], self.profile.max_queries)
+        plan["queries"] = queries
+        self.finish_step(plan)
+
+        steps = [self.add_step("search", query) for query in queries]
+        tasks = [asyncio.create_task(self.search_step(step)) for step in steps]
+        try:
+            _, pending = await asyncio.wait(tasks, timeout=max(deadline - loop.time(), 0))
+            if pending:
+                logger.info("Research search budget exhausted", session_id=self.session_id)
+                self.session["timed_out"] = True
+        finally:
+            # Also reached when the run itself is cancelled
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for step in steps:
+                if step["completed_at"] is None:
+                    self.finish_step(step, "cancelled")
+        await self.rank()
+        await self.save()
+        await self.synthesize()
+        await self.save()
+
+    async def rank(self) -> None:
+        """Score every source against the question and order them by it."""
+        step = self.add_step("rank", self.session["question"])
+        step["status"] = "running"
+        loop = asyncio.get_running_loop()
+        scores = await loop.run_in_executor(None, self.index.document_scores, self.session["question"])
+        for source in self.session["sources"]:
+            source["relevance_score"] = scores.get(source["url"], 0.0)
+        self.session["sources"].sort(key=lambda source: source["relevance_score"], reverse=True)
+        for search in self.session["steps"]:
+            search["sources"].sort(key=lambda source: source["relevance_score"], reverse=True)
+        step["mode"] = self.index.mode
+        step["chunks"] = len(self.index)
+        self.channel.publish("ranking", {"step_id": step["id"], "scores": scores})
+        self.finish_step(step)
+
+    async def synthesize(self) -> None:
+        """Write the final report from the best-ranked chunks.
+
+        A "summarize" step condenses passage batches concurrently and
+        publishes each as a "section" event when it completes; a
+        "synthesize" step then streams the report as "report" deltas.
+        """
+        question = self.session["question"]
+        synthesizer = Synthesizer(self.engine.llm, question, self.session.get("output_format", "bullets"))
+        loop = asyncio.get_running_loop()
+        passages = await loop.run_in_executor(
+            None, select_passages, self.index, question, self.session["sources"], self.profile.context_tokens
+        )
+        if not passages:
+            self.session["final_report"] = NO_SOURCES_REPORT
+            return
+
+        summarize = self.add_step("summarize", question)
+        summarize["status"] = "running"
+        batches = batch_passages(passages, settings.RESEARCH_MAP_TOKENS)
+        summarize["passages"] = len(passages)
+        summarize["context_tokens"] = sum(passage.tokens for passage in passages)
+        summarize["progress"] = {"completed": 0, "total": len(batches)}
+        sections: List[Optional[str]] = [None] * len(batches)
+        async for number, text in synthesizer.summarize(batches):
+            sections[number] = text
+            summarize["progress"]["completed"] += 1
+            summarize["usage"] = dict(synthesizer.usage)
+            self.channel.publish("section", {"step_id": summarize["id"], "index": number, "text": text})
+            self.publish_step(summarize)
+        summarize["synthesis"] = "\n\n".join(sections)
+        self.finish_step(summarize)
+        await self.save()
+
+        step = self.add_step("synthesize", question)
+        step["status"] = "running"
+        before = dict(synthesizer.usage)
+        notes = await synthesizer.condense(sections)
+        parts = []
+        async for delta in synthesizer.report(notes):
+            parts.append(delta)
+            self.channel.publish("report", {"step_id": step["id"], "delta": delta})
+        report = "".join(parts).strip()
+        cited = cited_sources(report, passages)
+        if cited:
+            report += "\n\n## Sources\n\n" + "\n".join(
+                f"[{number}] [{title or url}]({url})" for number, title, url in cited
+            )
+        step["synthesis"] = report
+        step["usage"] = {key: synthesizer.usage[key] - before[key] for key in before}
+        self.session["final_report"] = report
+        self.session["usage"] = synthesizer.usage
+        self.finish_step(step)
+
+    async def search_step(self, step: Dict[str, Any]) -> None:
+        step["status"] = "running"
+        self.publish_step(step)
+        try:
+            results = await self.engine.search.search(
+                step["query"],
+                self.profile.results_per_query,
+                self.session.get("include_domains", []),
+            )
+            await asyncio.gather(*(self.collect(step, result) for result in self.claim(results)))
+        except Exception as e:
+            logger.warning("Research search step failed", query=step["query"], error=str(e))
+            step["error"] = str(e)
+            self.finish_step(step, "failed")
+            return
+        self.finish_step(step)
+        await self.save()
+
+    def claim(self, results: List[SearchResult]) -> List[SearchResult]:
+        """Results this run should fetch: allowed domains, each URL once,
+        and no more than the depth's source budget."""
+        claimed = []
+        for result in results:
+            if self._source_slots <= 0:
+                break
+            if result.url in self._seen_urls:
+                continue
+            if not domain_allowed(
+                result.url,
+                self.session.get("include_domains", []),
+                self.session.get("exclude_domains", []),
+            ):
+                continue
+            self._seen_urls.add(result.url)
+            self._source_slots -= 1
+            claimed.append(result)
+        return claimed
+
+    async def collect(self, step: Dict[str, Any], result: SearchResult) -> None:
+        try:
+            page, outcome = await self.engine.load(result.url)
+        except (httpx.HTTPError, OSError) as e:
+            logger.info("Research fetch failed", url=result.url, error=str(e))
+            return
+        except Exception as e:
+            logger.info("Research page could not be loaded", url=result.url, error=str(e))
+            return
+        self.fetch_stats[outcome] += 1
+        if page is None or not page.text:
+            return
+        title, text = page.title, page.text
+        source = {
+            "url": result.url,
+            "title": title or result.title,
+            "snippet": result.snippet or text[:SNIPPET_CHARS],
+            "relevance_score": 0.0,
+        }
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.index.add, result.url, source["title"], text)
+        step["sources"].append(source)
+        self.session["sources"].append(source)
+        self.channel.publish("source", {"step_id": step["id"], "source": source})
+
+    def add_step(self, step_type: str, query: Optional[str] = None) -> Dict[str, Any]:
+        step = {
+            "id": str(uuid.uuid4()),
+            "type": step_type,
+            "status": "pending",
+            "query": query,
+            "sources": [],
+            "synthesis": None,
+            "started_at": _now(),
+            "completed_at": None,
+        }
+        self.session["steps"].append(step)
+        self.publish_step(step)
+        return step
+
+    def finish_step(self, step: Dict[str, Any], status: str = "completed") -> None:
+        step["status"] = status
+        step["completed_at"] = _now()
+        self.publish_step(step)
+
+    def publish_step(self, step: Dict[str, Any]) -> None:
+        # Sources travel as their own events; keep step deltas small
+        self.channel.publish("step", {k: v for k, v in step.items() if k != "sources"})
+
+    async def save(self) -> None:
+        if not self.persist:
+            return
+        async with session_scope() as db:
+            record = await db.research_sessions.get(self.session_id)
+            if record is not None and record.get("stop_requested_at"):
+                # Keep a stop requested since the last save for the watcher
+                self.session["stop_requested_at"] = record["stop_requested_at"]
+            await db.research_sessions.save(self.session)
+
+
+class ResearchEngine:
+    """Runs research sessions with bounded, shared fetch concurrency.
+
+    A global semaphore caps fetches across all sessions and a per-domain
+    one keeps any single site from being hammered. Pages go through the
+    shared fetch cache when one is given. The search provider, fetcher,
+    embedder (used when ``ranking_mode`` is "vector") and the LLM client
+    that writes reports are pluggable. Without a search provider every
+    session fails.
+    """
+
+    def __init__(
+        self,
+        search: Optional[SearchProvider],
+        fetcher: Fetcher,
+        cache: Optional[FetchCache] = None,
+        embedder: Optional[Embedder] = None,
+        ranking_mode: Optional[str] = None,
+        max_concurrency: Optional[int] = None,
+        per_domain: Optional[int] = None,
+        llm: Optional[LLMClient] = None,
+    ):
+        self.search = search
+        self.fetcher = fetcher
+        self.cache = cache
+        self.embedder = embedder or HashingEmbedder()
+        self.llm = llm or get_llm_client()
+        self.ranking_mode = ranking_mode or settings.RESEARCH_RANKING_MODE
+        self._global = asyncio.Semaphore(max_concurrency or settings.RESEARCH_MAX_CONCURRENT_FETCHES)
+        self._domains = _DomainSlots(per_domain or settings.RESEARCH_FETCHES_PER_DOMAIN)
+        self._runs: Dict[str, ResearchRun] = {}
+
+    def get(self, session_id: str) -> Optional[ResearchRun]:
+        return self._runs.get(session_id)
+
+    def start(self, session: Dict[str, Any]) -> ResearchRun:
+        channel = research_events.open(session["id"], session)
+        channel.state = session
+        run = ResearchRun(self, session, channel).start()
+        self._runs[session["id"]] = run
+        run._task.add_done_callback(lambda _: self._forget(run))
+        return run
+
+    async def stop(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Cancel a running session; returns its final state, or None if it
+        was not running here."""
+        run = self._runs.get(session_id)
+        if run is None or not run.is_active:
+            return None
+        await run.stop()
+        return run.session
+
+    async def discard(self, session_id: str) -> None:
+        run = self._runs.get(session_id)
+        if run is not None:
+            run.persist = False
+            await run.stop()
+
+    async def load(self, url: str) -> Tuple[Optional[CachedPage], str]:
+        """Extracted text of ``url``, through the fetch cache if enabled."""
+        if self.cache is not None:
+            return await self.cache.load(url, self.fetch, self.extract)
+        page = await self.fetch(url)
+        if not page.ok:
+            return None, "miss"
+        title, text = await self.extract(page)
+        now = time.time()
+        return CachedPage(url, title, text, fetched_at=now, expires_at=now), "miss"
+
+    async def fetch(self, url: str, headers: Optional[Dict[str, str]] = None) -> FetchedPage:
+        # Domain first, so a fetch queued behind a busy site does not hold
+        # one of the global slots while it waits
+        async with self._domains.acquire(domain_of(url)):
+            async with self._global:
+                return await self.fetcher.fetch(url, headers)
+
+    async def extract(self, page: FetchedPage) -> Tuple[str, str]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            get_process_pool(),
+            parse_page,
+            page.body,
+            page.content_type,
+            settings.RESEARCH_MAX_PAGE_CHARS,
+        )
+
+    async def aclose(self) -> None:
+        await asyncio.gather(*(run.stop() for run in list(self._runs.values())))
+        await self.fetcher.aclose()
+
+    def _forget(self, run: ResearchRun) -> None:
+        if self._runs.get(run.session_id) is run:
+            del self._runs[run.session_id]
+
+
+_engine: Optional[ResearchEngine] = None
+
+
+def get_research_engine() -> ResearchEngine:
+    global _engine
+    if _engine is None:
+        cache = FetchCache() if settings.RESEARCH_FETCH_CACHE_BYTES > 0 else None
+        if settings.RESEARCH_STUB_CORPUS:
+            corpus = StubCorpus.from_file(settings.RESEARCH_STUB_CORPUS)
+            _engine = ResearchEngine(corpus, corpus, cache)
+        else:
+            # No web search backend is configured; plug one in with
+            # set_research_engine. Until then sessions fail rather than
+            # reporting that nothing was found.
+            logger.warning("No research search provider configured; set RESEARCH_STUB_CORPUS")
+            _engine = ResearchEngine(None, HttpFetcher(), cache)
+    return _engine
+
+
+def set_research_engine(engine: ResearchEngine) -> None:
+    global _engine
+    _engine = engine
+
+
+async def shutdown_research_engine() -> None:
+    global _engine
+    if _engine is not None:
+        await _engine.aclose()
+        _engine = None
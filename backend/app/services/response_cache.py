@@ -0,0 +1,337 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import structlog
+
+from app.core.config import settings
+from app.services.cache import LRUCache
+from app.services.inference import Generation, GenerationRequest
+from app.services.ranking import Embedder, HashingEmbedder
+
+logger = structlog.get_logger()
+
+HIT = "hit"
+MISS = "miss"
+BYPASS = "bypass"
+COALESCED = "coalesced"  # joined an identical request that was generating
+
+# How long to stay on the in-process store after Redis fails
+REDIS_RETRY_SECONDS = 30.0
+
+
+def normalize_messages(messages: List[Dict[str, str]]) -> List[Tuple[str, str]]:
+    """Messages with case-folded roles and collapsed whitespace, so
+    trivially different spellings of a prompt share a cache entry."""
+    return [(m["role"].strip().lower(), " ".join(m["content"].split())) for m in messages]
+
+
+def sampling_key(endpoint: str, request: GenerationRequest) -> str:
+    return json.dumps([endpoint, request.max_tokens, round(request.temperature, 4), round(request.top_p, 4)])
+
+
+def cache_key(endpoint: str, request: GenerationRequest) -> str:
+    payload = json.dumps([sampling_key(endpoint, request), normalize_messages(request.messages)])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def is_deterministic(request: GenerationRequest) -> bool:
+    # Greedy decoding; any sampling makes repeated calls legitimately differ
+    return request.temperature <= 0
+
+
+class ResponseStore(ABC):
+    name: str
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: Dict[str, Any], ttl: int) -> None:
+        ...
+
+    async def aclose(self) -> None:
+        pass
+
+
+class MemoryResponseStore(ResponseStore):
+    """In-process LRU store bounded by response size, with per-entry TTL."""
+
+    name = "memory"
+
+    def __init__(self, max_bytes: int):
+        self._entries: LRUCache[Tuple[Dict[str, Any], float]] = LRUCache(
+            max_bytes, weigh=lambda entry: len(entry[0]["text"]) + 64
+        )
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if time.time() >= expires_at:
+            self._entries.pop(key)
+            return None
+        return value
+
+    async def set(self, key: str, value: Dict[str, Any], ttl: int) -> None:
+        self._entries.put(key, (value, time.time() + ttl))
+
+
+class RedisResponseStore(ResponseStore):
+    """Responses shared by every API process through Redis.
+
+    Entries expire with ``EX``; size-based eviction is left to the
+    server's ``maxmemory-policy`` (``allkeys-lru``). While Redis is
+    unreachable the in-process ``fallback`` store serves instead, and
+    Redis is retried after ``REDIS_RETRY_SECONDS``.
+    """
+
+    name = "redis"
+    PREFIX = "llm-toolkit:response:"
+
+    def __init__(self, url: str, fallback: ResponseStore):
+        import redis.asyncio as redis
+
+        self._errors = (redis.RedisError, OSError)
+        self._client = redis.from_url(url, socket_connect_timeout=1.0, socket_timeout=1.0)
+        self._fallback = fallback
+        self._retry_at = 0.0
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self._retry_at
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if self.available:
+            try:
+                raw = await self._client.get(self.PREFIX + key)
+                return json.loads(raw) if raw is not None else None
+            except self._errors as e:
+                self._failed(e)
+        return await self._fallback.get(key)
+
+    async def set(self, key: str, value: Dict[str, Any], ttl: int) -> None:
+        if self.available:
+            try:
+                await self._client.set(self.PREFIX + key, json.dumps(value), ex=ttl)
+                return
+            except self._errors as e:
+                self._failed(e)
+        await self._fallback.set(key, value, ttl)
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    def _failed(self, error: Exception) -> None:
+        logger.warning("Response cache falling back to memory", error=str(error))
+        self._retry_at = time.monotonic() + REDIS_RETRY_SECONDS
+
+
+class _SemanticIndex:
+    """Prompt embeddings of recent cache entries for one endpoint and
+    sampling setup, kept as a fixed-size ring of rows."""
+
+    def __init__(self, dim: int, capacity: int):
+        self.keys: List[Optional[str]] = [None] * capacity
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.next = 0
+
+    def add(self, key: str, vector: np.ndarray) -> None:
+        row = self.next % len(self.keys)
+        self.keys[row] = key
+        self.vectors[row] = vector
+        self.next += 1
+
+    def nearest(self, vector: np.ndarray) -> Tuple[Optional[str], float]:
+        filled = min(self.next, len(self.keys))
+        if not filled:
+            return None, 0.0
+        scores = self.vectors[:filled] @ vector
+        best = int(np.argmax(scores))
+        return self.keys[best], float(scores[best])
+
+
+class ResponseCache:
+    """Exact and near-duplicate response cache for endpoint invocations.
+
+    Keys cover the endpoint, the normalised messages and the sampling
+    parameters. Only greedy (temperature 0) requests are cached unless a
+    request opts in. With a ``similarity`` threshold, a miss on the exact
+    key falls back to the closest earlier prompt for the same endpoint and
+    sampling parameters, if its embedding is at least that similar. The
+    embedding indexes are per process, point at entries in the store and
+    are kept for the ``semantic_indexes`` most recently used endpoint and
+    sampling setups.
+    Misses that ``load`` sees for a key already being generated wait for
+    that generation instead of starting their own.
+    """
+
+    def __init__(
+        self,
+        store: ResponseStore,
+        ttl: Optional[int] = None,
+        similarity: Optional[float] = None,
+        embedder: Optional[Embedder] = None,
+        semantic_entries: int = 1024,
+        semantic_indexes: int = 64,
+    ):
+        self.store = store
+        self.ttl = ttl or settings.RESPONSE_CACHE_TTL_SECONDS
+        self.similarity = settings.RESPONSE_CACHE_SIMILARITY if similarity is None else similarity
+        self.embedder = embedder or HashingEmbedder()
+        self.semantic_entries = semantic_entries
+        self._semantic: LRUCache[_SemanticIndex] = LRUCache(semantic_indexes)
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.counters = {"hits": 0, "semantic_hits": 0, "misses": 0, "bypassed": 0, "coalesced": 0}
+
+    def applies(self, request: GenerationRequest, opt_in: Optional[bool]) -> bool:
+        """Whether to use the cache: ``opt_in`` None caches deterministic
+        requests only, True caches regardless, False never."""
+        if opt_in is None:
+            return is_deterministic(request)
+        return opt_in
+
+    async def lookup(
+        self,
+        endpoint: str,
+        request: GenerationRequest,
+        opt_in: Optional[bool] = None,
+    ) -> Tuple[Optional[Generation], str]:
+        """Cached generation for the request, if any, and ``hit``,
+        ``miss`` or ``bypass``."""
+        if not self.applies(request, opt_in):
+            self.counters["bypassed"] += 1
+            return None, BYPASS
+        generation = await self._find(endpoint, request)
+        if generation is None:
+            self.counters["misses"] += 1
+            return None, MISS
+        self.counters["hits"] += 1
+        return generation, HIT
+
+    async def load(
+        self,
+        endpoint: str,
+        request: GenerationRequest,
+        generate: Callable[[], Awaitable[Generation]],
+        opt_in: Optional[bool] = None,
+    ) -> Tuple[Generation, str]:
+        """Cached generation for the request, or else one from
+        ``generate`` (stored for next time), and ``hit``, ``miss``,
+        ``coalesced`` or ``bypass``."""
+        if not self.applies(request, opt_in):
+            self.counters["bypassed"] += 1
+            return await generate(), BYPASS
+        generation = await self._find(endpoint, request)
+        if generation is not None:
+            self.counters["hits"] += 1
+            return generation, HIT
+
+        key = cache_key(endpoint, request)
+        flight = self._inflight.get(key)
+        if flight is not None:
+            self.counters["coalesced"] += 1
+            return await asyncio.shield(flight), COALESCED
+        self.counters["misses"] += 1
+        task = asyncio.ensure_future(self._fill(endpoint, request, generate))
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shielded: one caller giving up must not cancel the generation
+        # the others are waiting on
+        return await asyncio.shield(task), MISS
+
+    async def store_result(self, endpoint: str, request: GenerationRequest, generation: Generation) -> None:
+        key = cache_key(endpoint, request)
+        await self.store.set(
+            key,
+            {
+                "text": generation.text,
+                "prompt_tokens": generation.prompt_tokens,
+                "completion_tokens": generation.completion_tokens,
+            },
+            self.ttl,
+        )
+        if self.similarity > 0:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self._remember, endpoint, request, key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "backend": self.store.name, "similarity": self.similarity}
+
+    async def _find(self, endpoint: str, request: GenerationRequest) -> Optional[Generation]:
+        value = await self.store.get(cache_key(endpoint, request))
+        if value is None and self.similarity > 0:
+            loop = asyncio.get_running_loop()
+            key = await loop.run_in_executor(None, self._nearest, endpoint, request)
+            if key is not None:
+                value = await self.store.get(key)
+                if value is not None:
+                    self.counters["semantic_hits"] += 1
+        if value is None:
+            return None
+        return Generation(value["text"], value["prompt_tokens"], value["completion_tokens"])
+
+    async def _fill(
+        self,
+        endpoint: str,
+        request: GenerationRequest,
+        generate: Callable[[], Awaitable[Generation]],
+    ) -> Generation:
+        generation = await generate()
+        await self.store_result(endpoint, request, generation)
+        return generation
+
+    async def aclose(self) -> None:
+        await self.store.aclose()
+
+    def _embed(self, request: GenerationRequest) -> np.ndarray:
+        text = "\n".join(f"{role}: {content}" for role, content in normalize_messages(request.messages))
+        return self.embedder.embed([text])[0]
+
+    def _nearest(self, endpoint: str, request: GenerationRequest) -> Optional[str]:
+        vector = self._embed(request)
+        with self._lock:
+            index = self._semantic.get(sampling_key(endpoint, request))
+            if index is None:
+                return None
+            key, score = index.nearest(vector)
+        return key if score >= self.similarity else None
+
+    def _remember(self, endpoint: str, request: GenerationRequest, key: str) -> None:
+        vector = self._embed(request)
+        with self._lock:
+            bucket = sampling_key(endpoint, request)
+            index = self._semantic.get(bucket)
+            if index is None:
+                index = _SemanticIndex(self.embedder.dim, self.semantic_entries)
+                self._semantic.put(bucket, index)
+            index.add(key, vector)
+
+
+_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """The shared response cache, or None when RESPONSE_CACHE_BYTES is 0."""
+    global _cache
+    if _cache is None and settings.RESPONSE_CACHE_BYTES > 0:
+        store: ResponseStore = MemoryResponseStore(settings.RESPONSE_CACHE_BYTES)
+        if settings.RESPONSE_CACHE_BACKEND == "redis":
+            store = RedisResponseStore(settings.REDIS_URL, fallback=store)
+        _cache = ResponseCache(store)
+    return _cache
+
+
+async def shutdown_response_cache() -> None:
+    global _cache
+    if _cache is not None:
+        await _cache.aclose()
+        _cache = None
@@ -0,0 +1,69 @@
+import hashlib
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.services.llm import Message
+
+
+def prompt_prefix(messages: Sequence[Message], max_chars: Optional[int] = None) -> str:
+    """The part of a conversation later requests are likely to share.
+
+    That is every message but the last (system prompt and history), or
+    for a lone message its first ``max_chars`` characters.
+    """
+    max_chars = max_chars or settings.ROUTING_PREFIX_CHARS
+    if len(messages) > 1:
+        return "".join(f"{m['role']}\n{m['content']}\n" for m in messages[:-1])
+    if messages:
+        return f"{messages[0]['role']}\n{messages[0]['content'][:max_chars]}"
+    return ""
+
+
+def prefix_key(messages: Sequence[Message]) -> str:
+    return hashlib.blake2b(prompt_prefix(messages).encode(), digest_size=16).hexdigest()
+
+
+def _weight(key: str, instance: int) -> int:
+    digest = hashlib.blake2b(f"{key}:{instance}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def rendezvous_order(key: str, instance_count: int) -> List[int]:
+    """Instances in preference order for ``key`` (highest random weight
+    hashing). Adding or removing an instance only moves the keys that
+    rank it first."""
+    return sorted(range(instance_count), key=lambda instance: _weight(key, instance), reverse=True)
+
+
+class PrefixRouter:
+    """Picks an endpoint instance for a request by its prompt prefix.
+
+    Requests sharing a prefix go to the same instance so its prefix (KV)
+    cache stays warm. When that instance already has ``max_outstanding``
+    requests, the request spills to the least loaded instance instead,
+    preferring the prefix's next choices on ties.
+    """
+
+    def __init__(self, instance_count: int = 1, max_outstanding: Optional[int] = None):
+        self.instance_count = max(instance_count, 1)
+        self.max_outstanding = max_outstanding or settings.ROUTING_MAX_OUTSTANDING
+        self.counters: Dict[str, int] = {"sticky": 0, "spilled": 0}
+
+    def choose(self, key: str, outstanding: Sequence[int]) -> Tuple[int, bool]:
+        """Instance for ``key`` given each instance's outstanding requests,
+        and whether it is the prefix's own instance."""
+        if self.instance_count == 1:
+            self.counters["sticky"] += 1
+            return 0, True
+        order = rendezvous_order(key, self.instance_count)
+        preferred = order[0]
+        if outstanding[preferred] < self.max_outstanding:
+            self.counters["sticky"] += 1
+            return preferred, True
+        least = min(order, key=lambda instance: outstanding[instance])
+        if outstanding[least] >= outstanding[preferred]:
+            # Everyone is as busy; stay where the cache is warm
+            self.counters["sticky"] += 1
+            return preferred, True
+        self.counters["spilled"] += 1
+        return least, False
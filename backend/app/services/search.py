@@ -0,0 +1,205 @@
+import hashlib
+import json
+import re
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+from bs4 import BeautifulSoup
+
+from app.core.config import settings
+
+_WORD = re.compile(r"\w+")
+_SPACE = re.compile(r"\s+")
+_SKIPPED_TAGS = ("script", "style", "noscript", "nav", "header", "footer", "aside", "form")
+
+
+@dataclass
+class SearchResult:
+    url: str
+    title: str
+    snippet: str
+
+
+@dataclass
+class FetchedPage:
+    url: str
+    status: int
+    content_type: str
+    body: bytes
+    # Lower-cased response headers (ETag, Last-Modified, Cache-Control, ...)
+    headers: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status < 300
+
+
+class SearchProvider(ABC):
+    @abstractmethod
+    async def search(
+        self,
+        query: str,
+        limit: int,
+        include_domains: Sequence[str] = (),
+    ) -> List[SearchResult]:
+        ...
+
+
+class Fetcher(ABC):
+    @abstractmethod
+    async def fetch(self, url: str, headers: Optional[Dict[str, str]] = None) -> FetchedPage:
+        """GET ``url``; ``headers`` carries conditional request headers."""
+        ...
+
+    async def aclose(self) -> None:
+        pass
+
+
+def domain_of(url: str) -> str:
+    return (urlsplit(url).hostname or "").lower()
+
+
+def domain_matches(domain: str, patterns: Sequence[str]) -> bool:
+    """True if ``domain`` is one of ``patterns`` or a subdomain of one."""
+    for pattern in patterns:
+        pattern = pattern.lower().strip().lstrip(".")
+        if pattern.startswith("www."):
+            pattern = pattern[4:]
+        if domain == pattern or domain.endswith("." + pattern):
+            return True
+    return False
+
+
+def domain_allowed(url: str, include: Sequence[str], exclude: Sequence[str]) -> bool:
+    domain = domain_of(url)
+    if not domain:
+        return False
+    if include and not domain_matches(domain, include):
+        return False
+    return not domain_matches(domain, exclude)
+
+
+def parse_page(body: bytes, content_type: str, max_chars: int) -> Tuple[str, str]:
+    """Title and readable text of a fetched page.
+
+    CPU-bound; runs in the worker pool so large pages do not stall the
+    event loop.
+    """
+    if "html" not in content_type and body.lstrip()[:1] != b"<":
+        return "", _SPACE.sub(" ", body.decode("utf-8", errors="replace")).strip()[:max_chars]
+    soup = BeautifulSoup(body, "html.parser")
+    title = soup.title.get_text(" ", strip=True) if soup.title else ""
+    for tag in soup(_SKIPPED_TAGS):
+        tag.decompose()
+    root = soup.body or soup
+    text = _SPACE.sub(" ", root.get_text(" ", strip=True)).strip()
+    return title, text[:max_chars]
+
+
+class HttpFetcher(Fetcher):
+    """Fetches pages over one pooled ``httpx.AsyncClient``.
+
+    Bodies are read incrementally and cut off at ``max_bytes`` so a huge
+    download cannot pin memory.
+    """
+
+    def __init__(
+        self,
+        max_connections: Optional[int] = None,
+        timeout: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+    ):
+        max_connections = max_connections or settings.RESEARCH_MAX_CONCURRENT_FETCHES
+        self.max_bytes = max_bytes or settings.RESEARCH_MAX_PAGE_BYTES
+        self._client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            timeout=httpx.Timeout(timeout or settings.RESEARCH_FETCH_TIMEOUT_SECONDS),
+            follow_redirects=True,
+            headers={"User-Agent": f"{settings.APP_NAME} research bot"},
+        )
+
+    async def fetch(self, url: str, headers: Optional[Dict[str, str]] = None) -> FetchedPage:
+        async with self._client.stream("GET", url, headers=headers) as response:
+            body = bytearray()
+            async for chunk in response.aiter_bytes():
+                body += chunk
+                if len(body) >= self.max_bytes:
+                    del body[self.max_bytes:]
+                    break
+            return FetchedPage(
+                url=str(response.url),
+                status=response.status_code,
+                content_type=response.headers.get("content-type", ""),
+                body=bytes(body),
+                headers={name.lower(): value for name, value in response.headers.items()},
+            )
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+class StubCorpus(SearchProvider, Fetcher):
+    """Fixed set of documents serving both search and fetch.
+
+    Documents are ``{"url", "title", "html" | "text"}`` dicts. Search ranks
+    by how many query terms a document contains, so a local corpus can
+    drive the research engine without network access.
+    """
+
+    def __init__(self, documents: Iterable[Dict[str, Any]] = ()):
+        self._documents: Dict[str, Dict[str, Any]] = {}
+        self._terms: Dict[str, set] = {}
+        for document in documents:
+            self.add(document)
+
+    @classmethod
+    def from_file(cls, path: str) -> "StubCorpus":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.loads(line) for line in f if line.strip())
+
+    def add(self, document: Dict[str, Any]) -> None:
+        url = document["url"]
+        self._documents[url] = document
+        content = document.get("text") or document.get("html") or ""
+        self._terms[url] = set(_WORD.findall(f"{document.get('title', '')} {content}".lower()))
+
+    async def search(
+        self,
+        query: str,
+        limit: int,
+        include_domains: Sequence[str] = (),
+    ) -> List[SearchResult]:
+        terms = set(_WORD.findall(query.lower()))
+        scored = []
+        for order, (url, document_terms) in enumerate(self._terms.items()):
+            if include_domains and not domain_matches(domain_of(url), include_domains):
+                continue
+            overlap = len(terms & document_terms)
+            if overlap:
+                scored.append((-overlap, order, url))
+        scored.sort()
+        results = []
+        for _, _, url in scored[:limit]:
+            document = self._documents[url]
+            snippet = document.get("snippet") or document.get("text", "")[:200]
+            results.append(SearchResult(url=url, title=document.get("title", url), snippet=snippet))
+        return results
+
+    async def fetch(self, url: str, headers: Optional[Dict[str, str]] = None) -> FetchedPage:
+        document = self._documents.get(url)
+        if document is None:
+            return FetchedPage(url=url, status=404, content_type="text/plain", body=b"")
+        if "html" in document:
+            content_type, body = "text/html; charset=utf-8", document["html"].encode()
+        else:
+            content_type, body = "text/plain; charset=utf-8", document.get("text", "").encode()
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()[:16]
+        if headers and headers.get("If-None-Match") == etag:
+            return FetchedPage(url, 304, content_type, b"", {"etag": etag})
+        return FetchedPage(url, 200, content_type, body, {"etag": etag})
@@ -0,0 +1,208 @@
+import os
+import uuid
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Iterator
+
+import boto3
+from botocore.exceptions import ClientError
+
+from app.core.config import settings
+
+# S3 rejects multipart parts smaller than 5 MiB (except the last one)
+S3_PART_SIZE = 8 * 1024 * 1024
+
+
+class BlobWriter(ABC):
+    """Append-only writer for a single blob.
+
+    Used as a context manager: the blob is committed on a clean exit and
+    discarded if the block raises.
+    """
+
+    @abstractmethod
+    def write(self, chunk: bytes) -> None:
+        ...
+
+    @abstractmethod
+    def commit(self) -> None:
+        ...
+
+    @abstractmethod
+    def abort(self) -> None:
+        ...
+
+    def __enter__(self) -> "BlobWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+
+
+class StorageBackend(ABC):
+    @abstractmethod
+    def uri(self, key: str) -> str:
+        ...
+
+    @abstractmethod
+    def open_writer(self, key: str) -> BlobWriter:
+        ...
+
+    @abstractmethod
+    def iter_chunks(self, key: str, chunk_size: int) -> Iterator[bytes]:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    def move(self, src_key: str, dest_key: str) -> None:
+        ...
+
+
+class _LocalWriter(BlobWriter):
+    def __init__(self, path: str):
+        self._path = path
+        self._tmp_path = f"{path}.{uuid.uuid4().hex}.part"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(self._tmp_path, "wb")
+
+    def write(self, chunk: bytes) -> None:
+        self._file.write(chunk)
+
+    def commit(self) -> None:
+        self._file.close()
+        os.replace(self._tmp_path, self._path)
+
+    def abort(self) -> None:
+        self._file.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+
+class LocalStorage(StorageBackend):
+    """Filesystem stand-in for S3, used in development."""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+
+    def _path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if os.path.commonpath([self.root, path]) != self.root:
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    def uri(self, key: str) -> str:
+        return f"file://{self._path(key)}"
+
+    def open_writer(self, key: str) -> BlobWriter:
+        return _LocalWriter(self._path(key))
+
+    def iter_chunks(self, key: str, chunk_size: int) -> Iterator[bytes]:
+        with open(self._path(key), "rb") as f:
+            while chunk := f.read(chunk_size):
+                yield chunk
+
+    def delete(self, key: str) -> None:
+        path = self._path(key)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def move(self, src_key: str, dest_key: str) -> None:
+        dest = self._path(dest_key)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        os.replace(self._path(src_key), dest)
+
+
+class _S3Writer(BlobWriter):
+    def __init__(self, client, bucket: str, key: str):
+        self._client = client
+        self._bucket = bucket
+        self._key = key
+        self._buffer = bytearray()
+        self._parts = []
+        upload = client.create_multipart_upload(Bucket=bucket, Key=key)
+        self._upload_id = upload["UploadId"]
+
+    def _flush(self) -> None:
+        part_number = len(self._parts) + 1
+        response = self._client.upload_part(
+            Bucket=self._bucket,
+            Key=self._key,
+            PartNumber=part_number,
+            UploadId=self._upload_id,
+            Body=bytes(self._buffer),
+        )
+        self._parts.append({"ETag": response["ETag"], "PartNumber": part_number})
+        self._buffer.clear()
+
+    def write(self, chunk: bytes) -> None:
+        self._buffer += chunk
+        if len(self._buffer) >= S3_PART_SIZE:
+            self._flush()
+
+    def commit(self) -> None:
+        if self._buffer or not self._parts:
+            self._flush()
+        self._client.complete_multipart_upload(
+            Bucket=self._bucket,
+            Key=self._key,
+            UploadId=self._upload_id,
+            MultipartUpload={"Parts": self._parts},
+        )
+
+    def abort(self) -> None:
+        self._client.abort_multipart_upload(
+            Bucket=self._bucket, Key=self._key, UploadId=self._upload_id
+        )
+
+
+class S3Storage(StorageBackend):
+    def __init__(self, bucket: str, region: str):
+        self.bucket = bucket
+        self._client = boto3.client("s3", region_name=region)
+
+    def uri(self, key: str) -> str:
+        return f"s3://{self.bucket}/{key}"
+
+    def open_writer(self, key: str) -> BlobWriter:
+        return _S3Writer(self._client, self.bucket, key)
+
+    def iter_chunks(self, key: str, chunk_size: int) -> Iterator[bytes]:
+        response = self._client.get_object(Bucket=self.bucket, Key=key)
+        yield from response["Body"].iter_chunks(chunk_size)
+
+    def delete(self, key: str) -> None:
+        self._client.delete_object(Bucket=self.bucket, Key=key)
+
+    def exists(self, key: str) -> bool:
+        try:
+            self._client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+                return False
+            raise
+        return True
+
+    def move(self, src_key: str, dest_key: str) -> None:
+        # Managed copy switches to multipart for objects over 5 GB
+        self._client.copy({"Bucket": self.bucket, "Key": src_key}, self.bucket, dest_key)
+        self._client.delete_object(Bucket=self.bucket, Key=src_key)
+
+
+@lru_cache
+def get_storage() -> StorageBackend:
+    if settings.DATASET_STORAGE_BACKEND == "s3":
+        return S3Storage(f"{settings.S3_BUCKET_PREFIX}-datasets", settings.AWS_REGION)
+    return LocalStorage(settings.DATASET_STORAGE_DIR)
@@ -0,0 +1,457 @@
+import asyncio
+import itertools
+import math
+import random
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import structlog
+
+from app.api.models import MODEL_CATALOG
+from app.core.config import settings
+from app.db.repository import Database
+from app.db.session import session_scope
+from app.services.estimator import get_training_estimator
+from app.services.orchestrator import TERMINAL_STATUSES, get_training_orchestrator, new_training_run
+from app.services.training_metrics import get_training_metrics
+from app.services.training_queue import get_training_queue
+
+logger = structlog.get_logger()
+
+SEARCH_METHODS = ("grid", "random", "bayes")
+ACTIVE_SWEEP_STATUSES = ("running", "stopping")
+# Finished trials before the Bayesian search stops sampling at random
+BAYES_STARTUP_TRIALS = 5
+# Share of trials TPE models as "good", and candidates scored per suggestion
+TPE_GAMMA = 0.25
+TPE_CANDIDATES = 64
+
+
+@dataclass
+class Dimension:
+    """One searched parameter: a list of ``values``, or a ``low``-``high``
+    range sampled uniformly (in log space if ``log``)."""
+
+    name: str
+    values: Optional[List[Any]] = None
+    low: float = 0.0
+    high: float = 1.0
+    log: bool = False
+    integer: bool = False
+
+    @classmethod
+    def parse(cls, name: str, spec: Any) -> "Dimension":
+        if isinstance(spec, list):
+            return cls(name, values=list(spec))
+        return cls(
+            name,
+            low=float(spec["min"]),
+            high=float(spec["max"]),
+            log=bool(spec.get("log", False)),
+            integer=bool(spec.get("integer", False)),
+        )
+
+    def to_unit(self, value: Any) -> float:
+        """Position of a range value in [0, 1]."""
+        if self.log:
+            low, high, value = math.log(self.low), math.log(self.high), math.log(value)
+        else:
+            low, high = self.low, self.high
+        return (value - low) / (high - low) if high > low else 0.5
+
+    def from_unit(self, u: float) -> Any:
+        u = min(max(u, 0.0), 1.0)
+        if self.log:
+            value = math.exp(math.log(self.low) + u * (math.log(self.high) - math.log(self.low)))
+        else:
+            value = self.low + u * (self.high - self.low)
+        return int(round(value)) if self.integer else float(f"{value:.6g}")
+
+    def sample(self, rng: random.Random) -> Any:
+        if self.values is not None:
+            return rng.choice(self.values)
+        return self.from_unit(rng.random())
+
+
+def parse_space(parameters: Dict[str, Any]) -> List[Dimension]:
+    return [Dimension.parse(name, spec) for name, spec in sorted(parameters.items())]
+
+
+def grid_size(space: Sequence[Dimension]) -> int:
+    return math.prod(len(d.values or ()) for d in space)
+
+
+def grid_point(space: Sequence[Dimension], index: int) -> Dict[str, Any]:
+    """The ``index``-th combination of a grid of value lists."""
+    point = {}
+    for dimension in reversed(space):
+        index, i = divmod(index, len(dimension.values))
+        point[dimension.name] = dimension.values[i]
+    return point
+
+
+def suggest_tpe(
+    space: Sequence[Dimension],
+    history: Sequence[Tuple[Dict[str, Any], float]],
+    rng: np.random.Generator,
+) -> Dict[str, Any]:
+    """Tree-structured Parzen estimator: split finished trials into the
+    best ``TPE_GAMMA`` share and the rest, model each dimension with a
+    Parzen window over both groups, and return the candidate, drawn from
+    the good group's model, with the highest good-to-bad density ratio."""
+    ordered = sorted(history, key=lambda item: item[1])
+    n_good = max(1, math.ceil(TPE_GAMMA * len(ordered)))
+    good = [params for params, _ in ordered[:n_good]]
+    bad = [params for params, _ in ordered[n_good:]] or good
+    candidates: List[Dict[str, Any]] = [{} for _ in range(TPE_CANDIDATES)]
+    scores = np.zeros(TPE_CANDIDATES)
+    for dimension in space:
+        if dimension.values is not None:
+            k = len(dimension.values)
+            weights = {}
+            for name, group in (("good", good), ("bad", bad)):
+                counts = np.ones(k)
+                for params in group:
+                    if params.get(dimension.name) in dimension.values:
+                        counts[dimension.values.index(params[dimension.name])] += 1
+                weights[name] = counts / counts.sum()
+            picks = rng.choice(k, size=TPE_CANDIDATES, p=weights["good"])
+            scores += np.log(weights["good"][picks]) - np.log(weights["bad"][picks])
+            for candidate, pick in zip(candidates, picks):
+                candidate[dimension.name] = dimension.values[pick]
+            continue
+        good_u = np.array([dimension.to_unit(p[dimension.name]) for p in good if dimension.name in p])
+        bad_u = np.array([dimension.to_unit(p[dimension.name]) for p in bad if dimension.name in p])
+        bandwidth = max(0.05, 0.5 * len(history) ** -0.2)
+        # Draw around good points, with a uniform prior as one more component
+        centers = rng.choice(np.append(good_u, np.nan), size=TPE_CANDIDATES)
+        uniform = np.isnan(centers)
+        u = np.where(uniform, rng.random(TPE_CANDIDATES), centers + rng.normal(0, bandwidth, TPE_CANDIDATES))
+        u = np.clip(u, 0.0, 1.0)
+        scores += np.log(_parzen(u, good_u, bandwidth)) - np.log(_parzen(u, bad_u, bandwidth))
+        for candidate, value in zip(candidates, u):
+            candidate[dimension.name] = dimension.from_unit(float(value))
+    return candidates[int(np.argmax(scores))]
+
+
+def _parzen(u: np.ndarray, centers: np.ndarray, bandwidth: float) -> np.ndarray:
+    """Density of an equal mixture of Gaussians at ``centers`` and a
+    uniform prior on [0, 1]."""
+    density = np.ones_like(u)
+    if len(centers):
+        z = (u[:, None] - centers[None, :]) / bandwidth
+        density = density + (np.exp(-0.5 * z ** 2) / (bandwidth * math.sqrt(2 * math.pi))).sum(axis=1)
+    return density / (len(centers) + 1)
+
+
+def asha_rungs(min_steps: int, reduction_factor: int, total_steps: int) -> List[int]:
+    """Steps at which trials are compared: ``min_steps * eta**k`` below
+    the end of training."""
+    rungs = []
+    step = min_steps
+    while step < total_steps:
+        rungs.append(step)
+        step *= reduction_factor
+    return rungs
+
+
+def asha_keeps(value: float, peers: Sequence[float], reduction_factor: int) -> bool:
+    """Whether a trial with ``value`` at a rung is in the top
+    ``1 / reduction_factor`` of every trial that reached it (``peers``,
+    itself included). Too few peers to judge keeps it."""
+    if len(peers) < reduction_factor:
+        return True
+    cutoff = sorted(peers)[max(len(peers) // reduction_factor, 1) - 1]
+    return value <= cutoff
+
+
+class SweepScheduler:
+    """Advances hyperparameter sweeps from a background loop.
+
+    Each pass, for every running sweep: records the progress of its
+    trials' runs, stops trials that fall out of the top of an ASHA rung
+    on ``eval_loss``, and launches new trials (grid, random or TPE
+    suggestions) up to the sweep's concurrency, trial and budget caps.
+    Trials are ordinary training runs carrying a ``sweep_id``: they wait
+    in the training queue like any other run, and the training
+    orchestrator submits and stops them. Budgets are in
+    estimated dollars: a running trial holds its full estimate, an ended
+    one the share of steps it ran.
+    """
+
+    def __init__(self, interval: Optional[float] = None):
+        self.interval = settings.SWEEP_SCHEDULER_INTERVAL_SECONDS if interval is None else interval
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    async def aclose(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self) -> None:
+        failures = 0
+        while True:
+            self._wake.clear()
+            try:
+                await self.tick()
+                failures = 0
+                delay = self.interval
+            except Exception:
+                failures += 1
+                delay = min(self.interval * 2 ** failures, 600.0)
+                logger.exception("Sweep scheduling failed", retry_in=delay)
+            # See TrainingOrchestrator._loop
+            waiter = asyncio.ensure_future(self._wake.wait())
+            try:
+                await asyncio.wait({waiter}, timeout=delay)
+            finally:
+                waiter.cancel()
+
+    async def tick(self) -> None:
+        for status in ACTIVE_SWEEP_STATUSES:
+            async for sweep_ids in self._sweeps(status):
+                for sweep_id in sweep_ids:
+                    try:
+                        await self.advance(sweep_id)
+                    except Exception:
+                        logger.exception("Sweep step failed", sweep_id=sweep_id)
+
+    async def _sweeps(self, status: str) -> AsyncIterator[List[str]]:
+        """Ids of sweeps with ``status``, a batch at a time; each is
+        advanced from a fresh read."""
+        after = None
+        while True:
+            async with session_scope() as db:
+                sweeps = await db.training_sweeps.list(limit=100, newest_first=False, after=after, status=status)
+                if sweeps:
+                    after = db.training_sweeps.sort_key(sweeps[-1])
+            if not sweeps:
+                return
+            yield [sweep["id"] for sweep in sweeps]
+
+    async def advance(self, sweep_id: str) -> None:
+        launched: List[Dict[str, Any]] = []
+        async with session_scope() as db:
+            sweep = await db.training_sweeps.get(sweep_id)
+            if sweep is None or sweep["status"] not in ACTIVE_SWEEP_STATUSES:
+                return
+            stopped = await self._track(db, sweep)
+            if sweep["status"] == "running":
+                launched = await self._launch(db, sweep)
+            # Keep a stop requested through the API while this pass ran
+            async with session_scope() as fresh:
+                current = await fresh.training_sweeps.get(sweep_id)
+            if current is not None and current["status"] == "stopping":
+                sweep["status"] = "stopping"
+            self._summarize(sweep)
+            await db.training_sweeps.save(sweep)
+            await db.commit()
+        for run in launched:
+            await get_training_queue().push(run)
+        if stopped or launched:
+            get_training_orchestrator().wake()
+
+    async def _track(self, db: Database, sweep: Dict[str, Any]) -> bool:
+        """Update running trials from their runs and apply early stopping;
+        returns whether any run was told to stop."""
+        stopping = False
+        early = sweep["early_stopping"]
+        for trial in sweep["trials"]:
+            if trial["status"] not in ("running", "pruning"):
+                continue
+            run = await db.training_runs.get(trial["run_id"])
+            if run is None:
+                trial["status"] = "failed"
+                continue
+            if run["status"] in TERMINAL_STATUSES:
+                if run["status"] == "completed":
+                    # Finished before a pending prune reached it
+                    trial["status"] = "completed"
+                elif trial["status"] == "pruning":
+                    trial["status"] = "pruned"
+                else:
+                    trial["status"] = run["status"]
+                share = 1.0 if run["status"] == "completed" else self._progress(run)
+                trial["cost"] = round(trial["estimated_cost"] * share, 4)
+                trial["completed_at"] = run["completed_at"]
+            series = (await get_training_metrics().query(run, metrics=["eval_loss"]))["series"]["eval_loss"]
+            steps, values = series["steps"], series["values"]
+            if values:
+                trial["eval_loss"] = values[-1]
+                trial["step"] = steps[-1]
+            if sweep["status"] == "stopping":
+                if trial["status"] == "running":
+                    stopping |= await self._stop(run)
+                continue
+            if not early["enabled"]:
+                continue
+            total_steps = run["metrics"].get("total_steps") or 0
+            for rung in asha_rungs(early["min_steps"], early["reduction_factor"], total_steps):
+                if str(rung) in trial["rungs"]:
+                    continue
+                # The first evaluation at or past the rung
+                i = next((i for i, step in enumerate(steps) if step >= rung), None)
+                if i is None:
+                    break
+                value = trial["rungs"][str(rung)] = values[i]
+                if trial["status"] != "running":
+                    # Recorded as a peer for later trials only
+                    continue
+                peers = [t["rungs"][str(rung)] for t in sweep["trials"] if str(rung) in t["rungs"]]
+                if not asha_keeps(value, peers, early["reduction_factor"]):
+                    logger.info(
+                        "Sweep trial pruned", sweep_id=sweep["id"], trial=trial["index"], step=rung, eval_loss=value
+                    )
+                    trial["status"] = "pruning"
+                    trial["pruned_at_step"] = rung
+                    stopping |= await self._stop(run)
+        return stopping
+
+    @staticmethod
+    def _progress(run: Dict[str, Any]) -> float:
+        metrics = run["metrics"]
+        if not metrics.get("total_steps"):
+            return 0.0
+        return min(metrics.get("current_step", 0) / metrics["total_steps"], 1.0)
+
+    @staticmethod
+    async def _stop(run: Dict[str, Any]) -> bool:
+        """Ask the orchestrator to stop ``run``, as the stop route does.
+        Applied to a fresh copy: reading metrics can take a while, and a
+        run the orchestrator finished meanwhile must stay finished."""
+        async with session_scope() as db:
+            current = await db.training_runs.get(run["id"])
+            if current is None or current["status"] in TERMINAL_STATUSES or current["status"] == "stopping":
+                return False
+            current["status"] = "stopping"
+            await db.training_runs.save(current)
+            await db.commit()
+        return True
+
+    async def _launch(self, db: Database, sweep: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Start trials while the sweep's caps allow; returns the runs
+        created, to queue once saved."""
+        space = parse_space(sweep["parameters"])
+        model = next(m for m in MODEL_CATALOG if m["id"] == sweep["model_id"])
+        dataset = await db.datasets.get(sweep["dataset_id"])
+        launched: List[Dict[str, Any]] = []
+        while True:
+            trials = sweep["trials"]
+            running = sum(1 for t in trials if t["status"] in ("running", "pruning"))
+            if running >= sweep["max_concurrency"] or len(trials) >= sweep["max_trials"]:
+                return launched
+            if dataset is None:
+                sweep["error_message"] = f"Dataset {sweep['dataset_id']} not found"
+                sweep["max_trials"] = len(trials)
+                return launched
+            params = self._suggest(sweep, space)
+            config = {**sweep["config"], **params}
+            trial: Dict[str, Any] = {
+                "index": len(trials),
+                "params": params,
+                "status": "running",
+                "run_id": None,
+                "estimated_cost": 0.0,
+                "cost": None,
+                "eval_loss": None,
+                "step": None,
+                "rungs": {},
+            }
+            try:
+                estimates = await get_training_estimator().estimate_run(model, dataset, config)
+            except Exception as e:
+                # One bad suggestion must not stall the sweep
+                logger.warning("Sweep trial not estimated", sweep_id=sweep["id"], trial=trial["index"], error=str(e))
+                trial.update(status="infeasible", error_message=str(e), cost=0.0)
+                trials.append(trial)
+                continue
+            estimate = estimates.get(sweep["instance_type"])
+            trial["estimated_cost"] = estimate.cost
+            if not estimate.fits:
+                trial.update(status="infeasible", error_message=estimate.reason, cost=0.0)
+                trials.append(trial)
+                continue
+            if sweep["budget"] is not None and self._committed(trials) + estimate.cost > sweep["budget"]:
+                sweep["budget_exhausted"] = True
+                return launched
+            run = new_training_run(
+                sweep["project_id"],
+                dataset,
+                sweep["model_id"],
+                config,
+                sweep["instance_type"],
+                estimates,
+                user_id=sweep["user_id"],
+                priority=sweep["priority"],
+            )
+            run["sweep_id"] = sweep["id"]
+            run["sweep_trial"] = trial["index"]
+            await db.training_runs.add(run)
+            trial["run_id"] = run["id"]
+            trials.append(trial)
+            launched.append(run)
+
+    @staticmethod
+    def _committed(trials: Sequence[Dict[str, Any]]) -> float:
+        return sum(t["cost"] if t["cost"] is not None else t["estimated_cost"] for t in trials)
+
+    @staticmethod
+    def _suggest(sweep: Dict[str, Any], space: Sequence[Dimension]) -> Dict[str, Any]:
+        index = len(sweep["trials"])
+        if sweep["method"] == "grid":
+            return grid_point(space, index)
+        # Seeded per trial, so a restarted scheduler suggests the same
+        history = [
+            (t["params"], t["eval_loss"])
+            for t in sweep["trials"]
+            if t["status"] in ("completed", "pruned") and t["eval_loss"] is not None
+        ]
+        if sweep["method"] == "bayes" and len(history) >= BAYES_STARTUP_TRIALS:
+            return suggest_tpe(space, history, np.random.default_rng([sweep["seed"], index]))
+        rng = random.Random(f"{sweep['seed']}-{index}")
+        return {dimension.name: dimension.sample(rng) for dimension in space}
+
+    def _summarize(self, sweep: Dict[str, Any]) -> None:
+        trials = sweep["trials"]
+        sweep["spent"] = round(sum(t["cost"] or 0.0 for t in trials), 4)
+        finished = [t for t in trials if t["status"] == "completed" and t["eval_loss"] is not None]
+        best = min(finished, key=lambda t: t["eval_loss"], default=None)
+        sweep["best_trial"] = best["index"] if best else None
+        if any(t["status"] in ("running", "pruning") for t in trials):
+            return
+        if (
+            sweep["status"] == "stopping"
+            or len(trials) >= sweep["max_trials"]
+            or sweep.get("budget_exhausted")
+        ):
+            sweep["status"] = "stopped" if sweep["status"] == "stopping" else "completed"
+            sweep["completed_at"] = datetime.utcnow().isoformat()
+            logger.info("Sweep finished", sweep_id=sweep["id"], status=sweep["status"], best_trial=sweep["best_trial"])
+
+
+_scheduler: Optional[SweepScheduler] = None
+
+
+def get_sweep_scheduler() -> SweepScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = SweepScheduler()
+    return _scheduler
+
+
+async def shutdown_sweep_scheduler() -> None:
+    global _scheduler
+    if _scheduler is not None:
+        await _scheduler.aclose()
+        _scheduler = None
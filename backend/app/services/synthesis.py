@@ -0,0 +1,194 @@
+import asyncio
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.services.llm import LLMClient, Message, count_message_tokens, count_tokens
+from app.services.ranking import ChunkIndex
+
+FORMAT_INSTRUCTIONS = {
+    "bullets": "Answer as a concise list of bullet points.",
+    "report": "Answer as a structured report with a summary, key findings and details, using markdown headings.",
+    "faq": "Answer as a list of questions a reader would ask, each followed by its answer.",
+    "pros-cons": "Answer with a 'Pros' section and a 'Cons' section of bullet points.",
+}
+
+_SYSTEM = (
+    "You are a research assistant. Use only the numbered source passages you are given "
+    "and cite them inline as [n]. Say so when the sources do not answer the question."
+)
+
+
+@dataclass
+class Passage:
+    number: int  # citation number, shared by every chunk of one source
+    url: str
+    title: str
+    text: str
+    tokens: int
+
+    def render(self) -> str:
+        return f"[{self.number}] {self.text}"
+
+
+def select_passages(
+    index: ChunkIndex,
+    question: str,
+    sources: Sequence[Dict],
+    budget: int,
+) -> List[Passage]:
+    """The best-ranked chunks that fit in ``budget`` tokens.
+
+    Chunks are taken in score order and skipped when they would overflow
+    the budget, so one long chunk does not crowd out several short ones.
+    Citation numbers follow the order of ``sources``.
+    """
+    numbers = {source["url"]: i for i, source in enumerate(sources, 1)}
+    # A chunk is ~1.3 tokens per word; over-fetch so skipped chunks leave
+    # enough candidates to fill the budget
+    k = max(budget // max(index.chunk_words, 1), 1) * 2
+    passages, used = [], 0
+    for chunk, score in index.top_k(question, k):
+        if score <= 0 or chunk.url not in numbers:
+            continue
+        tokens = count_tokens(chunk.text) + 4
+        if used + tokens > budget:
+            continue
+        used += tokens
+        passages.append(Passage(numbers[chunk.url], chunk.url, chunk.title, chunk.text, tokens))
+    return passages
+
+
+def batch_passages(passages: Sequence[Passage], max_tokens: int) -> List[List[Passage]]:
+    """Consecutive groups of passages of at most ``max_tokens`` each."""
+    batches: List[List[Passage]] = []
+    current: List[Passage] = []
+    size = 0
+    for passage in passages:
+        if current and size + passage.tokens > max_tokens:
+            batches.append(current)
+            current, size = [], 0
+        current.append(passage)
+        size += passage.tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+class Synthesizer:
+    """Map-reduce report writing for one research session.
+
+    Passage batches are summarised concurrently (map) and each summary is
+    handed back as soon as it completes. If the summaries together exceed
+    the reduce budget they are condensed again in groups, then one final
+    call writes the report in the requested format and is streamed.
+    Token usage of every call is accumulated in ``usage``.
+    """
+
+    def __init__(
+        self,
+        client: LLMClient,
+        question: str,
+        output_format: str,
+        concurrency: Optional[int] = None,
+    ):
+        self.client = client
+        self.question = question
+        self.output_format = output_format if output_format in FORMAT_INSTRUCTIONS else "bullets"
+        self.usage = {"prompt_tokens": 0, "completion_tokens": 0, "calls": 0}
+        self._slots = asyncio.Semaphore(concurrency or settings.RESEARCH_SYNTHESIS_CONCURRENCY)
+
+    async def summarize(self, batches: Sequence[List[Passage]]) -> AsyncIterator[Tuple[int, str]]:
+        """``(batch number, summary)`` pairs in completion order."""
+        tasks = [asyncio.create_task(self._summarize(i, batch)) for i, batch in enumerate(batches)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def condense(self, notes: List[str]) -> List[str]:
+        """Summarise groups of notes until they fit the reduce budget."""
+        budget = settings.RESEARCH_REDUCE_TOKENS
+        while len(notes) > 1:
+            sizes = [count_tokens(note) for note in notes]
+            if sum(sizes) <= budget:
+                break
+            groups: List[List[str]] = [[]]
+            size = 0
+            for note, tokens in zip(notes, sizes):
+                if groups[-1] and size + tokens > budget:
+                    groups.append([])
+                    size = 0
+                groups[-1].append(note)
+                size += tokens
+            if len(groups) == len(notes):
+                # Every note fills the budget alone; merging pairs still
+                # halves the count each round
+                groups = [notes[i:i + 2] for i in range(0, len(notes), 2)]
+            notes = list(await asyncio.gather(*(self._condense(group) for group in groups)))
+        return notes
+
+    async def report(self, notes: Sequence[str]) -> AsyncIterator[str]:
+        """The final report, as text deltas."""
+        messages = self._messages(
+            "Research notes:\n" + "\n\n".join(notes),
+            FORMAT_INSTRUCTIONS[self.output_format],
+            self.output_format,
+        )
+        parts = []
+        async with self._slots:
+            async for delta in self.client.stream(messages, settings.RESEARCH_REPORT_TOKENS):
+                parts.append(delta)
+                yield delta
+        # Streaming responses carry no usage; count both sides ourselves
+        self._record(count_message_tokens(messages), count_tokens("".join(parts)))
+
+    async def _summarize(self, number: int, batch: List[Passage]) -> Tuple[int, str]:
+        messages = self._messages(
+            "Sources:\n" + "\n".join(passage.render() for passage in batch),
+            "Extract the facts relevant to the question as short notes, keeping the citations.",
+        )
+        return number, await self._complete(messages, settings.RESEARCH_SECTION_TOKENS)
+
+    async def _condense(self, group: List[str]) -> str:
+        messages = self._messages(
+            "Notes:\n" + "\n\n".join(group),
+            "Merge these notes into shorter notes without losing facts or citations.",
+        )
+        return await self._complete(messages, settings.RESEARCH_SECTION_TOKENS)
+
+    async def _complete(self, messages: List[Message], max_tokens: int) -> str:
+        async with self._slots:
+            completion = await self.client.complete(messages, max_tokens)
+        self._record(completion.prompt_tokens, completion.completion_tokens)
+        return completion.text
+
+    def _messages(self, context: str, instruction: str, output_format: str = "notes") -> List[Message]:
+        return [
+            {"role": "system", "content": _SYSTEM},
+            {
+                "role": "user",
+                "content": (
+                    f"Question: {self.question}\n"
+                    f"Output format: {output_format}\n\n"
+                    f"{context}\n\n{instruction}"
+                ),
+            },
+        ]
+
+    def _record(self, prompt_tokens: int, completion_tokens: int) -> None:
+        self.usage["prompt_tokens"] += prompt_tokens
+        self.usage["completion_tokens"] += completion_tokens
+        self.usage["calls"] += 1
+
+
+def cited_sources(text: str, passages: Sequence[Passage]) -> List[Tuple[int, str, str]]:
+    """``(number, title, url)`` of every passage source cited in ``text``."""
+    seen = {}
+    for passage in passages:
+        if passage.number not in seen and f"[{passage.number}]" in text:
+            seen[passage.number] = (passage.number, passage.title, passage.url)
+    return [seen[number] for number in sorted(seen)]
@@ -0,0 +1,538 @@
+import asyncio
+import itertools
+import json
+import math
+import os
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from array import array
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, Hashable, Iterator, List, Optional, Pattern, Sequence, Tuple
+
+import structlog
+
+from app.core.config import settings
+from app.db.session import session_scope
+from app.services.cache import LRUCache
+from app.services.orchestrator import (
+    TERMINAL_STATUSES,
+    FakeTrainingProvider,
+    ProviderError,
+    TransientProviderError,
+    with_backoff,
+)
+
+logger = structlog.get_logger()
+
+# (timestamp in epoch milliseconds, message) as read from a source
+RawLine = Tuple[int, str]
+
+LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR")
+_LEVEL_CODES = {"DEBUG": "D", "INFO": "I", "WARNING": "W", "ERROR": "E"}
+_CODE_LEVELS = {code: level for level, code in _LEVEL_CODES.items()}
+_LEVEL_PATTERN = re.compile(r"\b(DEBUG|INFO|WARN(?:ING)?|ERROR|CRITICAL|FATAL|Traceback)\b")
+_LEVEL_ALIASES = {"WARN": "WARNING", "CRITICAL": "ERROR", "FATAL": "ERROR", "Traceback": "ERROR"}
+
+# How long after a run ends a lagging source may still deliver lines;
+# after that the stored log is final
+SETTLE_SECONDS = 60.0
+# Source pages pulled per sync, so one request never drains a huge backlog
+MAX_PAGES_PER_SYNC = 20
+
+
+def detect_level(message: str) -> str:
+    match = _LEVEL_PATTERN.search(message, 0, 200)
+    if match is None:
+        return "INFO"
+    return _LEVEL_ALIASES.get(match.group(1), match.group(1))
+
+
+def to_millis(value: datetime) -> int:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() * 1000)
+
+
+def _escape(message: str) -> str:
+    return message.replace("\\", "\\\\").replace("\n", "\\n").replace("\r", "\\r")
+
+
+_ESCAPES = re.compile(r"\\(.)")
+
+
+def _unescape(text: str) -> str:
+    if "\\" not in text:
+        return text
+    return _ESCAPES.sub(lambda m: {"n": "\n", "r": "\r"}.get(m.group(1), m.group(1)), text)
+
+
+@dataclass
+class LogLine:
+    offset: int
+    timestamp: int
+    level: str
+    message: str
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "offset": self.offset,
+            "timestamp": datetime.fromtimestamp(self.timestamp / 1000, timezone.utc).isoformat(),
+            "level": self.level,
+            "message": self.message,
+        }
+
+
+@dataclass
+class LogQuery:
+    """Which lines to return: from line ``offset`` (or the last ``tail``
+    lines), within ``[since, until]`` epoch milliseconds, at ``level`` or
+    above and matching ``pattern``."""
+
+    offset: int = 0
+    tail: Optional[int] = None
+    limit: int = 500
+    since: Optional[int] = None
+    until: Optional[int] = None
+    level: Optional[str] = None
+    pattern: Optional[Pattern[str]] = None
+
+
+@dataclass
+class LogPage:
+    lines: List[LogLine]
+    next_offset: int  # where to continue reading
+    total_lines: int
+    # Past ``until``: no later line can match
+    end_of_range: bool = False
+
+
+class RunLog:
+    """Append-only log of one run, stored in its own directory.
+
+    ``lines`` holds one ``<epoch ms>\\t<level code>\\t<message>`` line per
+    log line, with newlines in messages escaped. ``index`` holds an
+    int64 ``(line, byte offset, epoch ms)`` triple for every
+    ``INDEX_EVERY``-th line, so a seek by line or time reads at most that
+    many lines past the nearest entry. ``meta.json`` is replaced last on
+    every append; on open, bytes and index entries past it are dropped,
+    so an interrupted append is simply redone from the source cursor.
+    Timestamps are kept non-decreasing so time seeks can bisect.
+    """
+
+    INDEX_EVERY = 256
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.lines = 0
+        self.bytes = 0
+        self.last_ms = 0
+        self.cursor: Optional[str] = None
+        self.complete = False
+        self._index = array("q")
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, directory: str) -> "RunLog":
+        log = cls(directory)
+        os.makedirs(directory, exist_ok=True)
+        try:
+            with open(log._path("meta.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            meta = {}
+        log.lines = meta.get("lines", 0)
+        log.bytes = meta.get("bytes", 0)
+        log.last_ms = meta.get("last_ms", 0)
+        log.cursor = meta.get("cursor")
+        log.complete = meta.get("complete", False)
+        with open(log._path("lines"), "ab") as f:
+            f.truncate(log.bytes)
+        entries = -(-log.lines // cls.INDEX_EVERY)
+        try:
+            with open(log._path("index"), "rb") as f:
+                log._index.fromfile(f, entries * 3)
+        except (FileNotFoundError, EOFError):
+            log._index = array("q")
+        if len(log._index) != entries * 3:
+            log._rebuild_index()
+        with open(log._path("index"), "ab") as f:
+            f.truncate(len(log._index) * log._index.itemsize)
+        return log
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _rebuild_index(self) -> None:
+        self._index = array("q")
+        position = 0
+        with open(self._path("lines"), "rb") as f:
+            for line_no, raw in enumerate(f):
+                if line_no >= self.lines:
+                    break
+                if line_no % self.INDEX_EVERY == 0:
+                    self._index.extend((line_no, position, int(raw.split(b"\t", 1)[0])))
+                position += len(raw)
+
+    def append(self, entries: Sequence[RawLine], cursor: Optional[str], complete: bool = False) -> None:
+        with self._lock:
+            lines, position, last_ms = self.lines, self.bytes, self.last_ms
+            chunks: List[bytes] = []
+            index = array("q")
+            for ms, message in entries:
+                last_ms = max(ms, last_ms)
+                if lines % self.INDEX_EVERY == 0:
+                    index.extend((lines, position, last_ms))
+                code = _LEVEL_CODES[detect_level(message)]
+                chunk = f"{last_ms}\t{code}\t{_escape(message)}\n".encode()
+                chunks.append(chunk)
+                position += len(chunk)
+                lines += 1
+            with open(self._path("lines"), "ab") as f:
+                f.write(b"".join(chunks))
+            with open(self._path("index"), "ab") as f:
+                index.tofile(f)
+            meta = {"lines": lines, "bytes": position, "last_ms": last_ms, "cursor": cursor, "complete": complete}
+            tmp = self._path("meta.json.part")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(tmp, self._path("meta.json"))
+            self._index.extend(index)
+            self.lines, self.bytes, self.last_ms = lines, position, last_ms
+            self.cursor, self.complete = cursor, complete
+
+    def _seek(self, line: int, since: Optional[int]) -> Tuple[int, int]:
+        """(line, byte offset) to scan from: the last index entry at or
+        before ``line``, or later if every line before it predates ``since``."""
+        entries = len(self._index) // 3
+        lo, hi = 0, entries
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._index[mid * 3] <= line or (since is not None and self._index[mid * 3 + 2] < since):
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == 0:
+            return 0, 0
+        return self._index[(lo - 1) * 3], self._index[(lo - 1) * 3 + 1]
+
+    def read(self, query: LogQuery, max_scan: int) -> LogPage:
+        with self._lock:
+            total = self.lines
+        start = max(query.offset, total - query.tail if query.tail is not None else 0, 0)
+        if start >= total:
+            return LogPage([], start, total)
+        line_no, position = self._seek(start, query.since)
+        codes = {_LEVEL_CODES[level] for level in LEVELS[LEVELS.index(query.level or "DEBUG"):]}
+        lines: List[LogLine] = []
+        scanned = 0
+        end_of_range = False
+        with open(self._path("lines"), "rb") as f:
+            f.seek(position)
+            for raw in f:
+                if line_no >= total:
+                    break
+                if line_no < start:
+                    line_no += 1
+                    continue
+                ms_text, code, text = raw.decode("utf-8", "replace").rstrip("\n").split("\t", 2)
+                ms = int(ms_text)
+                if query.until is not None and ms > query.until:
+                    end_of_range = True
+                    break
+                line_no += 1
+                scanned += 1
+                if code in codes and (query.since is None or ms >= query.since):
+                    message = _unescape(text)
+                    if query.pattern is None or query.pattern.search(message):
+                        lines.append(LogLine(line_no - 1, ms, _CODE_LEVELS[code], message))
+                if len(lines) >= query.limit or scanned >= max_scan:
+                    break
+        return LogPage(lines, line_no, total, end_of_range)
+
+
+class LogSource(ABC):
+    """Where a run's job writes its log. ``lags`` is set for sources that
+    may still deliver lines after the job has ended."""
+
+    lags = False
+
+    @abstractmethod
+    async def fetch(self, run: Dict[str, Any], cursor: Optional[str]) -> Tuple[List[RawLine], Optional[str]]:
+        """Lines after ``cursor`` (None: from the start) and the cursor to
+        continue from. An empty page means the source has nothing newer."""
+        ...
+
+
+class FakeLogSource(LogSource):
+    """Trainer-style output for jobs of the fake training provider,
+    generated from the same timeline as their status and metrics."""
+
+    PAGE_LINES = 5000
+
+    def __init__(self, provider: Optional[FakeTrainingProvider] = None):
+        self.provider = provider or FakeTrainingProvider()
+
+    async def fetch(self, run: Dict[str, Any], cursor: Optional[str]) -> Tuple[List[RawLine], Optional[str]]:
+        position = int(cursor or 0)
+        page = list(itertools.islice(self._lines(run), position, position + self.PAGE_LINES))
+        return page, str(position + len(page))
+
+    def _lines(self, run: Dict[str, Any]) -> Iterator[RawLine]:
+        provider = self.provider
+        status = provider.status(run, datetime.utcnow())
+        submitted = to_millis(datetime.fromisoformat(run["job"]["submitted_at"]))
+        started = submitted + int(provider.startup * 1000)
+        yield submitted, f"INFO Starting training job {run['sagemaker_job_name']}"
+        yield submitted + 1, f"INFO Downloading dataset {run['dataset_id']}"
+        yield submitted + 2, f"INFO Loading model weights for {run['model_id']}"
+        if status.status == "starting":
+            return
+        epochs = run["config"]["epochs"]
+        total_steps = epochs * provider.steps_per_epoch
+        yield started, f"INFO Training started. Epoch 1/{epochs}"
+        for step in range(1, status.metrics.get("current_step", 0) + 1):
+            progress = step / total_steps
+            at = started + int(progress * provider.duration * 1000)
+            metrics = provider.metrics(run, progress)
+            epoch = round(progress * epochs, 2)
+            yield at, (
+                f"INFO {{'loss': {metrics['train_loss']}, 'learning_rate': {run['config']['learning_rate']}, "
+                f"'tokens_per_second': {2400 + 40 * math.sin(step / 5):.1f}, "
+                f"'gpu_memory_gb': {18.5 + (step % 11) / 10:.1f}, 'epoch': {epoch}, 'step': {step}}}"
+            )
+            if step % 137 == 0:
+                yield at, f"WARNING Gradient norm {2.0 + (step % 7) / 3:.2f} exceeds clip threshold 1.0"
+            if step % 50 == 0:
+                yield at, f"INFO {{'eval_loss': {metrics['eval_loss']}, 'epoch': {epoch}, 'step': {step}}}"
+        end = started + int(provider.duration * 1000)
+        if status.status == "completed":
+            yield end, f"INFO Training completed. Saving model to {run['artifacts']['model_artifacts_s3']}"
+        elif status.status == "failed":
+            yield end, f"ERROR {status.failure_reason}"
+        elif status.status == "stopped":
+            yield end, "WARNING Training stopped by user request"
+
+
+class FileLogSource(LogSource):
+    """Reads ``<directory>/<job name>.log``; the cursor is a byte offset.
+    Lines starting with an ISO 8601 timestamp are stamped with it, others
+    with the time they were read."""
+
+    PAGE_BYTES = 1024 * 1024
+    TIMESTAMP = re.compile(r"^(\d{4}-\d\d-\d\d[T ][\d:.]+(?:Z|[+-]\d\d:?\d\d)?)\s+(.*)$")
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or settings.TRAINING_LOG_SOURCE_DIR
+
+    async def fetch(self, run: Dict[str, Any], cursor: Optional[str]) -> Tuple[List[RawLine], Optional[str]]:
+        path = os.path.join(self.directory, f"{run['sagemaker_job_name']}.log")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._read, path, int(cursor or 0))
+
+    def _read(self, path: str, position: int) -> Tuple[List[RawLine], Optional[str]]:
+        try:
+            with open(path, "rb") as f:
+                f.seek(position)
+                data = f.read(self.PAGE_BYTES)
+        except FileNotFoundError:
+            return [], str(position)
+        # Leave a partly written last line for the next read
+        end = data.rfind(b"\n") + 1
+        now = int(time.time() * 1000)
+        lines = []
+        for raw in data[:end].decode("utf-8", "replace").splitlines():
+            match = self.TIMESTAMP.match(raw)
+            ms = now
+            if match:
+                try:
+                    ms = to_millis(datetime.fromisoformat(match.group(1).replace("Z", "+00:00")))
+                    raw = match.group(2)
+                except ValueError:
+                    pass
+            lines.append((ms, raw))
+        return lines, str(position + end)
+
+
+class CloudWatchLogSource(LogSource):
+    """SageMaker training logs in CloudWatch Logs, read with
+    ``get_log_events`` forward tokens. Follows the first instance's
+    stream (``<job name>/algo-1-...``)."""
+
+    LOG_GROUP = "/aws/sagemaker/TrainingJobs"
+    lags = True
+
+    def __init__(self, region: Optional[str] = None):
+        import boto3
+
+        self._client = boto3.client("logs", region_name=region or settings.AWS_REGION)
+
+    async def _call(self, method: str, **kwargs: Any) -> Dict[str, Any]:
+        from botocore.exceptions import BotoCoreError, ClientError
+
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(None, lambda: getattr(self._client, method)(**kwargs))
+        except ClientError as e:
+            code = e.response.get("Error", {}).get("Code", "")
+            if code in ("ThrottlingException", "ServiceUnavailableException"):
+                raise TransientProviderError(str(e), code) from e
+            raise ProviderError(str(e), code) from e
+        except BotoCoreError as e:
+            raise TransientProviderError(str(e)) from e
+
+    async def fetch(self, run: Dict[str, Any], cursor: Optional[str]) -> Tuple[List[RawLine], Optional[str]]:
+        state = json.loads(cursor) if cursor else {}
+        try:
+            if "stream" not in state:
+                streams = await with_backoff(
+                    self._call,
+                    "describe_log_streams",
+                    logGroupName=self.LOG_GROUP,
+                    logStreamNamePrefix=f"{run['sagemaker_job_name']}/",
+                    limit=1,
+                )
+                if not streams["logStreams"]:
+                    return [], cursor
+                state["stream"] = streams["logStreams"][0]["logStreamName"]
+            kwargs: Dict[str, Any] = {
+                "logGroupName": self.LOG_GROUP,
+                "logStreamName": state["stream"],
+                "startFromHead": True,
+            }
+            if state.get("token"):
+                kwargs["nextToken"] = state["token"]
+            page = await with_backoff(self._call, "get_log_events", **kwargs)
+        except ProviderError as e:
+            if e.code == "ResourceNotFoundException":
+                # The job has not logged anything yet
+                return [], cursor
+            raise
+        state["token"] = page["nextForwardToken"]
+        return [(event["timestamp"], event["message"]) for event in page["events"]], json.dumps(state)
+
+
+class TrainingLogs:
+    """Copies run logs from a ``LogSource`` into per-run ``RunLog`` stores
+    and serves filtered reads from them.
+
+    Logs are pulled on demand: a read syncs the run from its source at
+    most once per ``poll_interval``, concurrent readers sharing the sync.
+    Once a run has ended and its source has settled, its log is marked
+    complete and the source is not asked again.
+    """
+
+    def __init__(
+        self,
+        source: LogSource,
+        directory: Optional[str] = None,
+        poll_interval: Optional[float] = None,
+        max_scan: Optional[int] = None,
+    ):
+        self.source = source
+        self.directory = directory or settings.TRAINING_LOG_DIR
+        self.poll_interval = settings.TRAINING_LOG_POLL_SECONDS if poll_interval is None else poll_interval
+        self.max_scan = max_scan or settings.TRAINING_LOG_MAX_SCAN_LINES
+        self._logs: LRUCache[RunLog] = LRUCache(256, on_evict=self._evicted)
+        # Per run, dropped with its log
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._synced_at: Dict[str, float] = {}
+
+    def _evicted(self, run_id: Hashable, log: RunLog) -> None:
+        self._synced_at.pop(run_id, None)
+        lock = self._locks.get(run_id)
+        # A sync holding it keeps it; it goes when the log is next evicted
+        if lock is not None and not lock.locked():
+            del self._locks[run_id]
+
+    async def _open(self, run_id: str) -> RunLog:
+        log = self._logs.get(run_id)
+        if log is None:
+            loop = asyncio.get_running_loop()
+            log = await loop.run_in_executor(None, RunLog.open, os.path.join(self.directory, run_id))
+            self._logs.put(run_id, log)
+        return log
+
+    async def sync(self, run: Dict[str, Any]) -> Tuple[RunLog, bool]:
+        """Pull new lines for ``run``; returns its log and whether the
+        source is caught up."""
+        lock = self._locks.setdefault(run["id"], asyncio.Lock())
+        async with lock:
+            log = await self._open(run["id"])
+            if log.complete or not (run.get("job") or {}).get("submitted_at"):
+                return log, True
+            if time.monotonic() - self._synced_at.get(run["id"], -self.poll_interval) < self.poll_interval:
+                return log, False
+            loop = asyncio.get_running_loop()
+            caught_up = False
+            for _ in range(MAX_PAGES_PER_SYNC):
+                lines, cursor = await self.source.fetch(run, log.cursor)
+                caught_up = not lines
+                complete = caught_up and self._settled(run)
+                if lines or complete or cursor != log.cursor:
+                    await loop.run_in_executor(None, log.append, lines, cursor, complete)
+                if caught_up:
+                    break
+            self._synced_at[run["id"]] = time.monotonic()
+            return log, caught_up
+
+    def _settled(self, run: Dict[str, Any]) -> bool:
+        if run["status"] not in TERMINAL_STATUSES or not run.get("completed_at"):
+            return False
+        if not self.source.lags:
+            return True
+        ended = datetime.fromisoformat(run["completed_at"])
+        return (datetime.utcnow() - ended).total_seconds() >= SETTLE_SECONDS
+
+    async def read(self, run: Dict[str, Any], query: LogQuery) -> LogPage:
+        log, _ = await self.sync(run)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, log.read, query, self.max_scan)
+
+    async def follow(self, run_id: str, query: LogQuery) -> AsyncIterator[Optional[LogPage]]:
+        """Pages of matching lines as the log grows, until the run has
+        ended and every line has been read (or ``until`` is passed).
+        Yields None as a heartbeat while nothing new arrives."""
+        loop = asyncio.get_running_loop()
+        idle_since = time.monotonic()
+        while True:
+            async with session_scope() as db:
+                run = await db.training_runs.get(run_id)
+            if run is None:
+                return
+            log, caught_up = await self.sync(run)
+            page = await loop.run_in_executor(None, log.read, query, self.max_scan)
+            query.offset, query.tail = page.next_offset, None
+            if page.lines:
+                idle_since = time.monotonic()
+                yield page
+            if page.end_of_range:
+                return
+            if page.next_offset < page.total_lines:
+                continue
+            if caught_up and run["status"] in TERMINAL_STATUSES and (
+                log.complete or not self.source.lags or not (run.get("job") or {}).get("submitted_at")
+            ):
+                return
+            if time.monotonic() - idle_since >= settings.STREAM_HEARTBEAT_SECONDS:
+                idle_since = time.monotonic()
+                yield None
+            await asyncio.sleep(self.poll_interval)
+
+
+_logs: Optional[TrainingLogs] = None
+
+
+def get_training_logs() -> TrainingLogs:
+    global _logs
+    if _logs is None:
+        if settings.TRAINING_LOG_SOURCE == "cloudwatch":
+            source: LogSource = CloudWatchLogSource()
+        elif settings.TRAINING_LOG_SOURCE == "file":
+            source = FileLogSource()
+        else:
+            source = FakeLogSource()
+        _logs = TrainingLogs(source)
+    return _logs
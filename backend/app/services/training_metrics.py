@@ -0,0 +1,259 @@
+import asyncio
+import json
+import os
+import re
+import threading
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.cache import LRUCache
+from app.services.training_logs import LogLine, LogQuery, TrainingLogs, get_training_logs
+
+# Step-level metrics kept per run, one float64 column each
+COLUMNS = ("train_loss", "eval_loss", "learning_rate", "epoch", "tokens_per_second", "gpu_memory_gb")
+_ALIASES = {
+    "loss": "train_loss",
+    "lr": "learning_rate",
+    "throughput": "tokens_per_second",
+    "train_tokens_per_second": "tokens_per_second",
+    "gpu_memory": "gpu_memory_gb",
+    "memory_gb": "gpu_memory_gb",
+}
+# Trainer-style metric dicts, e.g. {'loss': 1.23, 'learning_rate': 2e-05, 'epoch': 0.5, 'step': 100}
+_METRIC_LINE = re.compile(r"\{'(?:loss|train_loss|eval_loss)'")
+_FIELD = re.compile(r"'(\w+)':\s*([-+]?(?:\d+(?:\.\d*)?(?:[eE][-+]?\d+)?|nan|inf))")
+
+DOWNSAMPLE_METHODS = ("lttb", "minmax")
+
+
+def parse_metrics(message: str) -> Optional[Dict[str, float]]:
+    """The metric fields of a trainer log line, or None if it has none."""
+    if not _METRIC_LINE.search(message):
+        return None
+    values: Dict[str, float] = {}
+    for name, value in _FIELD.findall(message):
+        values[_ALIASES.get(name, name)] = float(value)
+    return values
+
+
+def lttb(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """Indices of ``points`` samples chosen by Largest-Triangle-Three-Buckets,
+    which keeps the shape of the curve (spikes included) at a fraction of
+    the points."""
+    n = len(x)
+    if points >= n or points < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    selected = np.empty(points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        # Average of the next bucket (the last point for the final one)
+        following = slice(end, edges[bucket + 2]) if bucket + 2 < len(edges) else slice(n - 1, n)
+        ax, ay = x[previous], y[previous]
+        cx, cy = x[following].mean(), y[following].mean()
+        area = np.abs((ax - cx) * (y[start:end] - ay) - (ax - x[start:end]) * (cy - ay))
+        previous = start + int(np.argmax(area))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def minmax(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """Indices of the minimum and maximum of ``points // 2`` equal-width
+    buckets, in order, so no extreme value is lost."""
+    n = len(x)
+    if points >= n or points < 2:
+        return np.arange(n)
+    edges = np.linspace(0, n, points // 2 + 1).astype(np.int64)
+    selected = []
+    for start, end in zip(edges[:-1], edges[1:]):
+        if end > start:
+            segment = y[start:end]
+            selected.extend((start + int(np.argmin(segment)), start + int(np.argmax(segment))))
+    return np.unique(np.asarray(selected, dtype=np.int64))
+
+
+_DOWNSAMPLERS = {"lttb": lttb, "minmax": minmax}
+
+
+class MetricSeries:
+    """Step-level metrics of one run, stored in its own directory.
+
+    ``series`` holds float64 rows of ``(step, *COLUMNS)``, one per
+    metric line of the log and NaN where it did not report a metric;
+    rows are kept in a growable array in memory. ``meta.json`` records
+    the row count and how far into the run's log has been parsed, and is
+    replaced last on every append, so a torn append is truncated on open
+    and parsed again.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.rows = 0
+        self.log_offset = 0
+        self.last_step = 0
+        self._data = np.empty((0, 1 + len(COLUMNS)))
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, directory: str) -> "MetricSeries":
+        series = cls(directory)
+        os.makedirs(directory, exist_ok=True)
+        try:
+            with open(series._path("meta.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            meta = {}
+        if meta.get("columns", list(COLUMNS)) != list(COLUMNS):
+            # Written with other columns; parse the log again
+            meta = {}
+        series.rows = meta.get("rows", 0)
+        series.log_offset = meta.get("log_offset", 0)
+        series.last_step = meta.get("last_step", 0)
+        width = 1 + len(COLUMNS)
+        with open(series._path("series"), "ab") as f:
+            f.truncate(series.rows * width * 8)
+        data = np.fromfile(series._path("series"), dtype=np.float64)
+        series._data = data.reshape(-1, width)
+        return series
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def append(self, lines: Iterable[LogLine], log_offset: int, steps_per_epoch: Optional[float] = None) -> int:
+        """Parse metric lines of the run's log up to ``log_offset``;
+        returns the number of rows added.
+
+        Lines without a ``step`` (the HF Trainer does not log one) are
+        placed by their ``epoch`` and ``steps_per_epoch``, or one step
+        after the previous row when neither is known."""
+        with self._lock:
+            step = self.last_step
+            rows: List[List[float]] = []
+            for line in lines:
+                values = parse_metrics(line.message)
+                if not values:
+                    continue
+                if "step" in values:
+                    step = int(values["step"])
+                elif steps_per_epoch and "epoch" in values:
+                    step = int(round(values["epoch"] * steps_per_epoch))
+                else:
+                    step += 1
+                rows.append([step, *(values.get(column, np.nan) for column in COLUMNS)])
+            block = np.asarray(rows, dtype=np.float64).reshape(-1, 1 + len(COLUMNS))
+            with open(self._path("series"), "ab") as f:
+                block.tofile(f)
+            total = self.rows + len(block)
+            meta = {"columns": list(COLUMNS), "rows": total, "log_offset": log_offset, "last_step": step}
+            tmp = self._path("meta.json.part")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(tmp, self._path("meta.json"))
+            if total > len(self._data):
+                grown = np.empty((max(total, 2 * len(self._data), 1024), 1 + len(COLUMNS)))
+                grown[: self.rows] = self._data[: self.rows]
+                self._data = grown
+            self._data[self.rows : total] = block
+            self.rows, self.log_offset, self.last_step = total, log_offset, step
+            return len(block)
+
+    def query(
+        self,
+        metrics: Sequence[str] = COLUMNS,
+        since_step: Optional[int] = None,
+        points: Optional[int] = None,
+        method: str = "lttb",
+    ) -> Dict[str, Any]:
+        """``metrics`` after ``since_step``, each downsampled to at most
+        ``points`` points if it has more."""
+        with self._lock:
+            data = self._data[: self.rows]
+            last_step = self.last_step
+        if since_step is not None:
+            data = data[data[:, 0] > since_step]
+        steps = data[:, 0]
+        series: Dict[str, Any] = {}
+        for name in metrics:
+            values = data[:, 1 + COLUMNS.index(name)]
+            # NaN where the line did not report it; inf has no JSON form
+            present = np.isfinite(values)
+            x, y = steps[present], values[present]
+            count = len(x)
+            if points is not None and count > points:
+                keep = _DOWNSAMPLERS[method](x, y, points)
+                x, y = x[keep], y[keep]
+            series[name] = {
+                "steps": x.astype(np.int64).tolist(),
+                "values": y.tolist(),
+                "count": count,
+            }
+        return {"series": series, "last_step": last_step}
+
+
+def _steps_per_epoch(run: Dict[str, Any]) -> Optional[float]:
+    """Optimizer steps in one epoch of ``run``, or None before it is known."""
+    total_steps = (run.get("metrics") or {}).get("total_steps")
+    epochs = (run.get("config") or {}).get("epochs")
+    if not total_steps or not epochs:
+        return None
+    return total_steps / epochs
+
+
+class TrainingMetrics:
+    """Per-run metric series, parsed from the runs' logs as they are
+    synced, so every log source that carries trainer output also feeds
+    the loss curves."""
+
+    # Log lines parsed per step of a sync, bounding memory per batch
+    BATCH_LINES = 50_000
+
+    def __init__(self, logs: Optional[TrainingLogs] = None, directory: Optional[str] = None):
+        self.logs = logs or get_training_logs()
+        self.directory = directory or settings.TRAINING_METRICS_DIR
+        self._series: LRUCache[MetricSeries] = LRUCache(256, on_evict=self._evicted)
+        # Per run, dropped with its series
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def _evicted(self, run_id: Hashable, series: MetricSeries) -> None:
+        lock = self._locks.get(run_id)
+        # A sync holding it keeps it; it goes when the series is next evicted
+        if lock is not None and not lock.locked():
+            del self._locks[run_id]
+
+    async def sync(self, run: Dict[str, Any]) -> MetricSeries:
+        lock = self._locks.setdefault(run["id"], asyncio.Lock())
+        async with lock:
+            loop = asyncio.get_running_loop()
+            series = self._series.get(run["id"])
+            if series is None:
+                series = await loop.run_in_executor(
+                    None, MetricSeries.open, os.path.join(self.directory, run["id"])
+                )
+                self._series.put(run["id"], series)
+            log, _ = await self.logs.sync(run)
+            while series.log_offset < log.lines:
+                query = LogQuery(offset=series.log_offset, limit=self.BATCH_LINES, pattern=_METRIC_LINE)
+                page = await loop.run_in_executor(None, log.read, query, self.BATCH_LINES)
+                await loop.run_in_executor(
+                    None, series.append, page.lines, page.next_offset, _steps_per_epoch(run)
+                )
+            return series
+
+    async def query(self, run: Dict[str, Any], **kwargs: Any) -> Dict[str, Any]:
+        series = await self.sync(run)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: series.query(**kwargs))
+
+
+_metrics: Optional[TrainingMetrics] = None
+
+
+def get_training_metrics() -> TrainingMetrics:
+    global _metrics
+    if _metrics is None:
+        _metrics = TrainingMetrics()
+    return _metrics
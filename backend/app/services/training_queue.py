@@ -0,0 +1,411 @@
+import asyncio
+import heapq
+import json
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, AsyncContextManager, AsyncIterator, Dict, Iterable, List, Optional, Sequence
+
+import structlog
+
+from app.core.config import settings
+
+logger = structlog.get_logger()
+
+# How long to stay on the in-process store after Redis fails
+REDIS_RETRY_SECONDS = 30.0
+# Effective priority gained per hour in the queue, so low-priority runs
+# are not starved by a steady stream of higher ones
+AGING_PER_HOUR = 1.0
+# Assumed length of a run with no duration estimate
+DEFAULT_DURATION_SECONDS = 3600
+# How much longer a run past its estimated duration is assumed to take
+OVERDUE_SECONDS = 300
+# Estimated starts that moved less than this are not saved again
+ESTIMATE_TOLERANCE = timedelta(seconds=60)
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def to_seconds(timestamp: str) -> float:
+    """A record timestamp (naive UTC) as seconds since the epoch."""
+    return (datetime.fromisoformat(timestamp) - _EPOCH).total_seconds()
+
+
+def from_seconds(seconds: float) -> str:
+    return (_EPOCH + timedelta(seconds=round(seconds))).isoformat()
+
+
+def queue_entry(run: Dict[str, Any]) -> Dict[str, Any]:
+    """What the queue keeps of a queued run."""
+    return {
+        "run_id": run["id"],
+        "project_id": run["project_id"],
+        "user_id": run.get("user_id"),
+        "instance_type": run["instance_type"],
+        "priority": run["queue"]["priority"],
+        "enqueued_at": run["queue"]["enqueued_at"],
+        "duration_seconds": run.get("estimated_duration_seconds") or DEFAULT_DURATION_SECONDS,
+    }
+
+
+class QueueStore(ABC):
+    """Queued runs, by run id."""
+
+    name: str
+
+    @abstractmethod
+    async def push(self, entry: Dict[str, Any]) -> None:
+        ...
+
+    @abstractmethod
+    async def remove(self, run_ids: Iterable[str]) -> None:
+        ...
+
+    @abstractmethod
+    async def entries(self) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def admission(self) -> AsyncContextManager[bool]:
+        """Held while a process admits runs; yields False if another
+        process is admitting, in which case this one should skip."""
+        ...
+
+    async def aclose(self) -> None:
+        pass
+
+
+class MemoryQueueStore(QueueStore):
+    """In-process queue, for a single API process."""
+
+    name = "memory"
+
+    def __init__(self) -> None:
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = asyncio.Lock()
+
+    async def push(self, entry: Dict[str, Any]) -> None:
+        self._entries[entry["run_id"]] = entry
+
+    async def remove(self, run_ids: Iterable[str]) -> None:
+        for run_id in run_ids:
+            self._entries.pop(run_id, None)
+
+    async def entries(self) -> List[Dict[str, Any]]:
+        return list(self._entries.values())
+
+    @asynccontextmanager
+    async def admission(self) -> AsyncIterator[bool]:
+        async with self._lock:
+            yield True
+
+
+class RedisQueueStore(QueueStore):
+    """Queue shared by every API process through a Redis hash.
+
+    Admission takes a short ``SET NX`` lock, so two processes never admit
+    against the same free capacity. While Redis is unreachable the
+    in-process ``fallback`` store serves instead, and Redis is retried
+    after ``REDIS_RETRY_SECONDS``; runs queued meanwhile are put back by
+    the next resync with the database.
+    """
+
+    name = "redis"
+    KEY = "llm-toolkit:training-queue"
+    LOCK_KEY = "llm-toolkit:training-queue:lock"
+    LOCK_MILLIS = 30_000
+    # Deletes the lock only if this process still holds it
+    _RELEASE = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+    def __init__(self, url: str, fallback: QueueStore):
+        import redis.asyncio as redis
+
+        self._errors = (redis.RedisError, OSError)
+        self._client = redis.from_url(url, socket_connect_timeout=1.0, socket_timeout=1.0)
+        self._fallback = fallback
+        self._retry_at = 0.0
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self._retry_at
+
+    async def push(self, entry: Dict[str, Any]) -> None:
+        if self.available:
+            try:
+                await self._client.hset(self.KEY, entry["run_id"], json.dumps(entry))
+                return
+            except self._errors as e:
+                self._failed(e)
+        await self._fallback.push(entry)
+
+    async def remove(self, run_ids: Iterable[str]) -> None:
+        run_ids = list(run_ids)
+        if not run_ids:
+            return
+        # Removed from both, since an entry may have been queued during
+        # an outage
+        await self._fallback.remove(run_ids)
+        if self.available:
+            try:
+                await self._client.hdel(self.KEY, *run_ids)
+            except self._errors as e:
+                self._failed(e)
+
+    async def entries(self) -> List[Dict[str, Any]]:
+        if self.available:
+            try:
+                raw = await self._client.hvals(self.KEY)
+                return [json.loads(value) for value in raw]
+            except self._errors as e:
+                self._failed(e)
+        return await self._fallback.entries()
+
+    @asynccontextmanager
+    async def admission(self) -> AsyncIterator[bool]:
+        if not self.available:
+            async with self._fallback.admission() as acquired:
+                yield acquired
+            return
+        token = uuid.uuid4().hex
+        try:
+            acquired = bool(await self._client.set(self.LOCK_KEY, token, nx=True, px=self.LOCK_MILLIS))
+        except self._errors as e:
+            self._failed(e)
+            async with self._fallback.admission() as acquired:
+                yield acquired
+            return
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                try:
+                    await self._client.eval(self._RELEASE, 1, self.LOCK_KEY, token)
+                except self._errors as e:
+                    # Expires on its own
+                    self._failed(e)
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    def _failed(self, error: Exception) -> None:
+        logger.warning("Training queue falling back to memory", error=str(error))
+        self._retry_at = time.monotonic() + REDIS_RETRY_SECONDS
+
+
+@dataclass
+class Occupant:
+    """A run holding an instance: admitted and not yet finished."""
+
+    project_id: str
+    user_id: Optional[str]
+    instance_type: str
+    ends_at: float  # expected, in seconds since the epoch (to_seconds)
+
+
+@dataclass
+class Placement:
+    position: int  # 1 for the next run to start
+    starts_at: Optional[float]  # expected start, None if it never can
+    waiting_for: Optional[str]  # "capacity" or "project_quota"; None when admitted
+
+    @property
+    def admitted(self) -> bool:
+        return self.waiting_for is None
+
+
+def instance_capacity(instance_type: str) -> int:
+    return settings.TRAINING_INSTANCE_CAPACITY.get(instance_type, settings.TRAINING_DEFAULT_INSTANCE_CAPACITY)
+
+
+def _slots(ends: List[float], capacity: int, now: float) -> List[float]:
+    """When each of ``capacity`` slots comes free, as a heap, given the
+    expected ends of the runs in them. With more runs than slots (the
+    capacity was lowered), a slot frees only once the surplus has ended.
+    A run is never taken to have ended already: only its status frees
+    its slot."""
+    if capacity <= 0:
+        return []
+    ends = sorted(end if end > now else now + OVERDUE_SECONDS for end in ends)
+    slots = ([now] * max(capacity - len(ends), 0) + ends)[-capacity:]
+    heapq.heapify(slots)
+    return slots
+
+
+def plan_queue(
+    entries: Sequence[Dict[str, Any]],
+    occupants: Sequence[Occupant],
+    now: float,
+    project_concurrency: Optional[int] = None,
+) -> Dict[str, Placement]:
+    """Order the queue and project when each entry starts.
+
+    Runs go by effective priority (``priority`` plus ``AGING_PER_HOUR``
+    per hour waited); among equals, the user with the fewest runs
+    admitted or placed ahead goes next, so one user's burst of runs
+    interleaves with everyone else's (fair share); then first come,
+    first served. Each run in that order is expected to start once both
+    a slot of its instance type (``instance_capacity``) and one of its
+    project's ``project_concurrency`` slots are free, and to hold them
+    for its estimated duration. Runs that can start now are admitted. A
+    waiting run reserves only what it waits for, so later runs cannot
+    overtake it there; the other resource stays free for runs behind it,
+    which keeps instances busy while a project is at its quota (and
+    makes the later estimates somewhat optimistic).
+    """
+    quota = settings.TRAINING_PROJECT_CONCURRENCY if project_concurrency is None else project_concurrency
+    instance_ends: Dict[str, List[float]] = defaultdict(list)
+    project_ends: Dict[str, List[float]] = defaultdict(list)
+    load: Dict[Optional[str], int] = defaultdict(int)
+    for occupant in occupants:
+        instance_ends[occupant.instance_type].append(occupant.ends_at)
+        project_ends[occupant.project_id].append(occupant.ends_at)
+        load[occupant.user_id] += 1
+    instance_slots = {name: _slots(ends, instance_capacity(name), now) for name, ends in instance_ends.items()}
+    project_slots = {name: _slots(ends, quota, now) for name, ends in project_ends.items()}
+
+    def effective(entry: Dict[str, Any]) -> float:
+        waited = now - to_seconds(entry["enqueued_at"])
+        return entry["priority"] + AGING_PER_HOUR * max(waited, 0.0) / 3600
+
+    # Each user's runs in order, and a heap of the users by their next run
+    by_user: Dict[Optional[str], List[Any]] = defaultdict(list)
+    for entry in entries:
+        by_user[entry["user_id"]].append((-effective(entry), entry["enqueued_at"], entry["run_id"], entry))
+    for queue in by_user.values():
+        # Next run last, to pop
+        queue.sort(key=lambda item: item[:3], reverse=True)
+    users = [(queue[-1][0], load[user], queue[-1][1], str(user), user) for user, queue in by_user.items()]
+    heapq.heapify(users)
+
+    placements: Dict[str, Placement] = {}
+    while users:
+        *_, user = heapq.heappop(users)
+        entry = by_user[user].pop()[3]
+        instance = instance_slots.setdefault(
+            entry["instance_type"], _slots([], instance_capacity(entry["instance_type"]), now)
+        )
+        project = project_slots.setdefault(entry["project_id"], _slots([], quota, now))
+        position = len(placements) + 1
+        if not instance or not project:
+            placements[entry["run_id"]] = Placement(position, None, "capacity" if not instance else "project_quota")
+        else:
+            starts_at = max(instance[0], project[0])
+            ends_at = starts_at + entry["duration_seconds"]
+            waiting_for = None
+            if starts_at <= now:
+                heapq.heapreplace(instance, ends_at)
+                heapq.heapreplace(project, ends_at)
+            elif instance[0] >= project[0]:
+                waiting_for = "capacity"
+                heapq.heapreplace(instance, ends_at)
+            else:
+                waiting_for = "project_quota"
+                heapq.heapreplace(project, ends_at)
+            placements[entry["run_id"]] = Placement(position, starts_at, waiting_for)
+        load[user] += 1
+        if by_user[user]:
+            head = by_user[user][-1]
+            heapq.heappush(users, (head[0], load[user], head[1], str(user), user))
+    return placements
+
+
+def occupant(run: Dict[str, Any]) -> Occupant:
+    started = (run.get("job") or {}).get("submitted_at") or run["started_at"]
+    duration = run.get("estimated_duration_seconds") or DEFAULT_DURATION_SECONDS
+    ends_at = to_seconds(started) + duration
+    return Occupant(run["project_id"], run.get("user_id"), run["instance_type"], ends_at)
+
+
+class TrainingQueue:
+    """Runs waiting for admission, in a ``QueueStore``.
+
+    Runs are created ``queued`` and pushed here; the training
+    orchestrator calls ``admit`` every pass, moving runs that can start
+    to ``pending`` (to be submitted) and recording every other run's
+    place in line on the run record. The database stays the record of
+    which runs are queued: ``resync`` puts back entries lost with an
+    in-process store and drops ones whose runs left the queue some other
+    way.
+    """
+
+    def __init__(self, store: Optional[QueueStore] = None):
+        self.store = store or MemoryQueueStore()
+
+    async def push(self, run: Dict[str, Any]) -> None:
+        await self.store.push(queue_entry(run))
+
+    async def remove(self, run_ids: Iterable[str]) -> None:
+        await self.store.remove(run_ids)
+
+    async def resync(self, queued: Sequence[Dict[str, Any]], started: datetime) -> None:
+        """Match the store to ``queued``, the runs the database had queued
+        as of ``started``."""
+        known = {entry["run_id"]: entry for entry in await self.store.entries()}
+        for run in queued:
+            if run["id"] not in known:
+                await self.store.push(queue_entry(run))
+        # Entries pushed after the database was read are kept
+        cutoff = started.isoformat()
+        queued_ids = {run["id"] for run in queued}
+        await self.store.remove(
+            run_id for run_id, entry in known.items() if run_id not in queued_ids and entry["enqueued_at"] < cutoff
+        )
+
+    def admission(self) -> AsyncContextManager[bool]:
+        return self.store.admission()
+
+    async def plan(self, occupants: Sequence[Occupant], now: float) -> Dict[str, Placement]:
+        return plan_queue(await self.store.entries(), occupants, now)
+
+    async def aclose(self) -> None:
+        await self.store.aclose()
+
+
+def placement_record(queue: Dict[str, Any], placement: Placement, now: float) -> Dict[str, Any]:
+    """A run's ``queue`` field updated for ``placement``."""
+    return {
+        **queue,
+        "position": None if placement.admitted else placement.position,
+        "waiting_for": placement.waiting_for,
+        "estimated_start_at": from_seconds(placement.starts_at) if placement.starts_at is not None else None,
+        "admitted_at": from_seconds(now) if placement.admitted else None,
+    }
+
+
+def placement_changed(
+    current: Dict[str, Any], new: Dict[str, Any], tolerance: timedelta = ESTIMATE_TOLERANCE
+) -> bool:
+    """Whether a run's queue record moved enough to be worth saving: a
+    new position or reason, or an estimated start off by more than
+    ``tolerance``."""
+    if (current.get("position"), current.get("waiting_for")) != (new["position"], new["waiting_for"]):
+        return True
+    before, after = current.get("estimated_start_at"), new["estimated_start_at"]
+    if before is None or after is None:
+        return before != after
+    return abs(datetime.fromisoformat(before) - datetime.fromisoformat(after)) > tolerance
+
+
+_queue: Optional[TrainingQueue] = None
+
+
+def get_training_queue() -> TrainingQueue:
+    global _queue
+    if _queue is None:
+        store: QueueStore = MemoryQueueStore()
+        if settings.TRAINING_QUEUE_BACKEND == "redis":
+            store = RedisQueueStore(settings.REDIS_URL, fallback=store)
+        _queue = TrainingQueue(store)
+    return _queue
+
+
+async def shutdown_training_queue() -> None:
+    global _queue
+    if _queue is not None:
+        await _queue.aclose()
+        _queue = None
@@ -0,0 +1,272 @@
+from array import array
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import tiktoken
+
+from app.core.config import settings
+from app.services.cache import LRUCache
+from app.services.ingestion import MAX_REPORTED_ERRORS, Record, parse_record, row_text
+from app.services.jobs import DatasetJob
+from app.services.storage import StorageBackend
+
+DEFAULT_CONTEXT_LENGTH = 2048
+CHAT_ROLES = {"system", "user", "assistant"}
+SUPPORTED_SCHEMAS = (("instruction", "output"), ("prompt", "completion"), ("text",))
+
+
+def check_schema(row: Dict[str, Any]) -> Optional[str]:
+    if "messages" in row:
+        messages = row["messages"]
+        if not isinstance(messages, list) or not messages:
+            return "'messages' must be a non-empty list"
+        for i, message in enumerate(messages):
+            if not isinstance(message, dict) or not isinstance(message.get("content"), str):
+                return f"messages[{i}] must be an object with a string 'content'"
+            if message.get("role") not in CHAT_ROLES:
+                return f"messages[{i}] has invalid role {message.get('role')!r}"
+        return None
+    for fields in SUPPORTED_SCHEMAS:
+        if all(name in row for name in fields):
+            for name in fields:
+                if not isinstance(row[name], str) or not row[name].strip():
+                    return f"'{name}' must be a non-empty string"
+            return None
+    return "Expected 'messages', 'instruction'/'output', 'prompt'/'completion' or 'text' fields"
+
+
+@dataclass
+class BatchResult:
+    lengths: array
+    histogram: Counter
+    rows_over_context: int
+    errors: List[Tuple[int, str]]
+    error_count: int
+    columns: Dict[str, None]
+
+
+# Per-process encoder cache; tiktoken encoders are expensive to build
+_encoders: Dict[str, Any] = {}
+
+
+def _get_encoder(name: str):
+    encoder = _encoders.get(name)
+    if encoder is None:
+        encoder = _encoders[name] = tiktoken.get_encoding(name)
+    return encoder
+
+
+def validate_batch(start: int, records: List[Record], encoding_name: str, context_length: int) -> BatchResult:
+    """Parse, schema-check and tokenize one batch. Runs in a worker process."""
+    encoder = _get_encoder(encoding_name)
+    batch = BatchResult(array("I"), Counter(), 0, [], 0, {})
+    for offset, record in enumerate(records):
+        _, row, error = parse_record(record)
+        if error is None:
+            error = check_schema(row)
+        if error is not None:
+            # Keep lengths aligned with row indices; invalid rows count as empty
+            batch.lengths.append(0)
+            batch.error_count += 1
+            if len(batch.errors) < MAX_REPORTED_ERRORS:
+                batch.errors.append((start + offset, error))
+            continue
+        for column in row:
+            batch.columns.setdefault(column, None)
+        n_tokens = len(encoder.encode_ordinary(row_text(row)))
+        batch.lengths.append(n_tokens)
+        # Power-of-two buckets: bucket k holds lengths in [2^(k-1), 2^k)
+        batch.histogram[n_tokens.bit_length()] += 1
+        if n_tokens > context_length:
+            batch.rows_over_context += 1
+    return batch
+
+
+@dataclass
+class ValidationResult:
+    context_length: int
+    encoding: str
+    token_lengths: array = field(default_factory=lambda: array("I"))
+    total_tokens: int = 0
+    max_row_tokens: int = 0
+    histogram: Counter = field(default_factory=Counter)
+    rows_over_context: int = 0
+    errors: List[Tuple[int, str]] = field(default_factory=list)
+    error_count: int = 0
+    columns: Dict[str, None] = field(default_factory=dict)
+
+    @property
+    def total_rows(self) -> int:
+        return len(self.token_lengths)
+
+    @property
+    def is_valid(self) -> bool:
+        return self.error_count == 0 and self.total_rows > 0
+
+    def merge(self, batch: BatchResult) -> None:
+        self.token_lengths.extend(batch.lengths)
+        if batch.lengths:
+            self.total_tokens += sum(batch.lengths)
+            self.max_row_tokens = max(self.max_row_tokens, max(batch.lengths))
+        self.histogram.update(batch.histogram)
+        self.rows_over_context += batch.rows_over_context
+        self.error_count += batch.error_count
+        self.errors.extend(batch.errors[:MAX_REPORTED_ERRORS - len(self.errors)])
+        for column in batch.columns:
+            self.columns.setdefault(column, None)
+
+    def formatted_errors(self) -> List[str]:
+        return [f"Row {row + 1}: {message}" for row, message in self.errors]
+
+    def to_dict(self) -> Dict[str, Any]:
+        valid_rows = self.total_rows - self.error_count
+        warnings = []
+        if self.rows_over_context:
+            warnings.append(
+                f"{self.rows_over_context} rows exceed {self.context_length} tokens and will be truncated"
+            )
+        if self.error_count > len(self.errors):
+            warnings.append(f"Only the first {len(self.errors)} of {self.error_count} errors are listed")
+        return {
+            "is_valid": self.is_valid,
+            "total_rows": self.total_rows,
+            "valid_rows": valid_rows,
+            "total_tokens": self.total_tokens,
+            "estimated_tokens": self.total_tokens,
+            "max_row_tokens": self.max_row_tokens,
+            "mean_row_tokens": self.total_tokens / valid_rows if valid_rows else 0,
+            "context_length": self.context_length,
+            "rows_over_context": self.rows_over_context,
+            "encoding": self.encoding,
+            "histogram": [
+                {
+                    "min_tokens": 1 << (bucket - 1) if bucket else 0,
+                    "max_tokens": (1 << bucket) - 1,
+                    "count": self.histogram[bucket],
+                }
+                for bucket in sorted(self.histogram)
+            ],
+            "errors": [{"row": row, "message": message} for row, message in self.errors],
+            "error_count": self.error_count,
+            "warnings": warnings,
+            "detected_columns": list(self.columns),
+        }
+
+
+class ValidationJob(DatasetJob):
+    """Tokenizes a stored dataset blob across the process pool.
+
+    Datasets sharing a blob share the job.
+    """
+
+    description = "Dataset validation"
+
+    def __init__(
+        self,
+        storage: StorageBackend,
+        storage_key: str,
+        file_format: str,
+        total_rows: int,
+        context_length: int,
+        encoding: Optional[str] = None,
+    ):
+        super().__init__(storage, storage_key, file_format, total_rows)
+        self.context_length = context_length
+        self.encoding = encoding or settings.TOKENIZER_ENCODING
+        self.cached = False
+
+    def complete_from_cache(self, result: ValidationResult) -> None:
+        self.result = result
+        self.cached = True
+        self.rows_processed = result.total_rows
+        self.status = "completed"
+        self.completed_at = self.started_at
+
+    def execute(self) -> ValidationResult:
+        result = ValidationResult(context_length=self.context_length, encoding=self.encoding)
+        for batch in self.map_batches(validate_batch, self.encoding, self.context_length):
+            result.merge(batch)
+            self.rows_processed += len(batch.lengths)
+        return result
+
+    def result_dict(self) -> Dict[str, Any]:
+        return self.result.to_dict()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            **super().to_dict(),
+            "cached": self.cached,
+            "context_length": self.context_length,
+        }
+
+
+def _result_weight(result: ValidationResult) -> int:
+    return result.token_lengths.itemsize * len(result.token_lengths) + 1024
+
+
+class ValidationManager:
+    """Tracks the latest validation job per dataset.
+
+    Results are memoized by (content hash, format, tokenizer, context
+    length), and a job already running for the same key is joined instead
+    of being started twice.
+    """
+
+    def __init__(self, cache_bytes: int):
+        self.cache: LRUCache[ValidationResult] = LRUCache(cache_bytes, weigh=_result_weight)
+        self._jobs: Dict[str, ValidationJob] = {}
+        self._running: Dict[Tuple, ValidationJob] = {}
+
+    @staticmethod
+    def cache_key(dataset: Dict[str, Any], context_length: int) -> Tuple:
+        return (dataset["content_hash"], dataset["format"], settings.TOKENIZER_ENCODING, context_length)
+
+    def get(self, dataset_id: str) -> Optional[ValidationJob]:
+        return self._jobs.get(dataset_id)
+
+    async def start(
+        self,
+        dataset: Dict[str, Any],
+        storage: StorageBackend,
+        context_length: int,
+        on_complete: Optional[Callable[[ValidationResult], Any]] = None,
+    ) -> ValidationJob:
+        key = self.cache_key(dataset, context_length)
+        job = self._running.get(key)
+        if job is None or not job.is_active:
+            job = ValidationJob(
+                storage, dataset["storage_key"], dataset["format"], dataset["row_count"], context_length
+            )
+            cached = self.cache.get(key)
+            if cached is not None:
+                job.complete_from_cache(cached)
+            else:
+                job.add_callback(lambda result: self._store(key, job, result))
+                self._running[key] = job
+                job.start()
+        if on_complete:
+            dataset_id = dataset["id"]
+            # Skipped once the dataset is discarded or moved on to another job
+            job.add_callback(lambda result: on_complete(result) if self._jobs.get(dataset_id) is job else None)
+        self._jobs[dataset["id"]] = job
+        if job.cached:
+            await job.notify()
+        return job
+
+    def _store(self, key: Tuple, job: ValidationJob, result: ValidationResult) -> None:
+        self.cache.put(key, result)
+        if self._running.get(key) is job:
+            del self._running[key]
+
+    def discard(self, dataset_id: str) -> None:
+        """Detach a dataset from its job, cancelling the job unless another
+        dataset shares it."""
+        job = self._jobs.pop(dataset_id, None)
+        if job and job.is_active and all(other is not job for other in self._jobs.values()):
+            job.cancel()
+            # So the next validation of this content starts afresh
+            self._running = {key: other for key, other in self._running.items() if other is not job}
+
+
+validation_manager = ValidationManager(settings.VALIDATION_CACHE_BYTES)
@@ -0,0 +1,70 @@
+"""Offline replay of a traffic trace against an autoscaling policy.
+
+Runs ``app.services.autoscaling_sim.simulate`` and prints a JSON report of
+latency, queueing and cost to compare policies::
+
+    python -m benchmarks.autoscaling --trace trace.jsonl \\
+        --metric concurrency --target 8 --min 0 --max 8 --scale-to-zero-after 600
+
+A trace is JSONL of ``{"at": seconds, "prompt_tokens", "completion_tokens"}``.
+Without ``--trace`` a synthetic day-shaped trace is generated.
+"""
+import argparse
+import json
+from typing import List, Optional
+
+from app.services.autoscaling import METRICS, ScalingConfig
+from app.services.autoscaling_sim import load_trace, simulate, synthetic_trace
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Replay a traffic trace against an autoscaling policy.")
+    parser.add_argument("--trace", help="JSONL of {at, prompt_tokens, completion_tokens}")
+    parser.add_argument("--duration", type=float, default=4 * 3600, help="synthetic trace length (s)")
+    parser.add_argument("--base-rps", type=float, default=1.0)
+    parser.add_argument("--peak-rps", type=float, default=40.0)
+    parser.add_argument("--period", type=float, default=2 * 3600)
+    parser.add_argument("--policy", choices=("target-tracking", "step"), default="target-tracking")
+    parser.add_argument("--metric", choices=METRICS, default="concurrency")
+    parser.add_argument("--target", type=float, default=8.0)
+    parser.add_argument("--steps", default="[]", help='JSON list of {"change", "above"|"below"}')
+    parser.add_argument("--min", type=int, default=1, dest="min_instances")
+    parser.add_argument("--max", type=int, default=4, dest="max_instances")
+    parser.add_argument("--scale-out-cooldown", type=float, default=60.0)
+    parser.add_argument("--scale-in-cooldown", type=float, default=300.0)
+    parser.add_argument("--scale-to-zero-after", type=float)
+    parser.add_argument("--initial", type=int, default=1)
+    parser.add_argument("--provisioning-delay", type=float, default=120.0)
+    parser.add_argument("--cost-per-hour", type=float, default=1.41)
+    parser.add_argument("--timeline", action="store_true", help="include every scaling event")
+    args = parser.parse_args(argv)
+
+    if args.trace:
+        trace = load_trace(args.trace)
+    else:
+        trace = synthetic_trace(args.duration, args.base_rps, args.peak_rps, args.period)
+    config = ScalingConfig.from_dict({
+        "policy": args.policy,
+        "metric": args.metric,
+        "target": args.target,
+        "steps": json.loads(args.steps),
+        "min_instances": args.min_instances,
+        "max_instances": args.max_instances,
+        "scale_out_cooldown_seconds": args.scale_out_cooldown,
+        "scale_in_cooldown_seconds": args.scale_in_cooldown,
+        "scale_to_zero_after_seconds": args.scale_to_zero_after,
+    })
+    result = simulate(
+        trace,
+        config,
+        initial_instances=args.initial,
+        provisioning_delay=args.provisioning_delay,
+        cost_per_instance_hour=args.cost_per_hour,
+    )
+    if not args.timeline:
+        result.pop("timeline")
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
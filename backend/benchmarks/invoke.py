@@ -0,0 +1,344 @@
+"""Throughput and latency benchmark for endpoint invocation.
+
+Drives ``POST /api/projects/{project_id}/endpoints/{endpoint_id}/invoke``
+(or ``/invoke/stream`` with ``--stream``) against the fake model server,
+either in-process through httpx's ASGI transport or over a local uvicorn
+it starts, and prints a JSON report to compare across commits::
+
+    python -m benchmarks.invoke --concurrency 32 --requests 2000
+    python -m benchmarks.invoke --rate 200 --duration 30 --stream --prompt-tokens lognormal:6:0.7
+    python -m benchmarks.invoke --server uvicorn --base-latency-ms 40 --jitter 0.3 --out bench.json
+
+``--concurrency`` runs a closed loop: that many clients each send their
+next request when the last one returns. ``--rate`` runs an open loop of
+Poisson arrivals, and latency is measured from the scheduled arrival so a
+backed-up server is not flattered by late sends.
+
+httpx's ASGI transport hands back a response only once its body is
+complete, so time to first token is only meaningful with ``--stream
+--server uvicorn``; otherwise it equals the full latency. The fake
+server's latencies default to the INFERENCE_FAKE_* settings.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+import structlog
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_WORDS = (
+    "model data train loss token batch layer weight prompt answer question context "
+    "summary detail result value error metric report source system user review plan"
+).split()
+
+
+@dataclass
+class Result:
+    status: int
+    latency: float
+    ttft: Optional[float] = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cache: Optional[str] = None
+
+
+def prompt_lengths(spec: str) -> Callable[[random.Random], int]:
+    """Sampler for ``fixed:N``, ``uniform:LOW:HIGH`` or ``lognormal:MU:SIGMA``
+    prompt lengths, in words (about one token each)."""
+    kind, *params = spec.split(":")
+    values = [float(p) for p in params]
+    if kind == "fixed" and len(values) == 1:
+        return lambda rng: int(values[0])
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.randint(int(values[0]), int(values[1]))
+    if kind == "lognormal" and len(values) == 2:
+        return lambda rng: max(1, int(rng.lognormvariate(values[0], values[1])))
+    raise argparse.ArgumentTypeError(f"Unknown prompt length distribution: {spec}")
+
+
+def make_messages(rng: random.Random, words: int, system_prompt: str) -> List[Dict[str, str]]:
+    messages = [{"role": "system", "content": system_prompt}] if system_prompt else []
+    content = " ".join(rng.choice(_WORDS) for _ in range(words))
+    return messages + [{"role": "user", "content": content}]
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0}
+    ordered = sorted(values)
+
+    def rank(q: float) -> float:
+        return ordered[min(math.ceil(len(ordered) * q) - 1, len(ordered) - 1)]
+
+    return {
+        "mean": round(sum(ordered) / len(ordered) * 1000, 2),
+        "p50": round(rank(0.50) * 1000, 2),
+        "p95": round(rank(0.95) * 1000, 2),
+        "p99": round(rank(0.99) * 1000, 2),
+    }
+
+
+async def send(client: httpx.AsyncClient, url: str, payload: Dict[str, Any], stream: bool, started: float) -> Result:
+    """One invocation; ``started`` is when the request was due."""
+    if not stream:
+        response = await client.post(url, json=payload)
+        latency = time.perf_counter() - started
+        if response.status_code != 200:
+            return Result(response.status_code, latency)
+        data = response.json()["data"]
+        return Result(
+            200,
+            latency,
+            ttft=latency,
+            prompt_tokens=data["usage"]["prompt_tokens"],
+            completion_tokens=data["usage"]["completion_tokens"],
+            cache=data["cache"],
+        )
+    result = Result(0, 0.0)
+    async with client.stream("POST", url + "/stream", params={"format": "jsonl"}, json=payload) as response:
+        result.status = response.status_code
+        result.cache = response.headers.get("X-Cache")
+        async for line in response.aiter_lines():
+            if not line:
+                continue
+            event = json.loads(line)
+            if event["event"] == "token" and result.ttft is None:
+                result.ttft = time.perf_counter() - started
+            elif event["event"] == "usage":
+                result.prompt_tokens = event["data"]["prompt_tokens"]
+                result.completion_tokens = event["data"]["completion_tokens"]
+            elif event["event"] == "error":
+                result.status = 502
+    result.latency = time.perf_counter() - started
+    return result
+
+
+async def closed_loop(total: int, concurrency: int, request: Callable[[float], Awaitable[Result]]) -> List[Result]:
+    results: List[Result] = []
+    remaining = iter(range(total))
+
+    async def client() -> None:
+        for _ in remaining:
+            results.append(await request(time.perf_counter()))
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return results
+
+
+async def open_loop(
+    total: int,
+    rate: float,
+    rng: random.Random,
+    request: Callable[[float], Awaitable[Result]],
+) -> List[Result]:
+    tasks = []
+    due = time.perf_counter()
+    for _ in range(total):
+        due += rng.expovariate(rate)
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(request(due)))
+    return list(await asyncio.gather(*tasks))
+
+
+@asynccontextmanager
+async def asgi_client() -> AsyncIterator[httpx.AsyncClient]:
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            yield client
+
+
+@asynccontextmanager
+async def uvicorn_client() -> AsyncIterator[httpx.AsyncClient]:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=os.environ.copy(),
+        stdout=subprocess.DEVNULL,
+    )
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=None, limits=limits) as client:
+            for _ in range(300):
+                try:
+                    if (await client.get("/api/health")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if server.poll() is not None:
+                    raise RuntimeError("uvicorn exited during startup")
+                await asyncio.sleep(0.1)
+            else:
+                raise RuntimeError("uvicorn did not start within 30s")
+            yield client
+    finally:
+        server.terminate()
+        server.wait()
+
+
+async def deploy(client: httpx.AsyncClient, instance_count: int) -> str:
+    """Register a user and create an in-service endpoint; returns its
+    invoke URL. Nothing marks fake endpoints in service, so the record is
+    updated directly in the database the server uses."""
+    from app.db.session import session_scope
+
+    response = await client.post(
+        "/api/auth/register",
+        json={"email": f"bench-{uuid.uuid4().hex[:8]}@example.com", "password": "benchmark", "name": "Benchmark"},
+    )
+    response.raise_for_status()
+    client.headers["Authorization"] = f"Bearer {response.json()['data']['token']}"
+    response = await client.post(
+        "/api/projects/benchmark/endpoints",
+        json={"training_run_id": "benchmark", "name": "benchmark", "instance_count": instance_count},
+    )
+    response.raise_for_status()
+    endpoint_id = response.json()["data"]["id"]
+    async with session_scope() as db:
+        endpoint = await db.endpoints.get(endpoint_id)
+        endpoint["status"] = "inservice"
+        await db.endpoints.save(endpoint)
+        await db.commit()
+    return f"/api/projects/benchmark/endpoints/{endpoint_id}/invoke"
+
+
+def current_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(args: argparse.Namespace, results: List[Result], elapsed: float, server: Dict[str, Any]) -> Dict[str, Any]:
+    ok = [result for result in results if result.status == 200]
+    completion_tokens = sum(result.completion_tokens for result in ok)
+    return {
+        "commit": current_commit(),
+        "config": {key: value for key, value in vars(args).items() if key != "out"},
+        "requests": len(results),
+        "succeeded": len(ok),
+        "errors": dict(Counter(str(result.status) for result in results if result.status != 200)),
+        "duration_seconds": round(elapsed, 3),
+        "rps": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        "ttft_ms": percentiles([result.ttft for result in ok if result.ttft is not None]),
+        "latency_ms": percentiles([result.latency for result in ok]),
+        "tokens_per_second": round(completion_tokens / elapsed, 1) if elapsed else 0.0,
+        "prompt_tokens_mean": round(sum(r.prompt_tokens for r in ok) / len(ok), 1) if ok else 0.0,
+        "completion_tokens_mean": round(completion_tokens / len(ok), 1) if ok else 0.0,
+        "cache": dict(Counter(result.cache for result in ok if result.cache)),
+        "server": server,
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    lengths = prompt_lengths(args.prompt_tokens)
+    system_prompt = " ".join(rng.choice(_WORDS) for _ in range(args.system_prompt_tokens))
+    connect = uvicorn_client if args.server == "uvicorn" else asgi_client
+    async with connect() as client:
+        url = await deploy(client, args.instances)
+
+        async def request(started: float) -> Result:
+            payload = {
+                "messages": make_messages(rng, lengths(rng), system_prompt),
+                "max_tokens": args.max_tokens,
+                "temperature": args.temperature,
+                "cache": args.cache,
+            }
+            try:
+                return await send(client, url, payload, args.stream, started)
+            except httpx.HTTPError:
+                return Result(0, time.perf_counter() - started)
+
+        if args.warmup:
+            await closed_loop(args.warmup, min(args.warmup, args.concurrency), request)
+        total = args.requests or (int(args.rate * args.duration) if args.rate else 1000)
+        started = time.perf_counter()
+        if args.rate:
+            results = await open_loop(total, args.rate, rng, request)
+        else:
+            results = await closed_loop(total, args.concurrency, request)
+        elapsed = time.perf_counter() - started
+        metrics = (await client.get(url.rsplit("/", 1)[0] + "/metrics")).json()["data"]
+    return report(args, results, elapsed, metrics)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark endpoint invocation against the fake model server.")
+    parser.add_argument("--server", choices=("asgi", "uvicorn"), default="asgi")
+    parser.add_argument("--concurrency", type=int, default=16, help="closed-loop clients")
+    parser.add_argument("--rate", type=float, help="open-loop arrivals per second (overrides --concurrency)")
+    parser.add_argument("--requests", type=int, help="requests to send (default 1000, or rate x duration)")
+    parser.add_argument("--duration", type=float, default=10.0, help="open-loop seconds when --requests is unset")
+    parser.add_argument("--warmup", type=int, default=0, help="unmeasured requests sent first")
+    parser.add_argument("--stream", action="store_true", help="use /invoke/stream and time the first token")
+    parser.add_argument("--prompt-tokens", default="lognormal:5:0.8", help="fixed:N, uniform:A:B or lognormal:MU:SIGMA")
+    parser.add_argument("--system-prompt-tokens", type=int, default=0, help="shared system prompt length")
+    parser.add_argument("--max-tokens", type=int, default=256)
+    parser.add_argument("--temperature", type=float, default=0.7)
+    parser.add_argument("--cache", action=argparse.BooleanOptionalAction, default=False,
+                        help="let the response cache serve repeats (off by default)")
+    parser.add_argument("--instances", type=int, default=1)
+    parser.add_argument("--base-latency-ms", type=float, help="fake server latency per batch")
+    parser.add_argument("--token-latency-ms", type=float, help="fake server latency per generated token")
+    parser.add_argument("--prefill-latency-ms", type=float, help="fake server latency per uncached prompt token")
+    parser.add_argument("--jitter", type=float, help="fake server latency jitter, 0-1")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the report here as well as to stdout")
+    args = parser.parse_args(argv)
+    try:
+        prompt_lengths(args.prompt_tokens)
+    except (argparse.ArgumentTypeError, ValueError) as e:
+        parser.error(str(e))
+
+    # The app reads its settings on import, so configure it first. Both
+    # the harness and a uvicorn server use a scratch SQLite database.
+    overrides = {
+        "INFERENCE_BACKEND": "fake",
+        "INFERENCE_FAKE_BASE_LATENCY_MS": args.base_latency_ms,
+        "INFERENCE_FAKE_TOKEN_LATENCY_MS": args.token_latency_ms,
+        "INFERENCE_FAKE_PREFILL_LATENCY_MS": args.prefill_latency_ms,
+        "INFERENCE_FAKE_LATENCY_JITTER": args.jitter,
+        "DATABASE_URL": (
+            "memory://" if args.server == "asgi"
+            else f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='llm-bench-'), 'bench.db')}"
+        ),
+    }
+    os.environ.update({key: str(value) for key, value in overrides.items() if value is not None})
+    # Keep app logs off stdout, which carries the report
+    structlog.configure(logger_factory=structlog.PrintLoggerFactory(sys.stderr))
+
+    result = asyncio.run(run(args))
+    text = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+import os
+import tempfile
+
+# Read when the app is imported: keep the tests off a real database and ./data
+os.environ.setdefault("DATABASE_URL", "memory://")
+_data = tempfile.mkdtemp(prefix="llm-toolkit-tests-")
+for name in (
+    "DATASET_STORAGE_DIR",
+    "RESEARCH_FETCH_CACHE_DIR",
+    "TRAINING_LOG_SOURCE_DIR",
+    "TRAINING_LOG_DIR",
+    "TRAINING_METRICS_DIR",
+):
+    os.environ.setdefault(name, os.path.join(_data, name.lower()))
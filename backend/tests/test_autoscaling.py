@@ -0,0 +1,64 @@
+import asyncio
+import uuid
+from datetime import datetime
+
+from app.db.session import session_scope
+from app.services.autoscaling import (
+    AutoscalingController,
+    LocalProvisioner,
+    MemoryLoadBoard,
+    ScalingConfig,
+    ScalingState,
+    TargetTracking,
+    decide,
+)
+from app.services.inference import LoadSample
+
+SCALE_TO_ZERO = {"metric": "concurrency", "target": 8.0, "min_instances": 0, "scale_to_zero_after_seconds": 60}
+
+
+def endpoint_record(status: str, auto_scaling: bool = True) -> dict:
+    endpoint_id = str(uuid.uuid4())
+    return {
+        "id": endpoint_id,
+        "project_id": "project",
+        "sagemaker_endpoint_name": f"endpoint-{endpoint_id[:8]}",
+        "status": status,
+        "instance_count": 1,
+        "auto_scaling": auto_scaling,
+        "scaling": SCALE_TO_ZERO,
+        "created_at": datetime.utcnow().isoformat(),
+    }
+
+
+def test_unknown_idle_time_does_not_scale_to_zero():
+    config = ScalingConfig(TargetTracking("concurrency", 8.0), min_instances=0, scale_to_zero_after=60.0)
+    assert decide(config, 1, LoadSample(idle_seconds=None), 1000.0, ScalingState()) == 1
+    assert decide(config, 1, LoadSample(idle_seconds=61.0), 1000.0, ScalingState()) == 0
+
+
+def test_fresh_endpoint_waits_out_its_grace_period():
+    async def scenario():
+        serving = endpoint_record("inservice")
+        other = endpoint_record("inservice", auto_scaling=False)
+        stopped = endpoint_record("creating")
+        async with session_scope() as db:
+            for record in (serving, other, stopped):
+                await db.endpoints.add(record)
+        controller = AutoscalingController(LocalProvisioner(), MemoryLoadBoard(), interval=1.0)
+        try:
+            await controller.tick()
+            # Only in-service endpoints with auto scaling are watched
+            assert serving["id"] in controller._watches
+            assert other["id"] not in controller._watches and stopped["id"] not in controller._watches
+            async with session_scope() as db:
+                assert (await db.endpoints.get(serving["id"]))["instance_count"] == 1
+            # Watched for longer than the grace period without a request
+            controller._watches[serving["id"]].since -= 61.0
+            await controller.tick()
+            async with session_scope() as db:
+                return (await db.endpoints.get(serving["id"]))["instance_count"]
+        finally:
+            await controller.aclose()
+
+    assert asyncio.run(scenario()) == 0
@@ -0,0 +1,59 @@
+import os
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api import datasets
+from app.main import app
+from app.services.storage import get_storage
+
+
+@pytest.fixture
+def client():
+    with TestClient(app, raise_server_exceptions=False) as client:
+        yield client
+
+
+@pytest.fixture
+def project(client):
+    email = f"{uuid.uuid4().hex}@example.com"
+    token = client.post(
+        "/api/auth/register", json={"email": email, "password": "secret123", "name": "uploader"}
+    ).json()["data"]["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    project_id = client.post(
+        "/api/projects", json={"name": "datasets", "type": "fine-tune"}, headers=headers
+    ).json()["data"]["id"]
+    return {"id": project_id, "headers": headers}
+
+
+def upload(client, project):
+    rows = b'{"prompt": "question %s", "completion": "answer"}\n' % uuid.uuid4().hex.encode()
+    return client.post(
+        f"/api/projects/{project['id']}/datasets/upload", files={"file": ("rows.jsonl", rows)}, headers=project["headers"]
+    )
+
+
+def staged():
+    staging = os.path.join(get_storage().root, "staging")
+    return os.listdir(staging) if os.path.isdir(staging) else []
+
+
+def test_upload_publishes_its_staged_content(client, project):
+    response = upload(client, project)
+
+    assert response.status_code == 200
+    assert get_storage().exists(response.json()["data"]["storage_key"])
+    assert staged() == []
+
+
+def test_failed_upload_deletes_its_staged_content(client, project, monkeypatch):
+    def fail(storage, result):
+        raise OSError("storage unavailable")
+
+    monkeypatch.setattr(datasets, "publish_blob", fail)
+    response = upload(client, project)
+
+    assert response.status_code == 500
+    assert staged() == []
@@ -0,0 +1,24 @@
+import pytest
+from pydantic import ValidationError
+
+from app.api.models import MODEL_CATALOG
+from app.api.training import TrainingConfig
+from app.services.estimator import DatasetProfile, estimate
+
+MODEL = MODEL_CATALOG[0]
+DATASET = DatasetProfile(content_hash="0" * 64, rows=1000, tokens=200_000)
+
+
+def test_estimate_covers_every_instance_type():
+    result = estimate(MODEL, DATASET, TrainingConfig().model_dump())
+    assert result.recommended is not None
+    assert all(i.steps > 0 and i.cost > 0 for i in result.instances)
+
+
+@pytest.mark.parametrize("field", ["epochs", "batch_size", "lora_rank"])
+@pytest.mark.parametrize("value", [0, -4])
+def test_unusable_config_is_rejected(field, value):
+    with pytest.raises(ValueError, match=field):
+        estimate(MODEL, DATASET, {**TrainingConfig().model_dump(), field: value})
+    with pytest.raises(ValidationError):
+        TrainingConfig(**{field: value})
@@ -0,0 +1,33 @@
+import asyncio
+
+from app.services.fetch_cache import FetchCache
+from app.services.search import FetchedPage
+
+URL = "https://example.com/page"
+
+
+def test_entries_survive_a_restart_and_revalidate(tmp_path):
+    requests = []
+
+    async def download(url, headers):
+        requests.append(headers)
+        if headers.get("If-None-Match") == '"v1"':
+            return FetchedPage(url, 304, "text/html", b"", {"cache-control": "max-age=60"})
+        return FetchedPage(url, 200, "text/html", b"body", {"etag": '"v1"', "cache-control": "max-age=0"})
+
+    async def parse(page):
+        return "Title", page.body.decode()
+
+    async def main():
+        _, how = await FetchCache(str(tmp_path)).load(URL, download, parse)
+        assert how == "miss"
+        # A new process knows the entry by its file size alone until it is read
+        restarted = FetchCache(str(tmp_path))
+        page, how = await restarted.load(URL, download, parse)
+        assert how == "revalidated" and page.text == "body"
+        assert restarted.stats()["entries"] == 1
+        page, how = await FetchCache(str(tmp_path)).load(URL, download, parse)
+        assert how == "hit" and page.text == "body"
+
+    asyncio.run(main())
+    assert requests == [{}, {"If-None-Match": '"v1"'}]
@@ -0,0 +1,51 @@
+import math
+
+import numpy as np
+
+from app.services.packing import plan_packing
+
+
+def lower_bound(lengths: np.ndarray, capacity: int) -> int:
+    return math.ceil(int(np.minimum(lengths, capacity).sum()) / capacity)
+
+
+def assert_valid(plan, lengths: np.ndarray) -> None:
+    lengths = np.minimum(lengths.astype(np.int64), plan.capacity)
+    # Every row with tokens is placed exactly once
+    assert sorted(plan.order.tolist()) == np.flatnonzero(lengths > 0).tolist()
+    assert plan.offsets[0] == 0 and plan.offsets[-1] == len(plan.order)
+    tokens = np.add.reduceat(lengths[plan.order], plan.offsets[:-1])
+    assert (tokens <= plan.capacity).all()
+
+
+def test_uniform_lengths_fill_each_sequence():
+    lengths = np.full(1000, 100, dtype=np.uint32)
+    plan = plan_packing(lengths, 4096, batch_size=4)
+    assert_valid(plan, lengths)
+    # 40 rows of 100 tokens per 4096-token sequence
+    assert plan.sequences == 25
+    assert plan.to_dict()["packed_padding_ratio"] < 0.03
+
+
+def test_small_dataset_packs_near_the_bound():
+    rng = np.random.default_rng(0)
+    lengths = rng.integers(20, 900, size=500).astype(np.uint32)
+    plan = plan_packing(lengths, 4096, batch_size=4)
+    assert_valid(plan, lengths)
+    assert plan.sequences <= lower_bound(lengths, 4096) + 1
+
+
+def test_mixed_lengths_pack_near_the_bound():
+    rng = np.random.default_rng(1)
+    lengths = (np.minimum(rng.lognormal(6, 1, size=100_000), 4096) + 1).astype(np.uint32)
+    plan = plan_packing(lengths, 4096, batch_size=8)
+    assert_valid(plan, lengths)
+    assert plan.sequences <= lower_bound(lengths, 4096) * 1.01
+
+
+def test_long_rows_are_truncated_and_empty_rows_skipped():
+    lengths = np.array([0, 5000, 4096, 0, 10], dtype=np.uint32)
+    plan = plan_packing(lengths, 4096)
+    assert_valid(plan, lengths)
+    assert plan.sequences == 3
+    assert plan.tokens == 4096 * 2 + 10
@@ -0,0 +1,121 @@
+import asyncio
+import time
+import uuid
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.db.session import session_scope
+from app.main import app
+from app.services.research import ResearchEngine, set_research_engine
+from app.services.search import SearchProvider, StubCorpus
+
+
+class HangingSearch(SearchProvider):
+    """Never answers, so a session stays running until it is stopped."""
+
+    async def search(self, query, limit, include_domains=()):
+        await asyncio.sleep(3600)
+        return []
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(settings, "RESEARCH_STOP_POLL_SECONDS", 0.05)
+    monkeypatch.setattr(settings, "RESEARCH_FETCH_CACHE_BYTES", 0)
+    with TestClient(app) as client:
+        set_research_engine(ResearchEngine(HangingSearch(), StubCorpus()))
+        yield client
+
+
+@pytest.fixture
+def project(client):
+    email = f"{uuid.uuid4().hex}@example.com"
+    token = client.post(
+        "/api/auth/register", json={"email": email, "password": "secret123", "name": "researcher"}
+    ).json()["data"]["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    project_id = client.post(
+        "/api/projects", json={"name": "research", "type": "research"}, headers=headers
+    ).json()["data"]["id"]
+    return {"id": project_id, "headers": headers}
+
+
+def save(client: TestClient, record: dict) -> None:
+    async def write():
+        async with session_scope() as db:
+            await db.research_sessions.save(record)
+
+    client.portal.call(write)
+
+
+def load(client: TestClient, session_id: str) -> dict:
+    async def read():
+        async with session_scope() as db:
+            return await db.research_sessions.get(session_id)
+
+    return client.portal.call(read)
+
+
+def wait_for_status(client: TestClient, session_id: str, wanted: str) -> dict:
+    deadline = time.monotonic() + 10.0
+    while (record := load(client, session_id))["status"] != wanted and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return record
+
+
+def new_record(project: dict, status: str) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "project_id": project["id"],
+        "question": "what is packing",
+        "status": status,
+        "steps": [],
+        "final_report": "the report" if status == "completed" else None,
+        "sources": [],
+        "created_at": datetime.utcnow().isoformat(),
+        "completed_at": datetime.utcnow().isoformat() if status == "completed" else None,
+    }
+
+
+def test_stopping_a_finished_session_is_rejected(client, project):
+    record = new_record(project, "completed")
+    save(client, record)
+    response = client.post(f"/api/projects/{project['id']}/research/{record['id']}/stop", headers=project["headers"])
+    assert response.status_code == 400
+    assert load(client, record["id"])["status"] == "completed"
+    assert load(client, record["id"])["final_report"] == "the report"
+
+
+def test_session_running_here_stops_at_once(client, project):
+    session = client.post(
+        f"/api/projects/{project['id']}/research", json={"question": "what is packing"}, headers=project["headers"]
+    ).json()["data"]
+    response = client.post(f"/api/projects/{project['id']}/research/{session['id']}/stop", headers=project["headers"])
+    assert response.status_code == 200
+    assert response.json()["data"]["status"] == "stopped"
+    assert load(client, session["id"])["status"] == "stopped"
+
+
+def test_session_running_elsewhere_gets_a_stop_request(client, project):
+    record = new_record(project, "running")
+    save(client, record)
+    response = client.post(f"/api/projects/{project['id']}/research/{record['id']}/stop", headers=project["headers"])
+    assert response.status_code == 200
+    saved = load(client, record["id"])
+    # Left for the process running it to stop
+    assert saved["status"] == "running" and saved["stop_requested_at"]
+
+
+def test_running_session_honours_a_stop_requested_elsewhere(client, project):
+    session = client.post(
+        f"/api/projects/{project['id']}/research", json={"question": "what is packing"}, headers=project["headers"]
+    ).json()["data"]
+    # What the stop route of another process records
+    record = load(client, session["id"])
+    record["stop_requested_at"] = datetime.utcnow().isoformat()
+    save(client, record)
+
+    assert wait_for_status(client, session["id"], "stopped")["status"] == "stopped"
@@ -0,0 +1,97 @@
+import asyncio
+import time
+
+from app.services.inference import FakeModelServer, GenerationRequest, InferenceGateway
+from app.services.routing import PrefixRouter, rendezvous_order
+
+
+def conversation(system: str, question: str) -> GenerationRequest:
+    return GenerationRequest(
+        messages=[{"role": "system", "content": system}, {"role": "user", "content": question}],
+        max_tokens=8,
+        temperature=0.0,
+    )
+
+
+def test_same_prefix_sticks_to_one_instance():
+    router = PrefixRouter(4, max_outstanding=8)
+    chosen = {router.choose("prefix-a", [0, 0, 0, 0]) for _ in range(20)}
+    assert chosen == {(rendezvous_order("prefix-a", 4)[0], True)}
+    assert router.counters == {"sticky": 20, "spilled": 0}
+
+
+def test_prefixes_spread_over_instances():
+    router = PrefixRouter(4, max_outstanding=8)
+    instances = {router.choose(f"prefix-{i}", [0, 0, 0, 0])[0] for i in range(100)}
+    assert instances == {0, 1, 2, 3}
+
+
+def test_busy_instance_spills_to_least_outstanding():
+    router = PrefixRouter(4, max_outstanding=8)
+    preferred = rendezvous_order("prefix-a", 4)[0]
+    outstanding = [5, 5, 5, 5]
+    outstanding[preferred] = 8
+    least = (preferred + 2) % 4
+    outstanding[least] = 1
+    assert router.choose("prefix-a", outstanding) == (least, False)
+    assert router.counters["spilled"] == 1
+
+
+def test_equally_busy_instances_keep_the_prefix():
+    router = PrefixRouter(4, max_outstanding=8)
+    preferred = rendezvous_order("prefix-a", 4)[0]
+    assert router.choose("prefix-a", [8, 8, 8, 8]) == (preferred, True)
+    assert router.counters == {"sticky": 1, "spilled": 0}
+
+
+def test_removing_an_instance_only_moves_its_prefixes():
+    keys = [f"prefix-{i}" for i in range(200)]
+    before = {key: rendezvous_order(key, 4)[0] for key in keys}
+    after = {key: rendezvous_order(key, 3)[0] for key in keys}
+    moved = [key for key in keys if before[key] != after[key]]
+    assert moved and all(before[key] == 3 for key in moved)
+
+
+def test_shared_prefix_is_served_from_the_warm_instance():
+    system = " ".join(f"rule{i}" for i in range(300))
+    backend = FakeModelServer(base_latency=0.0, token_latency=0.0, prefill_latency=0.001, jitter=0.0)
+    gateway = InferenceGateway(backend, window=0.0, max_outstanding=8)
+
+    async def timed(request: GenerationRequest) -> float:
+        started = time.monotonic()
+        await gateway.generate("endpoint", request, instance_count=4)
+        return time.monotonic() - started
+
+    async def scenario():
+        try:
+            cold = await timed(conversation(system, "first question"))
+            warm = [await timed(conversation(system, f"question {i}")) for i in range(5)]
+            return cold, warm, gateway.metrics("endpoint")
+        finally:
+            await gateway.aclose()
+
+    cold, warm, metrics = asyncio.run(scenario())
+    assert backend.prefix_misses == 1 and backend.prefix_hits == 5
+    assert max(warm) < cold / 3
+    # Everything went to the prefix's own instance
+    assert metrics["routing"] == {"sticky": 6, "spilled": 0}
+    assert sorted(queue["requests"] for queue in metrics["instances"]) == [0, 0, 0, 6]
+
+
+def test_gateway_spills_a_hot_prefix_when_its_instance_is_full():
+    backend = FakeModelServer(base_latency=0.05, token_latency=0.0, prefill_latency=0.0, jitter=0.0)
+    gateway = InferenceGateway(backend, window=0.0, max_batch_size=1, max_inflight=1, max_outstanding=2)
+
+    async def scenario():
+        try:
+            await asyncio.gather(*(
+                gateway.generate("endpoint", conversation("shared", f"question {i}"), instance_count=4)
+                for i in range(8)
+            ))
+            return gateway.metrics("endpoint")
+        finally:
+            await gateway.aclose()
+
+    metrics = asyncio.run(scenario())
+    assert metrics["routing"]["sticky"] == 2 and metrics["routing"]["spilled"] == 6
+    assert all(queue["requests"] == 2 for queue in metrics["instances"])
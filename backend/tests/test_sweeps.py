@@ -0,0 +1,171 @@
+import time
+import uuid
+from typing import Any, Callable, Dict
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.main import app
+from app.services.estimator import get_training_estimator
+from app.services.sweeps import asha_keeps, asha_rungs, grid_point, parse_space
+
+# Learning rates ordered best to worst under the fake provider's loss curve
+LEARNING_RATES = [2e-4, 2e-6, 1e-6]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # The fake provider runs on the wall clock; read when the services start
+    monkeypatch.setattr(settings, "TRAINING_FAKE_STARTUP_SECONDS", 0.0)
+    monkeypatch.setattr(settings, "TRAINING_FAKE_DURATION_SECONDS", 10.0)
+    monkeypatch.setattr(settings, "TRAINING_RECONCILE_INTERVAL_SECONDS", 0.2)
+    monkeypatch.setattr(settings, "SWEEP_SCHEDULER_INTERVAL_SECONDS", 0.2)
+    monkeypatch.setattr(settings, "TRAINING_LOG_POLL_SECONDS", 0.2)
+    monkeypatch.setattr(settings, "TRAINING_PROJECT_CONCURRENCY", len(LEARNING_RATES))
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def project(client):
+    email = f"{uuid.uuid4().hex}@example.com"
+    token = client.post(
+        "/api/auth/register", json={"email": email, "password": "secret123", "name": "sweeper"}
+    ).json()["data"]["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    project_id = client.post(
+        "/api/projects", json={"name": "sweeps", "type": "fine-tune"}, headers=headers
+    ).json()["data"]["id"]
+    rows = b"".join(b'{"prompt": "question %d", "completion": "answer"}\n' % i for i in range(50))
+    dataset_id = client.post(
+        f"/api/projects/{project_id}/datasets/upload", files={"file": ("rows.jsonl", rows)}, headers=headers
+    ).json()["data"]["id"]
+    return {"id": project_id, "dataset_id": dataset_id, "headers": headers}
+
+
+def start_sweep(client: TestClient, project: Dict[str, Any], **overrides: Any) -> Dict[str, Any]:
+    body = {
+        "model_id": "llama-3-8b",
+        "dataset_id": project["dataset_id"],
+        "config": {"epochs": 3},
+        "parameters": {"learning_rate": LEARNING_RATES},
+        "method": "grid",
+        "max_concurrency": len(LEARNING_RATES),
+        "early_stopping": {"enabled": True, "min_steps": 20, "reduction_factor": 3},
+        **overrides,
+    }
+    response = client.post(f"/api/projects/{project['id']}/fine-tunes/sweeps", json=body, headers=project["headers"])
+    assert response.status_code == 200, response.text
+    return response.json()["data"]
+
+
+def wait_for(
+    client: TestClient, project: Dict[str, Any], sweep_id: str, done: Callable[[Dict[str, Any]], bool]
+) -> Dict[str, Any]:
+    deadline = time.monotonic() + 60.0
+    while True:
+        sweep = client.get(
+            f"/api/projects/{project['id']}/fine-tunes/sweeps/{sweep_id}", headers=project["headers"]
+        ).json()["data"]
+        if done(sweep) or time.monotonic() > deadline:
+            return sweep
+        time.sleep(0.2)
+
+
+def get_run(client: TestClient, project: Dict[str, Any], run_id: str) -> Dict[str, Any]:
+    return client.get(
+        f"/api/projects/{project['id']}/fine-tunes/{run_id}", headers=project["headers"]
+    ).json()["data"]
+
+
+def test_asha_rungs_and_cutoff():
+    assert asha_rungs(20, 3, 300) == [20, 60, 180]
+    assert asha_rungs(50, 3, 50) == []
+    # Too few peers to judge
+    assert asha_keeps(9.0, [1.0, 9.0], 3)
+    assert asha_keeps(1.0, [1.0, 2.0, 3.0], 3)
+    assert not asha_keeps(2.0, [1.0, 2.0, 3.0], 3)
+
+
+def test_grid_points_cover_the_space():
+    space = parse_space({"learning_rate": [1e-4, 2e-4], "lora_rank": [8, 16, 32]})
+    points = [grid_point(space, i) for i in range(6)]
+    assert len({tuple(sorted(p.items())) for p in points}) == 6
+
+
+def test_sweep_prunes_the_worst_trial_and_picks_the_best(client, project):
+    # The last trial starts once the others have passed the rungs it is
+    # compared at
+    sweep = start_sweep(client, project, max_concurrency=2)
+    sweep = wait_for(client, project, sweep["id"], lambda s: s["status"] == "completed")
+
+    assert sweep["status"] == "completed"
+    trials = sweep["trials"]
+    assert [t["params"]["learning_rate"] for t in trials] == LEARNING_RATES
+    assert sweep["best_trial"] == 0
+    assert trials[0]["status"] == trials[1]["status"] == "completed"
+    assert trials[2]["status"] == "pruned" and trials[2]["pruned_at_step"] == 20
+    # A pruned trial pays for the steps it ran
+    assert 0 < trials[2]["cost"] < trials[2]["estimated_cost"]
+    assert sweep["spent"] == pytest.approx(sum(t["cost"] for t in trials), abs=1e-3)
+    for trial in trials:
+        run = get_run(client, project, trial["run_id"])
+        assert run["sweep_id"] == sweep["id"] and run["sweep_trial"] == trial["index"]
+        assert run["config"]["learning_rate"] == trial["params"]["learning_rate"]
+    assert get_run(client, project, trials[2]["run_id"])["status"] == "stopped"
+
+
+def test_stopping_a_sweep_stops_its_trials(client, project):
+    sweep = start_sweep(client, project, early_stopping={"enabled": False})
+    sweep = wait_for(client, project, sweep["id"], lambda s: len(s["trials"]) == len(LEARNING_RATES))
+
+    response = client.post(
+        f"/api/projects/{project['id']}/fine-tunes/sweeps/{sweep['id']}/stop", headers=project["headers"]
+    )
+    assert response.status_code == 200
+    sweep = wait_for(client, project, sweep["id"], lambda s: s["status"] == "stopped")
+
+    assert sweep["status"] == "stopped"
+    assert all(t["status"] == "stopped" for t in sweep["trials"])
+    assert all(get_run(client, project, t["run_id"])["status"] == "stopped" for t in sweep["trials"])
+    response = client.post(
+        f"/api/projects/{project['id']}/fine-tunes/sweeps/{sweep['id']}/stop", headers=project["headers"]
+    )
+    assert response.status_code == 400
+
+
+def test_budget_below_one_trial_launches_nothing(client, project):
+    sweep = start_sweep(client, project, budget=0.0001)
+    sweep = wait_for(client, project, sweep["id"], lambda s: s["status"] == "completed")
+
+    assert sweep["status"] == "completed"
+    assert sweep["budget_exhausted"] and sweep["trials"] == []
+    assert sweep["best_trial"] is None and sweep["spent"] == 0.0
+
+
+def test_range_outside_the_config_bounds_is_rejected(client, project):
+    response = client.post(
+        f"/api/projects/{project['id']}/fine-tunes/sweeps",
+        json={
+            "model_id": "llama-3-8b",
+            "dataset_id": project["dataset_id"],
+            "parameters": {"batch_size": {"min": 0, "max": 8}},
+        },
+        headers=project["headers"],
+    )
+    assert response.status_code == 400
+    assert "batch_size" in response.json()["detail"]
+
+
+def test_trial_that_cannot_be_estimated_is_infeasible(client, project, monkeypatch):
+    async def fail(*args, **kwargs):
+        raise ValueError("no estimate")
+
+    monkeypatch.setattr(get_training_estimator(), "estimate_run", fail)
+    sweep = start_sweep(client, project, method="random", max_trials=2)
+    sweep = wait_for(client, project, sweep["id"], lambda s: s["status"] == "completed")
+
+    assert sweep["status"] == "completed"
+    assert [t["status"] for t in sweep["trials"]] == ["infeasible", "infeasible"]
+    assert sweep["trials"][0]["error_message"] == "no estimate"
@@ -0,0 +1,46 @@
+import asyncio
+
+from app.services.training_logs import FileLogSource, TrainingLogs
+from app.services.training_metrics import TrainingMetrics
+
+# As the HF Trainer prints them: no 'step' field
+LINES = [
+    "{'loss': 2.5, 'learning_rate': 0.0001, 'epoch': 0.25}",
+    "{'loss': 2.0, 'learning_rate': 0.0001, 'epoch': 0.5}",
+    "{'eval_loss': 1.9, 'epoch': 0.5}",
+    "{'loss': 1.5, 'learning_rate': 0.0001, 'epoch': 1.0}",
+]
+
+
+def run_with(tmp_path, metrics):
+    with open(tmp_path / "job.log", "w") as f:
+        f.write("".join(line + "\n" for line in LINES))
+    return {
+        "id": "run",
+        "status": "running",
+        "sagemaker_job_name": "job",
+        "job": {"submitted_at": "2026-01-01T00:00:00"},
+        "config": {"epochs": 2},
+        "metrics": metrics,
+    }
+
+
+def query(tmp_path, run):
+    logs = TrainingLogs(FileLogSource(str(tmp_path)), directory=str(tmp_path / "logs"), poll_interval=0)
+    metrics = TrainingMetrics(logs, directory=str(tmp_path / "metrics"))
+    return asyncio.run(metrics.query(run, metrics=["train_loss", "eval_loss"]))
+
+
+def test_step_less_lines_are_placed_by_epoch(tmp_path):
+    result = query(tmp_path, run_with(tmp_path, {"total_steps": 200}))
+
+    assert result["series"]["train_loss"]["steps"] == [25, 50, 100]
+    assert result["series"]["eval_loss"]["steps"] == [50]
+    assert result["last_step"] == 100
+
+
+def test_step_less_lines_without_a_step_count_follow_each_other(tmp_path):
+    result = query(tmp_path, run_with(tmp_path, {}))
+
+    assert result["series"]["train_loss"]["steps"] == [1, 2, 4]
+    assert result["last_step"] == 4
@@ -16,6 +16,7 @@ import type {
   AssistantMessage,
   ApiResponse,
   PaginatedResponse,
+  PageQuery,
 } from "@/types";
 
 const api = axios.create({
@@ -55,8 +56,8 @@ export const authApi = {
 
 // Project APIs
 export const projectApi = {
-  list: async (page = 1, pageSize = 10): Promise<ApiResponse<PaginatedResponse<Project>>> => {
-    const { data } = await api.get(`/projects?page=${page}&pageSize=${pageSize}`);
+  list: async (page: PageQuery = {}): Promise<ApiResponse<PaginatedResponse<Project>>> => {
+    const { data } = await api.get("/projects", { params: page });
     return data;
   },
   
@@ -101,8 +102,8 @@ export const modelApi = {
 
 // Dataset APIs
 export const datasetApi = {
-  list: async (projectId: string): Promise<ApiResponse<Dataset[]>> => {
-    const { data } = await api.get(`/projects/${projectId}/datasets`);
+  list: async (projectId: string, page: PageQuery = {}): Promise<ApiResponse<PaginatedResponse<Dataset>>> => {
+    const { data } = await api.get(`/projects/${projectId}/datasets`, { params: page });
     return data;
   },
   
@@ -134,8 +135,8 @@ export const datasetApi = {
 
 // Training APIs
 export const trainingApi = {
-  list: async (projectId: string): Promise<ApiResponse<TrainingRun[]>> => {
-    const { data } = await api.get(`/projects/${projectId}/fine-tunes`);
+  list: async (projectId: string, page: PageQuery = {}): Promise<ApiResponse<PaginatedResponse<TrainingRun>>> => {
+    const { data } = await api.get(`/projects/${projectId}/fine-tunes`, { params: page });
     return data;
   },
   
@@ -179,8 +180,8 @@ export const trainingApi = {
 
 // Endpoint APIs
 export const endpointApi = {
-  list: async (projectId: string): Promise<ApiResponse<Endpoint[]>> => {
-    const { data } = await api.get(`/projects/${projectId}/endpoints`);
+  list: async (projectId: string, page: PageQuery = {}): Promise<ApiResponse<PaginatedResponse<Endpoint>>> => {
+    const { data } = await api.get(`/projects/${projectId}/endpoints`, { params: page });
     return data;
   },
   
@@ -244,8 +245,8 @@ export const evaluationApi = {
 
 // Research APIs
 export const researchApi = {
-  list: async (projectId: string): Promise<ApiResponse<ResearchSession[]>> => {
-    const { data } = await api.get(`/projects/${projectId}/research`);
+  list: async (projectId: string, page: PageQuery = {}): Promise<ApiResponse<PaginatedResponse<ResearchSession>>> => {
+    const { data } = await api.get(`/projects/${projectId}/research`, { params: page });
     return data;
   },
   
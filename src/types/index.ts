@@ -294,8 +294,13 @@ export interface ApiResponse<T> {
 
 export interface PaginatedResponse<T> {
   items: T[];
-  total: number;
-  page: number;
-  pageSize: number;
-  hasMore: boolean;
+  next_cursor: string | null;
+  has_more: boolean;
+  limit: number;
+}
+
+export interface PageQuery {
+  cursor?: string;
+  limit?: number;
+  fields?: string;
 }